@@ -1,6 +1,8 @@
 import json
 import sys
 import numpy as np
+from factor_tables import get_store
+from geo import fill_record
 
 def predict_missing_data(input_data):
     """Predict missing LCA data fields"""
@@ -15,8 +17,8 @@ def predict_missing_data(input_data):
     material = input_data.get('materialType', 'Copper')
     defaults = material_defaults.get(material, material_defaults['Copper'])
     
-    # Fill missing values
-    result = input_data.copy()
+    # Fill missing values, starting with distance and landfill from the site's location
+    result = fill_record(input_data).copy()
     
     if not result.get('electricityConsumption'):
         result['electricityConsumption'] = str(defaults['electricity'] + np.random.randint(-200, 200))
@@ -39,21 +41,12 @@ def predict_missing_data(input_data):
     
     return result
 
-def calculate_impact(data):
-    """Calculate environmental impact"""
-    electricity = float(data.get('electricityConsumption', 0))
-    fuel = float(data.get('fuelEnergy', 0))
-    distance = float(data.get('transportDistance', 0))
-    
-    co2 = round(electricity * 0.5 + fuel * 0.2 + distance * 1.2)
-    energy = round(electricity * 3.6 + fuel)
-    score = max(10, min(100, 90 - (co2 / max(energy, 1)) * 20))
-    
-    return {
-        'co2Emissions': co2,
-        'totalEnergy': energy,
-        'fuelEfficiencyScore': round(score)
-    }
+def calculate_impact(data, factors=None):
+    """Calculate environmental impact (the 'quick' variant of the current factor tables)"""
+    factors = factors or get_store().current()
+    model = factors.model('quick')
+    model.validate(data)
+    return {**model.evaluate(data), 'factorVersion': factors.version}
 
 if __name__ == "__main__":
     input_data = json.loads(sys.argv[1])
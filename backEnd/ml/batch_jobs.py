@@ -0,0 +1,298 @@
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import uuid
+import pandas as pd
+from contextlib import closing
+from typing import Dict, List, Any, Optional, Union
+from csv_ml_service import csv_model, LCA_RECOMMENDATIONS
+from incremental_stats import IncrementalAggregates
+
+DEFAULT_JOB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_queue')
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# A running job whose last heartbeat is older than this (seconds) belongs to a dead worker
+DEFAULT_STALE_AFTER = 120.0
+
+TERMINAL_STATUSES = ('completed', 'cancelled', 'failed')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    total_rows INTEGER,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    checkpoint TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+'''
+
+
+def lca_chunk_results(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Input columns plus the calculate_lca_row outputs and recommendations of every row"""
+    model = csv_model()
+    values = model.evaluate_batch(chunk)
+    results = pd.concat([chunk, values[model.outputs]], axis=1)
+    texts = list(LCA_RECOMMENDATIONS.values())
+    flags = values[list(LCA_RECOMMENDATIONS)].to_numpy(dtype=bool)
+    results['recommendations'] = [[t for t, on in zip(texts, row) if on] for row in flags]
+    return results
+
+
+class BatchJobQueue:
+    """SQLite-backed queue of chunked CSV analyses with their checkpoints
+
+    A job reads its CSV in fixed-size chunks. After each chunk the per-row
+    results are written to ``<root>/<job_id>/chunk-NNNNNN.parquet`` and, in a
+    single transaction, the job's chunk counter, heartbeat and aggregate state
+    (IncrementalAggregates.to_dict) are updated. A crash between the two only
+    rewrites the same chunk file on resume, so aggregates are never counted
+    twice. Workers claim jobs under ``BEGIN IMMEDIATE``; a running job whose
+    heartbeat has gone stale is reclaimed and continues from its checkpoint.
+    """
+
+    def __init__(self, root: str = DEFAULT_JOB_DIR):
+        self.root = root
+        self.db_path = os.path.join(root, 'jobs.sqlite')
+        os.makedirs(root, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def chunk_path(self, job_id: str, index: int) -> str:
+        return os.path.join(self.job_dir(job_id), f'chunk-{index:06d}.parquet')
+
+    def submit(self, source: Union[str, List[Dict[str, Any]]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+        """Queue a CSV file (or parsed rows, stored as the job's input.csv); returns the job id"""
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        if not isinstance(source, str):
+            path = os.path.join(self.job_dir(job_id), 'input.csv')
+            pd.DataFrame(source).to_csv(path, index=False)
+            source = path
+        if not os.path.exists(source):
+            raise FileNotFoundError(f'CSV not found: {source}')
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute('INSERT INTO jobs (id, source, chunk_size, status, created_at, updated_at) '
+                       'VALUES (?, ?, ?, ?, ?, ?)', (job_id, os.path.abspath(source), int(chunk_size), 'queued', now, now))
+        return job_id
+
+    def claim(self, worker: str, job_id: Optional[str] = None,
+              stale_after: float = DEFAULT_STALE_AFTER) -> Optional[sqlite3.Row]:
+        """Take the oldest queued (or abandoned) job, or the given one; None when there is none"""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute('BEGIN IMMEDIATE')
+            query = ('SELECT * FROM jobs WHERE (status = ? OR (status = ? AND heartbeat < ?))'
+                     + (' AND id = ?' if job_id else '') + ' ORDER BY created_at LIMIT 1')
+            params = ['queued', 'running', now - stale_after] + ([job_id] if job_id else [])
+            job = db.execute(query, params).fetchone()
+            if job is None:
+                db.execute('COMMIT')
+                return None
+            db.execute('UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, updated_at = ? WHERE id = ?',
+                       ('running', worker, now, now, job['id']))
+            db.execute('COMMIT')
+            return db.execute('SELECT * FROM jobs WHERE id = ?', (job['id'],)).fetchone()
+
+    def checkpoint(self, job_id: str, worker: str, **fields) -> Optional[bool]:
+        """Record progress if the worker still owns the job
+
+        Returns whether cancellation was requested, or None when the job has
+        been reclaimed by another worker (the caller must stop).
+        """
+        now = time.time()
+        assignments = ''.join(f', {name} = ?' for name in fields)
+        with closing(self._connect()) as db:
+            db.execute('BEGIN IMMEDIATE')
+            updated = db.execute(f'UPDATE jobs SET heartbeat = ?, updated_at = ?{assignments} '
+                                 'WHERE id = ? AND worker = ? AND status = ?',
+                                 [now, now, *fields.values(), job_id, worker, 'running']).rowcount
+            cancel = db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            db.execute('COMMIT')
+        return bool(cancel['cancel_requested']) if updated else None
+
+    def finish(self, job_id: str, worker: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """Move an owned job to a terminal status (or back to 'queued' to hand it on)"""
+        now = time.time()
+        with closing(self._connect()) as db:
+            return db.execute('UPDATE jobs SET status = ?, result = ?, error = ?, worker = NULL, updated_at = ? '
+                              'WHERE id = ? AND worker = ? AND status = ?',
+                              (status, json.dumps(result) if result is not None else None, error, now,
+                               job_id, worker, 'running')).rowcount == 1
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Request cooperative cancellation; a job still waiting in the queue is cancelled at once"""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status NOT IN (?, ?, ?)',
+                       (now, job_id, *TERMINAL_STATUSES))
+            db.execute('UPDATE jobs SET status = ? WHERE id = ? AND status = ?', ('cancelled', job_id, 'queued'))
+            db.execute('COMMIT')
+        return self.status(job_id)
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """Requeue a failed or cancelled job; it continues from its last checkpoint"""
+        with closing(self._connect()) as db:
+            db.execute('UPDATE jobs SET status = ?, cancel_requested = 0, error = NULL, updated_at = ? '
+                       'WHERE id = ? AND status IN (?, ?)', ('queued', time.time(), job_id, 'failed', 'cancelled'))
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """Progress of a job for polling"""
+        with closing(self._connect()) as db:
+            job = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None:
+            raise KeyError(f'Unknown job: {job_id}')
+        total = job['total_rows']
+        return {
+            'job_id': job['id'],
+            'status': job['status'],
+            'rows_done': job['rows_done'],
+            'total_rows': total,
+            'chunks_done': job['chunks_done'],
+            'progress': round(job['rows_done'] / total, 4) if total else (1.0 if total == 0 else 0.0),
+            'cancel_requested': bool(job['cancel_requested']),
+            'result': json.loads(job['result']) if job['result'] else None,
+            'error': job['error']
+        }
+
+    def jobs(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as db:
+            ids = [r['id'] for r in db.execute('SELECT id FROM jobs' + (' WHERE status = ?' if status else '')
+                                               + ' ORDER BY created_at', (status,) if status else ())]
+        return [self.status(job_id) for job_id in ids]
+
+    def results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> pd.DataFrame:
+        """Per-row results of the chunks finished so far"""
+        job = self.status(job_id)
+        frames = [pd.read_parquet(self.chunk_path(job_id, i)) for i in range(job['chunks_done'])]
+        results = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return results.iloc[offset:None if limit is None else offset + limit]
+
+
+class BatchJobRunner:
+    """Worker that claims jobs from a BatchJobQueue and runs them chunk by chunk"""
+
+    def __init__(self, queue: BatchJobQueue, worker: Optional[str] = None,
+                 stale_after: float = DEFAULT_STALE_AFTER):
+        self.queue = queue
+        self.worker = worker or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.stale_after = stale_after
+
+    def run_job(self, job: sqlite3.Row, max_chunks: Optional[int] = None) -> str:
+        """Process a claimed job from its checkpoint; returns the status it was left in
+
+        With ``max_chunks`` the job is handed back to the queue after that many
+        chunks, so a time-sliced worker can share the queue fairly.
+        """
+        job_id, chunk_size = job['id'], job['chunk_size']
+        state = IncrementalAggregates(job_id, self.queue.job_dir(job_id))
+        if job['checkpoint']:
+            state.restore(json.loads(job['checkpoint']))
+        index, rows_done = job['chunks_done'], job['rows_done']
+        try:
+            if job['total_rows'] is None:
+                total = sum(len(c) for c in pd.read_csv(job['source'], usecols=[0], chunksize=chunk_size * 10))
+                if self.queue.checkpoint(job_id, self.worker, total_rows=total) is None:
+                    return 'lost'
+            chunks = pd.read_csv(job['source'], chunksize=chunk_size, skiprows=range(1, 1 + rows_done))
+            processed = 0
+            for chunk in chunks:
+                if max_chunks is not None and processed >= max_chunks:
+                    self.queue.finish(job_id, self.worker, 'queued')
+                    return 'queued'
+                tmp_path = self.queue.chunk_path(job_id, index) + '.tmp'
+                lca_chunk_results(chunk).to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, self.queue.chunk_path(job_id, index))
+                state.fold(chunk)
+                index += 1
+                rows_done += len(chunk)
+                processed += 1
+                cancel = self.queue.checkpoint(job_id, self.worker, chunks_done=index, rows_done=rows_done,
+                                               checkpoint=json.dumps(state.to_dict()))
+                if cancel is None:
+                    return 'lost'
+                if cancel:
+                    self.queue.finish(job_id, self.worker, 'cancelled')
+                    return 'cancelled'
+            self.queue.finish(job_id, self.worker, 'completed', result=state.summary())
+            return 'completed'
+        except Exception as e:
+            self.queue.finish(job_id, self.worker, 'failed', error=str(e))
+            return 'failed'
+
+    def run_pending(self, max_jobs: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run queued and abandoned jobs until the queue is empty"""
+        finished = []
+        while max_jobs is None or len(finished) < max_jobs:
+            job = self.queue.claim(self.worker, stale_after=self.stale_after)
+            if job is None:
+                break
+            finished.append({'job_id': job['id'], 'status': self.run_job(job)})
+        return finished
+
+
+def spawn_worker(root: str = DEFAULT_JOB_DIR) -> int:
+    """Start a detached worker process that drains the queue; returns its pid"""
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', root],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    return process.pid
+
+
+def main():
+    """Main function for command line usage: submit, worker, status, cancel, resume or results"""
+    commands = ('submit', 'worker', 'status', 'cancel', 'resume', 'results')
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(json.dumps({'success': False, 'error': 'Usage: python batch_jobs.py '
+                          'submit <csv_path> [chunk_size]|worker [root]|status|cancel|resume|results <job_id>'}))
+        return
+
+    try:
+        command = sys.argv[1]
+        if command == 'worker':
+            queue = BatchJobQueue(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_JOB_DIR)
+            data = BatchJobRunner(queue).run_pending()
+        elif command == 'submit':
+            queue = BatchJobQueue()
+            chunk_size = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_CHUNK_SIZE
+            job_id = queue.submit(sys.argv[2], chunk_size)
+            spawn_worker(queue.root)
+            data = queue.status(job_id)
+        elif command == 'results':
+            data = json.loads(BatchJobQueue().results(sys.argv[2]).to_json(orient='records'))
+        else:
+            data = getattr(BatchJobQueue(), command)(sys.argv[2])
+        print(json.dumps({'success': True, 'data': data}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import json
+import struct
+import sys
+import numpy as np
+import pandas as pd
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Any, Optional, Union
+
+# Layout: MAGIC | uint32 header length | JSON header | padding | column buffers
+# Every column buffer starts on an ALIGNMENT boundary so it can be viewed in place.
+MAGIC = b'LCAB'
+VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct('<4sI')
+
+SUPPORTED_DTYPES = {'<f8', '<f4', '<i8', '<i4', '<i2', '|i1', '|u1', '|b1'}
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def encode_batch(columns: Dict[str, Any]) -> bytes:
+    """Serialize numeric arrays and categorical columns into one binary batch
+
+    Numeric columns are written as little-endian arrays. Object/string columns
+    and pandas categoricals are stored as int32 codes plus a category list,
+    with -1 marking a missing value.
+    """
+    specs = []
+    buffers = []
+    offset = 0
+    rows = None
+    for name, values in columns.items():
+        spec: Dict[str, Any] = {'name': name}
+        if not isinstance(values, pd.Categorical):
+            values = np.asarray(values)
+            if values.dtype.kind in 'OUS':
+                values = pd.Categorical(values)
+        if isinstance(values, pd.Categorical):
+            array = np.asarray(values.codes, dtype='<i4')
+            spec['categories'] = [str(c) for c in values.categories]
+        else:
+            array = values.astype(values.dtype.newbyteorder('<'), copy=False)
+        if array.ndim != 1:
+            raise ValueError(f'Column {name} must be one-dimensional')
+        if rows is None:
+            rows = len(array)
+        elif len(array) != rows:
+            raise ValueError(f'Column {name} has {len(array)} rows, expected {rows}')
+        if array.dtype.str not in SUPPORTED_DTYPES:
+            raise ValueError(f'Unsupported dtype {array.dtype.str} for column {name}')
+
+        offset = _aligned(offset)
+        spec.update({'dtype': array.dtype.str, 'offset': offset, 'nbytes': array.nbytes})
+        specs.append(spec)
+        buffers.append((offset, np.ascontiguousarray(array)))
+        offset += array.nbytes
+
+    header = json.dumps({'version': VERSION, 'rows': rows or 0, 'columns': specs}).encode()
+    data_start = _aligned(PREFIX.size + len(header))
+    out = bytearray(data_start + offset)
+    PREFIX.pack_into(out, 0, MAGIC, len(header))
+    out[PREFIX.size:PREFIX.size + len(header)] = header
+    for column_offset, array in buffers:
+        start = data_start + column_offset
+        out[start:start + array.nbytes] = array.tobytes()
+    return bytes(out)
+
+
+def write_batch(path: str, columns: Dict[str, Any]):
+    """Write a binary batch to a file (read back with memory mapping)"""
+    with open(path, 'wb') as f:
+        f.write(encode_batch(columns))
+
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[str, Any]:
+    """Column mapping for encode_batch from a DataFrame"""
+    return {c: (df[c].array if isinstance(df[c].dtype, pd.CategoricalDtype) else df[c].to_numpy())
+            for c in df.columns}
+
+
+class TypedBatch:
+    """Columns of a binary batch exposed as NumPy views over the source buffer
+
+    No column data is copied: numeric columns are views into the bytes, memory
+    map or shared-memory segment that holds the batch, so the source must stay
+    open for as long as the arrays are used.
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, np.ndarray],
+                 owner: Optional[Any] = None):
+        self._owner = owner
+        raw = np.frombuffer(buffer, dtype=np.uint8) if not isinstance(buffer, np.ndarray) else buffer
+        if len(raw) < PREFIX.size:
+            raise ValueError('Batch is too short')
+        magic, header_length = PREFIX.unpack(raw[:PREFIX.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError('Not an LCA binary batch')
+        header = json.loads(raw[PREFIX.size:PREFIX.size + header_length].tobytes())
+        if header.get('version') != VERSION:
+            raise ValueError(f"Unsupported batch version: {header.get('version')}")
+
+        self.rows = header['rows']
+        self.categories: Dict[str, List[str]] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+        data_start = _aligned(PREFIX.size + header_length)
+        for spec in header['columns']:
+            if spec['dtype'] not in SUPPORTED_DTYPES:
+                raise ValueError(f"Unsupported dtype {spec['dtype']} for column {spec['name']}")
+            start = data_start + spec['offset']
+            end = start + spec['nbytes']
+            if end > len(raw):
+                raise ValueError(f"Column {spec['name']} exceeds the batch buffer")
+            self.columns[spec['name']] = raw[start:end].view(np.dtype(spec['dtype']))
+            if 'categories' in spec:
+                self.categories[spec['name']] = spec['categories']
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> 'TypedBatch':
+        return cls(data)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'TypedBatch':
+        """Memory-map a batch file; pages are only read when columns are touched"""
+        mapped = np.memmap(path, dtype=np.uint8, mode='r')
+        return cls(mapped, owner=mapped)
+
+    @classmethod
+    def from_shared_memory(cls, name: str) -> 'TypedBatch':
+        """Attach to a shared-memory segment written by another process"""
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the segment with the resource
+            # tracker, which would unlink it when this reader exits
+            segment = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return cls(np.ndarray((segment.size,), dtype=np.uint8, buffer=segment.buf), owner=segment)
+
+    @classmethod
+    def from_stream(cls, stream) -> 'TypedBatch':
+        """Read a batch from a pipe; the single read buffer is then viewed in place"""
+        return cls(bytearray(stream.read()))
+
+    @classmethod
+    def open(cls, source: str) -> 'TypedBatch':
+        """Open ``-`` (stdin), ``shm:<name>`` or a file path"""
+        if source == '-':
+            return cls.from_stream(sys.stdin.buffer)
+        if source.startswith('shm:'):
+            return cls.from_shared_memory(source[4:])
+        return cls.from_file(source)
+
+    def column(self, name: str) -> Union[np.ndarray, pd.Categorical]:
+        values = self.columns[name]
+        if name in self.categories:
+            return pd.Categorical.from_codes(values, self.categories[name])
+        return values
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame over the batch columns without copying numeric data"""
+        return pd.DataFrame({name: self.column(name) for name in self.columns}, copy=False)
+
+    def close(self):
+        self.columns = {}
+        if isinstance(self._owner, shared_memory.SharedMemory):
+            self._owner.close()
+        self._owner = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publish_shared_memory(columns: Dict[str, Any], name: Optional[str] = None) -> shared_memory.SharedMemory:
+    """Encode a batch into a new shared-memory segment; the caller unlinks it when done"""
+    data = encode_batch(columns)
+    segment = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+    segment.buf[:len(data)] = data
+    return segment
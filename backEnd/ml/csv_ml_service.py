@@ -6,9 +6,26 @@ from sklearn.metrics import mean_squared_error, r2_score
 import joblib
 import json
 import sys
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
 from collections import Counter
 import os
+from model_selection import select_model, DEFAULT_CACHE_DIR
+from data_quality import StreamingQualityMonitor
+from grid_intensity import GridIntensityStore, DEFAULT_GRID_DIR
+from sharded_models import ShardedForest, MaterialCodes, DEFAULT_SHARD_DIR
+from factor_tables import get_store
+from geo import GeoRegistry, fill_transport, CSV_COLUMNS as GEO_COLUMNS, DEFAULT_GEO_PATH
+from surrogate import fit_surrogate, DEFAULT_TOLERANCE as SURROGATE_TOLERANCE, DEFAULT_MIN_ROWS as SURROGATE_MIN_ROWS
+
+# Per-row grid factor column filled from a GridIntensityStore (kg CO2 per kWh)
+GRID_FACTOR_COLUMN = 'GridFactor_kgCO2_per_kWh'
+
+# Recommendation text for each flag of the 'csv' model variant
+LCA_RECOMMENDATIONS = {
+    'low_recycled_content': "Increase recycled content",
+    'long_transport': "Optimize transport routes/modes",
+    'high_electricity': "Investigate renewable electricity / efficiency"
+}
 
 def two_product_concentrate_mass(m_feed, grade_feed_pct, recovery_frac, grade_conc_pct):
     """Simple algebraic formula for concentrate mass calculation"""
@@ -20,45 +37,65 @@ def two_product_concentrate_mass(m_feed, grade_feed_pct, recovery_frac, grade_co
     m_conc = m_recovered / grade_conc
     return m_conc, m_recovered
 
-def calculate_lca_row(row: Dict) -> Dict:
-    """Deterministic LCA calculation"""
-    elec = float(row.get('ElectricityConsumption_kWh') or 0.0)
-    fuel_mj = float(row.get('FuelEnergy_MJ') or 0.0)
-    trans_km = float(row.get('TransportDistance_km') or 0.0)
-    recycle = float(row.get('RecyclePercent') or 0.0)
-    reuse = float(row.get('ReusePercent') or 0.0)
-
-    carbon_from_elec = elec * 0.5
-    carbon_from_fuel = fuel_mj * 0.07
-    carbon_from_transport = trans_km * 0.2
-
-    carbon_emissions = carbon_from_elec + carbon_from_fuel + carbon_from_transport
-    energy_consumed = elec * 3.6 + fuel_mj
-    water_use = elec * 0.5 + fuel_mj * 0.1
-    circularity = min(100.0, recycle * 0.7 + reuse * 0.5)
-
-    recs = []
-    if recycle < 50: recs.append("Increase recycled content")
-    if trans_km > 200: recs.append("Optimize transport routes/modes")
-    if elec > 1000: recs.append("Investigate renewable electricity / efficiency")
-
-    return {
-        "carbonEmissions": round(carbon_emissions, 2),
-        "energyConsumed": round(energy_consumed, 2),
-        "waterUse": round(water_use, 2),
-        "circularityPercent": round(circularity, 1),
-        "recommendations": recs
-    }
-
-def process_csv_data(csv_data: List[Dict]) -> Dict:
+def csv_model(factors=None):
+    """The 'csv' model variant of ``factors``, or of the current factor tables"""
+    return (factors or get_store().current()).model('csv')
+
+def calculate_lca_row(row: Dict, electricity_factor: Optional[float] = None, model=None) -> Dict:
+    """Deterministic LCA calculation (the 'csv' variant of the factor tables)
+
+    The grid factor comes from ``electricity_factor`` when given, else from the
+    row's GridFactor_kgCO2_per_kWh, else the CSV_COEFFICIENTS default.
+    """
+    if electricity_factor is not None:
+        row = {**row, GRID_FACTOR_COLUMN: electricity_factor}
+    model = model or csv_model()
+    values = model.evaluate(row)
+    result = {name: values[name] for name in model.outputs}
+    result["recommendations"] = [text for flag, text in LCA_RECOMMENDATIONS.items() if values[flag]]
+    return result
+
+def unique_row_index(values: np.ndarray):
+    """Positions of the first occurrence of each distinct row and the inverse mapping
+
+    ``values[first][inverse]`` reproduces ``values`` row for row, so anything
+    computed on the distinct rows can be scattered back in the original order.
+    """
+    _, first, inverse = np.unique(values, axis=0, return_index=True, return_inverse=True)
+    return first, inverse.reshape(-1)
+
+def calculate_lca_frame(df: pd.DataFrame, model=None) -> pd.DataFrame:
+    """Vectorized calculate_lca_row over a whole frame (numeric outputs only)"""
+    model = model or csv_model()
+    return model.evaluate_batch(df)[model.outputs]
+
+def lca_recommendation_masks(df: pd.DataFrame, model=None) -> Dict[str, pd.Series]:
+    """Rows triggering each calculate_lca_row recommendation"""
+    flags = (model or csv_model()).evaluate_batch(df)
+    return {text: flags[flag] for flag, text in LCA_RECOMMENDATIONS.items()}
+
+def process_csv_data(csv_data: Union[List[Dict], pd.DataFrame], options: Optional[Dict] = None) -> Dict:
     """Process CSV data with ML training and prediction"""
+    options = options or {}
     try:
-        df = pd.DataFrame(csv_data)
+        # Parsed JSON rows or a DataFrame, e.g. batch_protocol.TypedBatch.to_frame over a binary batch
+        df = csv_data if isinstance(csv_data, pd.DataFrame) else pd.DataFrame(csv_data)
+        
+        # Blank transport distances and landfills from site/destination names or coordinates
+        # (registry at 'geo_path', detour factor 'circuity')
+        geo_fill = None
+        if any(GEO_COLUMNS[key] in df.columns for key in ('site', 'site_lat', 'destination', 'destination_lat')):
+            geo_fill = fill_transport(df, GeoRegistry.load(options.get('geo_path', DEFAULT_GEO_PATH)),
+                                      circuity=options.get('circuity', 1.0))
         
         # Ensure numeric columns exist
         num_cols = ['ElectricityConsumption_kWh', 'FuelEnergy_MJ', 'TransportDistance_km',
                    'RecyclePercent', 'ReusePercent', 'LandfillPercent']
         
+        # Data-quality pass over the raw values, before bad entries are coerced to 0 ('outlier_z' is the robust z threshold)
+        monitor = StreamingQualityMonitor(num_cols, z_threshold=options.get('outlier_z', 3.5))
+        outliers = monitor.process(df)
+        
         for c in num_cols:
             if c not in df.columns:
                 df[c] = 0
@@ -69,14 +106,36 @@ def process_csv_data(csv_data: List[Dict]) -> Dict:
         df['circularity_simple'] = (df['RecyclePercent'] + df['ReusePercent']).clip(upper=100)
         
         # Handle MaterialType encoding
-        if 'MaterialType' in df.columns:
+        shard_dir = options.get('shard_dir', DEFAULT_SHARD_DIR)
+        materials = df['MaterialType'] if 'MaterialType' in df.columns else pd.Series('Unknown', index=df.index)
+        if options.get('sharded'):
+            # Codes must mean the same material in every upload the shards are applied to
+            df['MaterialType_cat'] = MaterialCodes(os.path.join(shard_dir, 'codes.json') if shard_dir else None).encode(materials)
+        elif 'MaterialType' in df.columns:
             df['MaterialType_cat'] = df['MaterialType'].astype('category').cat.codes
         else:
             df['MaterialType_cat'] = 0
 
-        # Calculate LCA outputs
-        lca_outputs = df.apply(lambda r: calculate_lca_row(r), axis=1)
-        lca_df = pd.DataFrame(list(lca_outputs))
+        # Calculate LCA outputs once per distinct input row and scatter back
+        lca_inputs = ['ElectricityConsumption_kWh', 'FuelEnergy_MJ', 'TransportDistance_km',
+                      'RecyclePercent', 'ReusePercent']
+        # One factor version for the whole upload, even if a new one is published meanwhile
+        factors = get_store().current()
+        # Rows with GridRegion and ConsumptionStart/End use the time-resolved grid factor, not the flat one
+        grid = None
+        if (options.get('grid_intensity') or options.get('grid_intensity_dir')) and 'GridRegion' in df.columns:
+            grid = GridIntensityStore.load(options.get('grid_intensity_dir', DEFAULT_GRID_DIR))
+        if grid is not None and 'ConsumptionStart' in df.columns:
+            ends = df['ConsumptionEnd'] if 'ConsumptionEnd' in df.columns else df['ConsumptionStart']
+            df[GRID_FACTOR_COLUMN] = grid.average_intensity(df['GridRegion'].astype(str),
+                                                            df['ConsumptionStart'].to_numpy(), ends.to_numpy(),
+                                                            factors.table('CSV_COEFFICIENTS')['electricity_factor'])
+        if GRID_FACTOR_COLUMN in df.columns:
+            # The csv model reads a grid factor column whether computed above or uploaded
+            lca_inputs.append(GRID_FACTOR_COLUMN)
+        first, inverse = unique_row_index(df[lca_inputs].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float))
+        lca_outputs = df.iloc[first].apply(calculate_lca_row, axis=1, model=factors.model('csv'))
+        lca_df = pd.DataFrame(list(lca_outputs)).iloc[inverse]
         df = pd.concat([df.reset_index(drop=True), lca_df.reset_index(drop=True)], axis=1)
 
         # Prepare ML features and target
@@ -89,21 +148,89 @@ def process_csv_data(csv_data: List[Dict]) -> Dict:
 
         # Train model if we have enough data
         model_metrics = {}
-        if len(df) >= 10:  # Minimum data for training
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-            rf = RandomForestRegressor(n_estimators=100, random_state=42)
-            rf.fit(X_train, y_train)
-            
-            y_pred = rf.predict(X_test)
+        data_quality = monitor.report()
+        X_fit, y_fit, materials_fit = X, y, materials.reset_index(drop=True)
+        # Rows flagged by the data-quality pass can be left out of training
+        if options.get('exclude_outliers') and outliers.any():
+            X_fit, y_fit, materials_fit = X[~outliers], y[~outliers], materials_fit[~outliers].reset_index(drop=True)
+        data_quality['excluded_from_training'] = len(X) - len(X_fit)
+        # 'use_saved_shards', or a sharded upload too small to train on, scores with the latest stored shards
+        saved_shards = None
+        if options.get('sharded') and shard_dir and (options.get('use_saved_shards') or len(X_fit) < 10):
+            saved_shards = ShardedForest.load(shard_dir)
+        if saved_shards is not None:
+            # Score with the stored shards; the material codes were persisted alongside them
+            first, inverse = unique_row_index(X)
+            df['predicted_carbon'] = saved_shards.predict(X[first], materials.iloc[first].reset_index(drop=True))[inverse]
             model_metrics = {
+                "serving_model": "saved_shards",
+                "sharding": {**saved_shards.summary(), 'fallback_materials': saved_shards.fallback_materials(materials)}
+            }
+        elif len(X_fit) >= 10:  # Minimum data for training
+            train_idx, test_idx = train_test_split(np.arange(len(X_fit)), test_size=0.2, random_state=42)
+            X_train, X_test, y_train, y_test = X_fit[train_idx], X_fit[test_idx], y_fit[train_idx], y_fit[test_idx]
+            surrogate = None
+            if (options.get('surrogate', True) and not options.get('sharded') and not options.get('model_selection')
+                    and len(X_train) >= options.get('surrogate_min_rows', SURROGATE_MIN_ROWS)):
+                # The target is linear in the inputs: one least-squares solve may replace the forest when its
+                # relative holdout RMSE is within 'surrogate_tolerance'; 'surrogate_piecewise' fits one per material
+                group_column = features.index('MaterialType_cat') if options.get('surrogate_piecewise') else None
+                surrogate = fit_surrogate(X_train, y_train, X_test, y_test,
+                                          options.get('surrogate_tolerance', SURROGATE_TOLERANCE), group_column)
+            selection = None
+            sharding = None
+            if surrogate is not None and surrogate['accepted']:
+                rf = surrogate['model']
+                serving_model = 'linear_surrogate'
+                y_pred = rf.predict(X_test)
+            else:
+                params = {'n_estimators': 100}
+                if options.get('model_selection'):
+                    # Forest hyperparameters chosen by cross-validation on the training split
+                    selection = select_model(X_train, y_train,
+                                             grid=options.get('grid'),
+                                             n_folds=options.get('cv_folds', 5),
+                                             n_jobs=options.get('n_jobs'),
+                                             time_budget=options.get('time_budget', 30.0),
+                                             cache_dir=options.get('cache_dir', DEFAULT_CACHE_DIR))
+                    params = selection['best_params']
+                if options.get('sharded'):
+                    # One forest per material, with a global forest for materials below 'shard_min_rows'
+                    rf = ShardedForest(shard_dir, min_rows=options.get('shard_min_rows', 50), params=params,
+                                       n_jobs=options.get('n_jobs'))
+                    sharding = rf.fit(X_train, y_train, materials_fit[train_idx])
+                    sharding['fallback_materials'] = rf.fallback_materials(materials)
+                    serving_model = 'sharded_forest'
+                    y_pred = rf.predict(X_test, materials_fit[test_idx])
+                else:
+                    rf = RandomForestRegressor(random_state=42, **params)
+                    rf.fit(X_train, y_train)
+                    serving_model = 'random_forest'
+                    y_pred = rf.predict(X_test)
+            model_metrics = {
+                "serving_model": serving_model,
                 "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
                 "r2_score": float(r2_score(y_test, y_pred)),
                 "training_samples": len(X_train),
                 "test_samples": len(X_test)
             }
+            if surrogate is not None:
+                model_metrics["surrogate"] = {k: v for k, v in surrogate.items() if k != 'model'}
+            if selection is not None:
+                model_metrics["model_selection"] = selection
+            if sharding is not None:
+                model_metrics["sharding"] = sharding
             
-            # Make predictions on full dataset
-            df['predicted_carbon'] = rf.predict(X)
+            # Make predictions on full dataset, evaluating each distinct feature row once
+            if serving_model == 'linear_surrogate':
+                df['predicted_carbon'] = rf.predict(X)
+            else:
+                first, inverse = unique_row_index(X)
+                if sharding is not None:
+                    # The material code column keeps distinct materials in distinct rows
+                    df['predicted_carbon'] = rf.predict(X[first], materials.iloc[first].reset_index(drop=True))[inverse]
+                else:
+                    df['predicted_carbon'] = rf.predict(X[first])[inverse]
         else:
             df['predicted_carbon'] = df['carbonEmissions']
 
@@ -140,12 +267,36 @@ def process_csv_data(csv_data: List[Dict]) -> Dict:
         if 'MaterialType' in df.columns:
             material_dist = df['MaterialType'].value_counts().to_dict()
 
+        archive_info = None
+        if options.get('archive_dataset_id'):
+            # Full per-row results go to the Parquet archive; pyarrow is only needed when archiving
+            from result_archive import ResultArchive, DEFAULT_ARCHIVE_DIR
+            archive = ResultArchive(options.get('archive_dir', DEFAULT_ARCHIVE_DIR))
+            archive_info = archive.archive(df, options['archive_dataset_id'],
+                                           date_column=options.get('archive_date_column'))
+
+        aggregates = None
+        if options.get('aggregate_dataset_id'):
+            # Fold this upload into the dataset's running aggregates ('aggregate_removed' rows are retracted first)
+            from incremental_stats import IncrementalAggregates, DEFAULT_STATE_DIR
+            state = IncrementalAggregates.load(options['aggregate_dataset_id'],
+                                               options.get('aggregates_dir', DEFAULT_STATE_DIR))
+            state.retract(options.get('aggregate_removed') or [], factors.model('csv'))
+            state.fold(df, factors.model('csv'))
+            state.save()
+            aggregates = state.summary()
+
         return {
             "success": True,
             "model_metrics": model_metrics,
+            "data_quality": data_quality,
+            **({"archive": archive_info} if archive_info else {}),
+            **({"aggregates": aggregates} if aggregates else {}),
+            **({"geo_fill": geo_fill} if geo_fill else {}),
             "summary_stats": summary_stats,
             "top_recommendations": top_recommendations,
             "material_distribution": material_dist,
+            "factor_version": factors.version,
             "detailed_results": df.to_dict('records')[:100],  # Limit to first 100 for response size
             "charts_data": {
                 "carbon_vs_energy": df[['predicted_carbon', 'energyConsumed']].to_dict('records'),
@@ -166,9 +317,17 @@ def process_csv_data(csv_data: List[Dict]) -> Dict:
         }
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        # Binary batch from a file, shared-memory segment (shm:<name>) or stdin (-)
+        from batch_protocol import TypedBatch
+        options = json.loads(sys.argv[3]) if len(sys.argv) > 3 else None
+        with TypedBatch.open(sys.argv[2]) as batch:
+            result = process_csv_data(batch.to_frame(), options)
+        print(json.dumps(result))
+    elif len(sys.argv) > 1:
         input_data = json.loads(sys.argv[1])
-        result = process_csv_data(input_data)
+        options = json.loads(sys.argv[2]) if len(sys.argv) > 2 else None
+        result = process_csv_data(input_data, options)
         print(json.dumps(result))
     else:
         print(json.dumps({"success": False, "error": "No input data provided"}))
\ No newline at end of file
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional, Tuple
+from sketches import QuantileSketch
+
+QUALITY_COLUMNS = ['ElectricityConsumption_kWh', 'FuelEnergy_MJ', 'TransportDistance_km',
+                   'RecyclePercent', 'ReusePercent', 'LandfillPercent']
+
+# Scales the MAD to a standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+
+class RunningStats:
+    """Welford/Chan running mean and variance plus min, max and null counts"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.nulls = 0
+        self.negatives = 0
+
+    def update(self, values: np.ndarray):
+        missing = np.isnan(values)
+        self.nulls += int(missing.sum())
+        present = values[~missing]
+        if not len(present):
+            return
+        self.negatives += int((present < 0).sum())
+        n = len(present)
+        chunk_mean = float(present.mean())
+        chunk_m2 = float(((present - chunk_mean) ** 2).sum())
+        delta = chunk_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.minimum = min(self.minimum, float(present.min()))
+        self.maximum = max(self.maximum, float(present.max()))
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'nulls': self.nulls,
+            'negatives': self.negatives,
+            'mean': round(self.mean, 4) if self.count else None,
+            'std': round(self.std, 4) if self.count else None,
+            'min': self.minimum if self.count else None,
+            'max': self.maximum if self.count else None
+        }
+
+
+class StreamingQualityMonitor:
+    """Constant-memory data-quality and outlier pass over CSV ingest
+
+    Rows are consumed in chunks. Each column keeps running moments, and each
+    (material, column) pair keeps quantile sketches of its values and of their
+    absolute deviation from the running median. A value is flagged when its
+    robust z-score ``|x - median| / (1.4826 * MAD)`` exceeds the threshold.
+    State size depends on the number of materials and the value range, never on
+    the number of rows.
+    """
+
+    def __init__(self, columns: Optional[List[str]] = None, z_threshold: float = 3.5,
+                 chunk_size: int = 10000, min_history: int = 20):
+        self.columns = columns or QUALITY_COLUMNS
+        self.z_threshold = z_threshold
+        self.chunk_size = chunk_size
+        self.min_history = min_history
+        self.rows = 0
+        self.stats = {c: RunningStats() for c in self.columns}
+        self._sketches: Dict[Tuple[str, str], Tuple[QuantileSketch, QuantileSketch]] = {}
+        self.flagged_rows = 0
+        self.flagged_by_column = {c: 0 for c in self.columns}
+        self.flagged_by_material: Dict[str, int] = {}
+
+    def _robust_z(self, material: str, column: str, values: np.ndarray) -> np.ndarray:
+        sketches = self._sketches.setdefault((material, column), (QuantileSketch(), QuantileSketch()))
+        value_sketch, deviation_sketch = sketches
+        present = values[~np.isnan(values)]
+        value_sketch.add(present)
+        median = value_sketch.quantile(0.5)
+        if median is None:
+            return np.zeros(len(values))
+        deviation_sketch.add(np.abs(present - median))
+        if value_sketch.count < self.min_history:
+            return np.zeros(len(values))
+
+        scale = MAD_SCALE * (deviation_sketch.quantile(0.5) or 0.0)
+        if scale <= 0:
+            scale = self.stats[column].std
+        if scale <= 0:
+            return np.zeros(len(values))
+        with np.errstate(invalid='ignore'):
+            return np.nan_to_num(np.abs(values - median) / scale)
+
+    def process_chunk(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Update the state with one chunk and return its outlier mask"""
+        self.rows += len(chunk)
+        materials = (chunk['MaterialType'].astype(str) if 'MaterialType' in chunk.columns
+                     else pd.Series('Unknown', index=chunk.index))
+        numeric = {}
+        for c in self.columns:
+            values = (pd.to_numeric(chunk[c], errors='coerce').to_numpy(dtype=float)
+                      if c in chunk.columns else np.full(len(chunk), np.nan))
+            self.stats[c].update(values)
+            numeric[c] = values
+
+        flagged = np.zeros(len(chunk), dtype=bool)
+        for material, positions in materials.groupby(materials.to_numpy()).indices.items():
+            for c in self.columns:
+                column_flags = self._robust_z(material, c, numeric[c][positions]) > self.z_threshold
+                if column_flags.any():
+                    self.flagged_by_column[c] += int(column_flags.sum())
+                    flagged[positions[column_flags]] = True
+            material_flags = int(flagged[positions].sum())
+            if material_flags:
+                self.flagged_by_material[material] = self.flagged_by_material.get(material, 0) + material_flags
+        self.flagged_rows += int(flagged.sum())
+        return flagged
+
+    def process(self, df: pd.DataFrame) -> np.ndarray:
+        """Run the pass over a frame chunk by chunk; returns the outlier mask for all rows"""
+        masks = [self.process_chunk(df.iloc[start:start + self.chunk_size])
+                 for start in range(0, len(df), self.chunk_size)]
+        return np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+
+    def report(self) -> Dict[str, Any]:
+        """Compact per-column and outlier summary for the API response"""
+        return {
+            'rows': self.rows,
+            'columns': {c: self.stats[c].to_dict() for c in self.columns},
+            'outliers': {
+                'z_threshold': self.z_threshold,
+                'rows_flagged': self.flagged_rows,
+                'by_column': {c: n for c, n in self.flagged_by_column.items() if n},
+                'by_material': self.flagged_by_material
+            }
+        }
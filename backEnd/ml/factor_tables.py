@@ -0,0 +1,274 @@
+import copy
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from types import MappingProxyType
+from typing import Dict, List, Any, Callable, Optional
+from lca_model import FACTOR_TABLES, CompiledModel, build_specs, spec_fingerprint
+
+DEFAULT_FACTOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'factor_tables.json')
+
+# Seconds between checks of the factor file for a new version
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Version of the tables built into lca_model, served while no factor file exists
+BUILTIN_VERSION = 'builtin'
+
+# Published versions remembered for status reporting
+HISTORY_SIZE = 20
+
+
+def _freeze(value: Any) -> Any:
+    """Read-only view of nested factor tables"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+
+def merge_tables(overrides: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Built-in factor tables with ``overrides`` layered over them, validated
+
+    Overrides are keyed by FACTOR_TABLES name and replace or add entries of
+    that table; an entry of a table of factor rows may give only the factors
+    it changes, but a new row must give all of them. Coefficient tables only
+    take the coefficients the steps use. Factors must be numbers.
+    """
+    tables = copy.deepcopy(FACTOR_TABLES)
+    for name, entries in (overrides or {}).items():
+        if name not in tables:
+            raise ValueError(f'Unknown factor table: {name}')
+        if not isinstance(entries, dict):
+            raise ValueError(f'{name}: expected an object of entries')
+        table = tables[name]
+        attributes = set(next(iter(table.values()))) if isinstance(next(iter(table.values())), dict) else None
+        for key, value in entries.items():
+            where = f'{name}.{key}'
+            if name.endswith('_COEFFICIENTS') and key not in table:
+                raise ValueError(f'{where}: unknown coefficient')
+            if attributes is None:
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f'{where}: factor must be a number')
+                table[key] = float(value)
+                continue
+            if not isinstance(value, dict):
+                raise ValueError(f'{where}: expected an object of factors')
+            row = {**table.get(key, {}), **value}
+            missing = attributes - set(row)
+            if missing:
+                raise ValueError(f'{where}: missing factors {", ".join(sorted(missing))}')
+            for attribute, factor in row.items():
+                if isinstance(factor, bool) or not isinstance(factor, (int, float)):
+                    raise ValueError(f'{where}.{attribute}: factor must be a number')
+            table[key] = row
+    return tables
+
+
+class FactorSnapshot:
+    """One immutable version of the factor tables and the model variants compiled over it
+
+    Tables are exposed as read-only mappings and nothing is ever changed after
+    construction, so a request that holds a snapshot computes with one
+    consistent set of factors however many versions are published meanwhile.
+    Variants whose specification is unchanged from ``previous`` reuse its
+    compiled model; only variants over changed tables are recompiled.
+    """
+
+    def __init__(self, version: str, tables: Dict[str, Dict[str, Any]], source: Optional[str] = None,
+                 previous: Optional['FactorSnapshot'] = None):
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        self.tables = _freeze(tables)
+        self.models: Dict[str, CompiledModel] = {}
+        self.fingerprints: Dict[str, str] = {}
+        reused = previous.fingerprints if previous else {}
+        for name, spec in build_specs(tables).items():
+            fingerprint = spec_fingerprint(spec)
+            if reused.get(name) == fingerprint:
+                self.models[name] = previous.models[name]
+            else:
+                self.models[name] = CompiledModel(name, spec)
+            self.fingerprints[name] = fingerprint
+        self.changed = sorted(name for name in self.fingerprints if reused.get(name) != self.fingerprints[name])
+
+    def current(self) -> 'FactorSnapshot':
+        """The snapshot itself, so it can stand in for a store pinned to this version"""
+        return self
+
+    def model(self, name: str) -> CompiledModel:
+        """Compiled model variant of this version"""
+        if name not in self.models:
+            raise ValueError(f'Unknown LCA model variant: {name}')
+        return self.models[name]
+
+    def table(self, name: str):
+        return self.tables[name]
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'source': self.source,
+            'loaded_at': self.loaded_at,
+            'recompiled': self.changed
+        }
+
+
+def read_factor_file(path: str) -> Dict[str, Any]:
+    """Version and validated tables of a factor file
+
+    The file holds ``{"version": ..., "tables": {TABLE_NAME: entries}}``; without
+    a version the content hash names it, so any edit is a new version.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    document = json.loads(content)
+    if not isinstance(document, dict) or not isinstance(document.get('tables', {}), dict):
+        raise ValueError(f'{path}: expected {{"version": ..., "tables": {{...}}}}')
+    version = document.get('version') or 'sha1-' + hashlib.sha1(content).hexdigest()[:12]
+    return {'version': str(version), 'tables': merge_tables(document.get('tables', {}))}
+
+
+def write_factor_file(path: str, tables: Dict[str, Any], version: Optional[str] = None):
+    """Publish a factor file atomically, so a watching store never reads it half written"""
+    merge_tables(tables)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': version, 'tables': tables} if version else {'tables': tables}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class FactorTableStore:
+    """Watches a versioned factor file and publishes each version as a FactorSnapshot
+
+    ``current()`` checks the file's modification time and size at most every
+    ``poll_interval`` seconds and, when they change, loads, validates and
+    compiles the new version before swapping it in with a single reference
+    assignment. Callers take one snapshot per request: requests in flight keep
+    the version they started with, new ones see the new version, and no worker
+    restarts. A file that fails to load is reported in ``status()`` and the
+    previous version keeps serving; removing the file reverts to the built-ins.
+    """
+
+    def __init__(self, path: str = DEFAULT_FACTOR_PATH, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], Any]] = []
+        self._signature = None
+        self._checked_at = 0.0
+        self.last_error: Optional[str] = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._snapshot = self._publish(FactorSnapshot(BUILTIN_VERSION, copy.deepcopy(FACTOR_TABLES)))
+        self.refresh(force=True)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _publish(self, snapshot: FactorSnapshot) -> FactorSnapshot:
+        previous = getattr(self, '_snapshot', None)
+        self._snapshot = snapshot
+        self.history.append(snapshot.info())
+        if previous is not None:
+            listeners = [ref() for ref in self._listeners]
+            self._listeners = [ref for ref, listener in zip(self._listeners, listeners) if listener is not None]
+            for listener in listeners:
+                if listener is not None:
+                    listener(previous, snapshot)
+        return snapshot
+
+    def subscribe(self, listener: Callable[[FactorSnapshot, FactorSnapshot], None]):
+        """Call ``listener(old, new)`` after each published version, e.g. to drop version-scoped caches
+
+        Bound methods are held weakly, so subscribing does not keep their object alive.
+        """
+        self._listeners.append(weakref.WeakMethod(listener) if hasattr(listener, '__self__')
+                               else lambda: listener)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Load the factor file if it changed since the last check; True when a new version was published"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.poll_interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked_at < self.poll_interval:
+                return False
+            self._checked_at = now
+            signature = self._stat()
+            if signature == self._signature:
+                return False
+            try:
+                if signature is None:
+                    version, tables, source = BUILTIN_VERSION, copy.deepcopy(FACTOR_TABLES), None
+                else:
+                    loaded = read_factor_file(self.path)
+                    version, tables, source = loaded['version'], loaded['tables'], self.path
+            except Exception as e:
+                self.last_error = f'{self.path}: {str(e)}'
+                self._signature = signature
+                return False
+            self._signature = signature
+            self.last_error = None
+            if version == self._snapshot.version:
+                return False
+            self._publish(FactorSnapshot(version, tables, source, self._snapshot))
+            return True
+
+    def current(self) -> FactorSnapshot:
+        """Snapshot to serve a request with, picking up a new version if the file changed"""
+        self.refresh()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self._snapshot.info(),
+            'path': self.path,
+            'poll_interval': self.poll_interval,
+            'last_error': self.last_error,
+            'history': list(self.history)
+        }
+
+
+_store: Optional[FactorTableStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> FactorTableStore:
+    """The FactorTableStore of the calling process, watching the default factor file"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FactorTableStore()
+    return _store
+
+
+def main():
+    """Main function for command line usage: show the active factor tables or publish a new version"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('status', 'publish'):
+        print(json.dumps({'success': False,
+                          'error': 'Usage: python factor_tables.py status | publish <tables_json> [version]'}))
+        return
+
+    try:
+        if sys.argv[1] == 'publish':
+            write_factor_file(DEFAULT_FACTOR_PATH, json.loads(sys.argv[2]),
+                              sys.argv[3] if len(sys.argv) > 3 else None)
+        print(json.dumps({'success': True, 'data': FactorTableStore().status()}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
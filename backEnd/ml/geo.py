@@ -0,0 +1,282 @@
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+DEFAULT_GEO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geo_sites.json')
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Landfills with end-of-life factors in lca_model.PIPELINE_LANDFILL_FACTORS (lat, lon)
+DEFAULT_LANDFILLS = {
+    'Ghazipur Delhi': (28.6247, 77.3256),
+    'Deonar Mumbai': (19.0667, 72.9167),
+    'Kodungaiyur Chennai': (13.1360, 80.2560)
+}
+
+# Column names of the transport fields in CSV uploads and in analysis forms
+CSV_COLUMNS = {
+    'distance': 'TransportDistance_km', 'landfill': 'LandfillLocation',
+    'site': 'Site', 'site_lat': 'SiteLatitude', 'site_lon': 'SiteLongitude',
+    'destination': 'Destination', 'destination_lat': 'DestinationLatitude', 'destination_lon': 'DestinationLongitude'
+}
+FORM_COLUMNS = {
+    'distance': 'transportDistance', 'landfill': 'landfillLocation',
+    'site': 'site', 'site_lat': 'siteLatitude', 'site_lon': 'siteLongitude',
+    'destination': 'destination', 'destination_lat': 'destinationLatitude', 'destination_lon': 'destinationLongitude'
+}
+
+# Rows of one distance-matrix block, bounding temporary memory to about 8 * rows * columns bytes
+MATRIX_BLOCK_ROWS = 2048
+
+
+def haversine_km(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """Great-circle distance in km; arguments broadcast like numpy arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Haversine distances between every (lat, lon) row of ``a`` and of ``b``, in blocks of rows"""
+    a = np.asarray(a, dtype=float).reshape(-1, 2)
+    b = np.asarray(b, dtype=float).reshape(-1, 2)
+    result = np.empty((len(a), len(b)))
+    for start in range(0, len(a), MATRIX_BLOCK_ROWS):
+        block = a[start:start + MATRIX_BLOCK_ROWS]
+        result[start:start + len(block)] = haversine_km(block[:, :1], block[:, 1:], b[:, 0], b[:, 1])
+    return result
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class FacilityIndex:
+    """Exact nearest-facility queries over a KD-tree of points on the unit sphere
+
+    Chord length between unit vectors grows monotonically with great-circle
+    distance, so the Euclidean nearest neighbours in 3-D are the geographic
+    ones; chords are converted back to kilometres along the surface.
+    """
+
+    def __init__(self, names: Sequence[str], coordinates: np.ndarray):
+        self.names = np.asarray(list(names), dtype=object)
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.tree = cKDTree(_unit_vectors(self.coordinates[:, 0], self.coordinates[:, 1]))
+
+    def query(self, lat: Any, lon: Any, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Names and distances (km) of the ``k`` nearest facilities to each point"""
+        chords, positions = self.tree.query(_unit_vectors(np.atleast_1d(lat).astype(float),
+                                                          np.atleast_1d(lon).astype(float)), k=k)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords / 2, 0.0, 1.0))
+        return self.names[positions], distances
+
+
+class GeoRegistry:
+    """Named coordinates of sites, destinations and landfills with cached indexes
+
+    Points are grouped by kind ('site', 'destination', 'landfill', ...).
+    Each kind gets a FacilityIndex and each pair of kinds a precomputed
+    distance matrix on first use; both are rebuilt when points are added.
+    """
+
+    def __init__(self, points: Optional[Dict[str, Dict[str, Sequence[float]]]] = None,
+                 path: Optional[str] = None):
+        self.path = path
+        self.points: Dict[str, Dict[str, Tuple[float, float]]] = {'landfill': dict(DEFAULT_LANDFILLS)}
+        for kind, named in (points or {}).items():
+            self.points.setdefault(kind, {}).update({n: (float(p[0]), float(p[1])) for n, p in named.items()})
+        self._indexes: Dict[str, FacilityIndex] = {}
+        self._matrices: Dict[Tuple[str, str], np.ndarray] = {}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_GEO_PATH) -> 'GeoRegistry':
+        """Stored registry, or one holding only the default landfills"""
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path) as f:
+            return cls(json.load(f), path)
+
+    def save(self):
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.points, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def add(self, kind: str, frame: pd.DataFrame) -> int:
+        """Register points from a frame with name, latitude and longitude columns"""
+        named = self.points.setdefault(kind, {})
+        for name, lat, lon in zip(frame['name'].astype(str), frame['latitude'].astype(float),
+                                  frame['longitude'].astype(float)):
+            named[name] = (lat, lon)
+        self._indexes.pop(kind, None)
+        self._matrices = {key: m for key, m in self._matrices.items() if kind not in key}
+        return len(frame)
+
+    def _names_and_coordinates(self, kind: str) -> Tuple[List[str], np.ndarray]:
+        named = self.points.get(kind, {})
+        return list(named), np.array(list(named.values()), dtype=float).reshape(-1, 2)
+
+    def index(self, kind: str) -> FacilityIndex:
+        if kind not in self._indexes:
+            if not self.points.get(kind):
+                raise KeyError(f'No {kind} coordinates registered')
+            self._indexes[kind] = FacilityIndex(*self._names_and_coordinates(kind))
+        return self._indexes[kind]
+
+    def matrix(self, kind_a: str, kind_b: str) -> np.ndarray:
+        """Distances between all points of two kinds, in registration order"""
+        key = (kind_a, kind_b)
+        if key not in self._matrices:
+            self._matrices[key] = distance_matrix(self._names_and_coordinates(kind_a)[1],
+                                                  self._names_and_coordinates(kind_b)[1])
+        return self._matrices[key]
+
+    def coordinates(self, kind: str, names: pd.Series) -> np.ndarray:
+        """(lat, lon) of each name, NaN where it is not registered"""
+        named = self.points.get(kind, {})
+        lookup = pd.Series(range(len(named)), index=list(named), dtype=float)
+        positions = names.map(lookup).to_numpy(dtype=float)
+        coordinates = np.full((len(names), 2), np.nan)
+        known = ~np.isnan(positions)
+        coordinates[known] = self._names_and_coordinates(kind)[1][positions[known].astype(int)]
+        return coordinates
+
+    def pair_distances(self, kind_a: str, names_a: pd.Series, kind_b: str, names_b: pd.Series) -> np.ndarray:
+        """Distances between named points of two kinds, gathered from the precomputed matrix"""
+        rows = names_a.map({n: i for i, n in enumerate(self.points.get(kind_a, {}))})
+        columns = names_b.map({n: i for i, n in enumerate(self.points.get(kind_b, {}))})
+        known = (rows.notna() & columns.notna()).to_numpy()
+        distances = np.full(len(names_a), np.nan)
+        if known.any():
+            distances[known] = self.matrix(kind_a, kind_b)[rows[known].astype(int), columns[known].astype(int)]
+        return distances
+
+    def nearest(self, kind: str, lat: Any, lon: Any, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        return self.index(kind).query(lat, lon, k)
+
+
+def _text(df: pd.DataFrame, column: str) -> pd.Series:
+    if column not in df.columns:
+        return pd.Series(np.nan, index=df.index, dtype=object)
+    values = df[column].astype(str).str.strip()
+    return values.where(df[column].notna() & (values != '')).astype(object)
+
+
+def _number(df: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def _endpoint(df: pd.DataFrame, registry: GeoRegistry, kind: str, columns: Dict[str, str]) -> Tuple[np.ndarray, pd.Series]:
+    """Coordinates of one trip end: explicit latitude/longitude, else the registered name"""
+    names = _text(df, columns[kind])
+    coordinates = registry.coordinates(kind, names)
+    explicit = np.column_stack([_number(df, columns[f'{kind}_lat']), _number(df, columns[f'{kind}_lon'])])
+    given = ~np.isnan(explicit).any(axis=1)
+    coordinates[given] = explicit[given]
+    return coordinates, names.where(~given)
+
+
+def fill_transport(df: pd.DataFrame, registry: Optional[GeoRegistry] = None, columns: Optional[Dict[str, str]] = None,
+                   circuity: float = 1.0) -> Dict[str, Any]:
+    """Fill missing transport distances and end-of-life landfills of a whole frame in place
+
+    A blank distance becomes the great-circle distance from the row's site to
+    its destination (times ``circuity`` for the detour of real routes); named
+    pairs are read from the registry's precomputed matrix, others computed
+    row-wise. A blank landfill becomes the landfill nearest to the site.
+    Rows whose ends cannot be located are left blank.
+    """
+    registry = registry or GeoRegistry.load()
+    columns = columns or CSV_COLUMNS
+    site, site_names = _endpoint(df, registry, 'site', columns)
+    filled = {'distance': 0, 'landfill': 0}
+
+    distance = _number(df, columns['distance'])
+    missing = np.isnan(distance)
+    if missing.any():
+        destination, destination_names = _endpoint(df, registry, 'destination', columns)
+        computed = haversine_km(site[:, 0], site[:, 1], destination[:, 0], destination[:, 1])
+        named = registry.pair_distances('site', site_names, 'destination', destination_names)
+        computed = np.where(np.isnan(named), computed, named) * circuity
+        fill = missing & ~np.isnan(computed)
+        if fill.any():
+            df[columns['distance']] = np.where(fill, np.round(computed, 1), distance)
+            filled['distance'] = int(fill.sum())
+
+    landfill = _text(df, columns['landfill'])
+    fill = (landfill.isna().to_numpy()) & ~np.isnan(site).any(axis=1)
+    if fill.any():
+        names, _ = registry.nearest('landfill', site[fill, 0], site[fill, 1])
+        landfill = landfill.to_numpy(dtype=object, copy=True)
+        landfill[fill] = names
+        df[columns['landfill']] = landfill
+        filled['landfill'] = int(fill.sum())
+    return filled
+
+
+def has_location(record: Dict[str, Any], columns: Optional[Dict[str, str]] = None) -> bool:
+    """Whether a record names or places its site or destination"""
+    columns = columns or FORM_COLUMNS
+    return any(record.get(columns[key]) not in (None, '') for key in
+               ('site', 'site_lat', 'destination', 'destination_lat'))
+
+
+def fill_records(records: List[Dict[str, Any]], registry: Optional[GeoRegistry] = None) -> List[Dict[str, Any]]:
+    """Form-shaped records with blank transportDistance and landfillLocation filled in one vectorized pass"""
+    located = [i for i, record in enumerate(records) if has_location(record)]
+    if not located:
+        return records
+    frame = pd.DataFrame([records[i] for i in located])
+    fill_transport(frame, registry, FORM_COLUMNS)
+    filled = list(records)
+    for position, i in enumerate(located):
+        record = dict(records[i])
+        for key in ('distance', 'landfill'):
+            column = FORM_COLUMNS[key]
+            value = frame[column].iloc[position] if column in frame.columns else None
+            if not record.get(column) and pd.notna(value) and value != '':
+                record[column] = str(value) if key == 'distance' else value
+        filled[i] = record
+    return filled
+
+
+def fill_record(record: Dict[str, Any], registry: Optional[GeoRegistry] = None) -> Dict[str, Any]:
+    """fill_records for a single form"""
+    return fill_records([record], registry)[0]
+
+
+def main():
+    """Main function for command line usage: register points, fill records or query nearest facilities"""
+    if len(sys.argv) < 3 or sys.argv[1] not in ('add', 'fill', 'nearest'):
+        print(json.dumps({'success': False, 'error': 'Usage: python geo.py add <kind> <csv_path>|fill <json>|nearest <json>'}))
+        return
+
+    try:
+        registry = GeoRegistry.load()
+        if sys.argv[1] == 'add':
+            data = {'added': registry.add(sys.argv[2], pd.read_csv(sys.argv[3]))}
+            registry.save()
+        elif sys.argv[1] == 'fill':
+            frame = pd.DataFrame(json.loads(sys.argv[2]))
+            filled = fill_transport(frame, registry, FORM_COLUMNS if 'transportDistance' in frame.columns
+                                    or 'landfillLocation' in frame.columns else CSV_COLUMNS)
+            data = {'filled': filled, 'records': json.loads(frame.to_json(orient='records'))}
+        else:
+            request = json.loads(sys.argv[2])
+            names, distances = registry.nearest(request.get('kind', 'landfill'), request['lat'], request['lon'],
+                                                request.get('k', 1))
+            data = {'names': names.tolist(), 'distances_km': np.round(distances, 2).tolist()}
+        print(json.dumps({'success': True, 'data': data}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
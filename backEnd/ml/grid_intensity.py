@@ -0,0 +1,222 @@
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional, Sequence
+
+DEFAULT_GRID_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grid_intensity')
+
+# Flat factor used by LCAPipeline and calculate_lca_row (kg CO2 per kWh)
+DEFAULT_ELECTRICITY_FACTOR = 0.5
+
+SECONDS_PER_HOUR = 3600
+
+# Epoch seconds standing for a missing or unparseable timestamp
+MISSING_TIME = np.iinfo(np.int64).min
+
+# Series directories kept on disk: the current one and the one readers may still be opening
+KEEP_SERIES = 2
+
+
+def to_epoch_seconds(values: Any) -> np.ndarray:
+    """Epoch seconds from numbers (taken as epoch seconds), datetimes or ISO strings
+
+    Missing, blank or unparseable timestamps become MISSING_TIME.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu':
+        return array.astype(np.int64)
+    if array.dtype.kind == 'f':
+        return np.where(np.isfinite(array), np.nan_to_num(array), MISSING_TIME).astype(np.int64)
+    text = array.dtype.kind in 'OUS'
+    series = pd.Series(array.reshape(-1))
+    if text:
+        series = series.where(series.astype(str).str.strip() != '')
+    stamps = pd.to_datetime(series, utc=True, format='ISO8601' if text else None, errors='coerce')
+    seconds = (stamps - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    return seconds.fillna(MISSING_TIME).to_numpy(dtype=np.int64).reshape(array.shape)
+
+
+class GridIntensityStore:
+    """Memory-mapped time series of grid carbon intensity per region
+
+    All regions share three flat arrays on disk: sample start times (epoch
+    seconds, sorted within a region), intensities (kg CO2/kWh, float32) and
+    the running integral of intensity over time (kg CO2/kWh * h, float64) that
+    restarts at 0 for every region. A sample holds until the next one starts;
+    the first and last samples extend flat beyond the covered range. Point
+    lookups are a ``searchsorted`` per region, and the mean intensity over an
+    interval is the difference of two prefix-integral lookups divided by its
+    length, so cost does not depend on how many hours an interval spans.
+
+    Each build writes its arrays into a new series directory and then points
+    index.json at it, so open stores keep reading the arrays they mapped.
+    """
+
+    def __init__(self, root: str = DEFAULT_GRID_DIR):
+        self.root = root
+        with open(os.path.join(root, 'index.json')) as f:
+            index = json.load(f)
+        self.regions: Dict[str, List[int]] = index['regions']
+        self.default_factor = index.get('default_factor', DEFAULT_ELECTRICITY_FACTOR)
+        series = os.path.join(root, index.get('series', ''))
+        self.timestamps = np.load(os.path.join(series, 'timestamps.npy'), mmap_mode='r')
+        self.intensity = np.load(os.path.join(series, 'intensity.npy'), mmap_mode='r')
+        self.cumulative = np.load(os.path.join(series, 'cumulative.npy'), mmap_mode='r')
+
+    @staticmethod
+    def write(frame: pd.DataFrame, root: str = DEFAULT_GRID_DIR,
+              default_factor: float = DEFAULT_ELECTRICITY_FACTOR) -> Dict[str, Any]:
+        """Build the store from a frame with region, timestamp and intensity columns"""
+        df = pd.DataFrame({
+            'region': frame['region'].astype(str).to_numpy(),
+            'timestamp': to_epoch_seconds(frame['timestamp'].to_numpy()),
+            'intensity': pd.to_numeric(frame['intensity'], errors='coerce').to_numpy(dtype=float)
+        }).dropna(subset=['intensity'])
+        df = df[df['timestamp'] != MISSING_TIME]
+        df = df.sort_values(['region', 'timestamp'], kind='stable').drop_duplicates(['region', 'timestamp'], keep='last')
+
+        timestamps = df['timestamp'].to_numpy(dtype=np.int64)
+        intensity = df['intensity'].to_numpy(dtype=np.float32)
+        cumulative = np.zeros(len(df))
+        regions = {}
+        start = 0
+        for region, count in df['region'].value_counts(sort=False).sort_index().items():
+            end = start + int(count)
+            hours = np.diff(timestamps[start:end]) / SECONDS_PER_HOUR
+            cumulative[start + 1:end] = np.cumsum(intensity[start:end - 1] * hours)
+            regions[region] = [start, end]
+            start = end
+
+        # Never overwrite arrays a running service has mapped; index.json switches series last
+        series = f'series-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+        os.makedirs(os.path.join(root, series))
+        np.save(os.path.join(root, series, 'timestamps.npy'), timestamps)
+        np.save(os.path.join(root, series, 'intensity.npy'), intensity)
+        np.save(os.path.join(root, series, 'cumulative.npy'), cumulative)
+        tmp_path = os.path.join(root, 'index.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'regions': regions, 'default_factor': default_factor, 'series': series}, f)
+        os.replace(tmp_path, os.path.join(root, 'index.json'))
+
+        # Unlinking leaves mapped files readable, but keep the previous series for stores still opening it
+        for old in sorted(name for name in os.listdir(root) if name.startswith('series-'))[:-KEEP_SERIES]:
+            if old != series:
+                shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+        return {'regions': len(regions), 'samples': len(df), 'series': series}
+
+    @classmethod
+    def load(cls, root: str = DEFAULT_GRID_DIR) -> Optional['GridIntensityStore']:
+        """Open a stored series, or None when none has been built"""
+        if not os.path.exists(os.path.join(root, 'index.json')):
+            return None
+        return cls(root)
+
+    def _groups(self, regions: Sequence[str]):
+        codes, names = pd.factorize(np.asarray(regions, dtype=str))
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        for i, name in enumerate(names):
+            yield name, self.regions.get(name), order[bounds[i]:bounds[i + 1]]
+
+    def _sample(self, start: int, end: int, t: np.ndarray) -> np.ndarray:
+        """Position (relative to the region) of the sample in force at each time"""
+        return np.clip(np.searchsorted(self.timestamps[start:end], t, side='right') - 1, 0, end - start - 1)
+
+    def _integral(self, start: int, end: int, t: np.ndarray) -> np.ndarray:
+        """Integral of intensity from the region's first sample to each time, in kg CO2/kWh * h"""
+        k = self._sample(start, end, t)
+        elapsed = (t - self.timestamps[start:end][k]) / SECONDS_PER_HOUR
+        return self.cumulative[start:end][k] + self.intensity[start:end][k] * elapsed
+
+    def intensity_at(self, regions: Sequence[str], timestamps: Any, default: Optional[float] = None) -> np.ndarray:
+        """Intensity in force at each (region, timestamp)
+
+        Unknown regions and missing timestamps get ``default``, the caller's
+        flat factor, or the one stored with the series when none is given.
+        """
+        t = to_epoch_seconds(timestamps)
+        result = np.full(len(t), self.default_factor if default is None else default, dtype=float)
+        for _, bounds, rows in self._groups(regions):
+            if bounds is None:
+                continue
+            start, end = bounds
+            rows = rows[t[rows] != MISSING_TIME]
+            result[rows] = self.intensity[start:end][self._sample(start, end, t[rows])]
+        return result
+
+    def average_intensity(self, regions: Sequence[str], starts: Any, ends: Any,
+                          default: Optional[float] = None) -> np.ndarray:
+        """Time-weighted mean intensity over each consumption interval
+
+        Zero-length intervals, and intervals without an end, fall back to the
+        point intensity at their start; unknown regions and rows without a
+        start get ``default`` as in intensity_at.
+        """
+        t0 = to_epoch_seconds(starts)
+        t1 = to_epoch_seconds(ends)
+        t1 = np.where(t1 == MISSING_TIME, t0, t1)
+        result = np.full(len(t0), self.default_factor if default is None else default, dtype=float)
+        for _, bounds, rows in self._groups(regions):
+            if bounds is None:
+                continue
+            start, end = bounds
+            rows = rows[t0[rows] != MISSING_TIME]
+            a, b = t0[rows], t1[rows]
+            hours = (b - a) / SECONDS_PER_HOUR
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = (self._integral(start, end, b) - self._integral(start, end, a)) / hours
+            point = hours == 0
+            if point.any():
+                mean[point] = self.intensity[start:end][self._sample(start, end, a[point])]
+            result[rows] = mean
+        return result
+
+    def emissions(self, regions: Sequence[str], starts: Any, ends: Any, kwh: Any,
+                  default: Optional[float] = None) -> np.ndarray:
+        """kg CO2 of each metered record, assuming constant draw over its interval"""
+        return np.asarray(kwh, dtype=float) * self.average_intensity(regions, starts, ends, default)
+
+    def coverage(self) -> Dict[str, Any]:
+        """Sample count and first/last sample time per region"""
+        return {
+            region: {
+                'samples': end - start,
+                'first': pd.Timestamp(int(self.timestamps[start]), unit='s', tz='UTC').isoformat(),
+                'last': pd.Timestamp(int(self.timestamps[end - 1]), unit='s', tz='UTC').isoformat()
+            } for region, (start, end) in self.regions.items()
+        }
+
+
+def main():
+    """Main function for command line usage: build the store from a CSV or look up intervals"""
+    if len(sys.argv) != 3 or sys.argv[1] not in ('build', 'lookup'):
+        print(json.dumps({'success': False, 'error': 'Usage: python grid_intensity.py build <csv_path>|lookup <json>'}))
+        return
+
+    try:
+        if sys.argv[1] == 'build':
+            info = GridIntensityStore.write(pd.read_csv(sys.argv[2]))
+            print(json.dumps({'success': True, 'data': info}))
+            return
+        request = json.loads(sys.argv[2])
+        store = GridIntensityStore.load(request.get('root', DEFAULT_GRID_DIR))
+        if store is None:
+            raise ValueError('No grid intensity series has been built')
+        records = pd.DataFrame(request['records'])
+        ends = records['end'] if 'end' in records.columns else records['start']
+        factors = store.average_intensity(records['region'], records['start'].to_numpy(), ends.to_numpy())
+        data = {'intensity': factors.round(6).tolist()}
+        if 'kwh' in records.columns:
+            data['emissions'] = (records['kwh'].to_numpy(dtype=float) * factors).round(4).tolist()
+        print(json.dumps({'success': True, 'data': data}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
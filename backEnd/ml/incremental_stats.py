@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import sys
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional, Union
+from csv_ml_service import calculate_lca_frame, lca_recommendation_masks
+from sketches import QuantileSketch
+
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aggregates')
+
+# Columns whose running sums back the summary_stats and end-of-life averages
+TRACKED_COLUMNS = ['carbonEmissions', 'energyConsumed', 'waterUse', 'circularityPercent',
+                   'RecyclePercent', 'ReusePercent', 'LandfillPercent']
+
+CIRCULARITY_BIN_EDGES = list(range(0, 101, 10))
+
+
+class IncrementalAggregates:
+    """Persistent, mergeable aggregate state for one append-only plant dataset
+
+    Holds running sums, counts, fixed-bin histograms and quantile sketches so a
+    daily upload only pays for the rows it adds or retracts. Everything except
+    the concentrate mass totals (which depend on the batch-wide maximum of the
+    predicted carbon) can be maintained this way.
+    """
+
+    def __init__(self, dataset_id: str, state_dir: str = DEFAULT_STATE_DIR):
+        self.dataset_id = dataset_id
+        self.state_dir = state_dir
+        self.rows = 0
+        self.sums = {c: 0.0 for c in TRACKED_COLUMNS}
+        self.sums_sq = {c: 0.0 for c in TRACKED_COLUMNS}
+        self.materials: Dict[str, int] = {}
+        self.recommendations: Dict[str, int] = {}
+        self.circularity_histogram = [0] * (len(CIRCULARITY_BIN_EDGES) - 1)
+        self.carbon_sketch = QuantileSketch()
+
+    @property
+    def path(self) -> str:
+        safe_id = ''.join(c if c.isalnum() or c in '-_' else '_' for c in self.dataset_id)
+        return os.path.join(self.state_dir, f'{safe_id}.json')
+
+    @classmethod
+    def load(cls, dataset_id: str, state_dir: str = DEFAULT_STATE_DIR) -> 'IncrementalAggregates':
+        """Load the stored state for a dataset, or start an empty one"""
+        state = cls(dataset_id, state_dir)
+        if os.path.exists(state.path):
+            with open(state.path) as f:
+                state.restore(json.load(f))
+        return state
+
+    def restore(self, data: Dict[str, Any]):
+        """Replace the state with one produced by to_dict"""
+        self.rows = data['rows']
+        self.sums.update(data['sums'])
+        self.sums_sq.update(data['sums_sq'])
+        self.materials = data['materials']
+        self.recommendations = data['recommendations']
+        self.circularity_histogram = data['circularity_histogram']
+        self.carbon_sketch = QuantileSketch.from_dict(data['carbon_sketch'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'dataset_id': self.dataset_id,
+            'rows': self.rows,
+            'sums': self.sums,
+            'sums_sq': self.sums_sq,
+            'materials': self.materials,
+            'recommendations': self.recommendations,
+            'circularity_histogram': self.circularity_histogram,
+            'carbon_sketch': self.carbon_sketch.to_dict()
+        }
+
+    def save(self):
+        """Write the state atomically so a crash never leaves a partial file"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, rows: Union[List[Dict[str, Any]], pd.DataFrame], sign: int, model=None):
+        if len(rows) == 0:
+            return
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        lca = calculate_lca_frame(df, model)
+        for c in ['RecyclePercent', 'ReusePercent', 'LandfillPercent']:
+            lca[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0) if c in df.columns else 0.0
+
+        self.rows += sign * len(df)
+        for c in TRACKED_COLUMNS:
+            values = lca[c].to_numpy(dtype=float)
+            self.sums[c] += sign * float(values.sum())
+            self.sums_sq[c] += sign * float((values ** 2).sum())
+
+        if 'MaterialType' in df.columns:
+            for material, count in df['MaterialType'].value_counts().items():
+                remaining = self.materials.get(material, 0) + sign * int(count)
+                if remaining > 0:
+                    self.materials[material] = remaining
+                else:
+                    self.materials.pop(material, None)
+
+        for rec, mask in lca_recommendation_masks(df, model).items():
+            self.recommendations[rec] = self.recommendations.get(rec, 0) + sign * int(mask.sum())
+
+        counts, _ = np.histogram(lca['circularityPercent'], bins=CIRCULARITY_BIN_EDGES)
+        self.circularity_histogram = [h + sign * int(c) for h, c in zip(self.circularity_histogram, counts)]
+
+        if sign > 0:
+            self.carbon_sketch.add(lca['carbonEmissions'].to_numpy())
+        else:
+            self.carbon_sketch.remove(lca['carbonEmissions'].to_numpy())
+
+    def fold(self, rows: Union[List[Dict[str, Any]], pd.DataFrame], model=None):
+        """Fold newly uploaded rows into the state (with the given 'csv' model, or the current one)"""
+        self._update(rows, 1, model)
+
+    def retract(self, rows: Union[List[Dict[str, Any]], pd.DataFrame], model=None):
+        """Remove previously folded rows (e.g. corrected or deleted uploads)"""
+        self._update(rows, -1, model)
+
+    def merge(self, other: 'IncrementalAggregates'):
+        """Combine the state of another dataset or partition into this one"""
+        self.rows += other.rows
+        for c in TRACKED_COLUMNS:
+            self.sums[c] += other.sums[c]
+            self.sums_sq[c] += other.sums_sq[c]
+        for material, count in other.materials.items():
+            self.materials[material] = self.materials.get(material, 0) + count
+        for rec, count in other.recommendations.items():
+            self.recommendations[rec] = self.recommendations.get(rec, 0) + count
+        self.circularity_histogram = [a + b for a, b in zip(self.circularity_histogram,
+                                                            other.circularity_histogram)]
+        self.carbon_sketch.merge(other.carbon_sketch)
+
+    def _mean(self, column: str) -> float:
+        return self.sums[column] / self.rows if self.rows else 0.0
+
+    def _std(self, column: str) -> float:
+        if not self.rows:
+            return 0.0
+        variance = self.sums_sq[column] / self.rows - self._mean(column) ** 2
+        return math.sqrt(max(0.0, variance))
+
+    def summary(self) -> Dict[str, Any]:
+        """Summary in the shape of the process_csv_data response sections"""
+        top_recommendations = sorted(
+            ({"recommendation": rec, "frequency": count}
+             for rec, count in self.recommendations.items() if count > 0),
+            key=lambda r: r['frequency'], reverse=True)[:5]
+
+        return {
+            "summary_stats": {
+                "total_rows": self.rows,
+                "avg_carbon_emissions": self._mean('carbonEmissions'),
+                "avg_energy_consumed": self._mean('energyConsumed'),
+                "avg_water_use": self._mean('waterUse'),
+                "avg_circularity": self._mean('circularityPercent'),
+                "std_carbon_emissions": self._std('carbonEmissions'),
+                "carbon_emissions_quantiles": {
+                    "p50": self.carbon_sketch.quantile(0.5),
+                    "p90": self.carbon_sketch.quantile(0.9),
+                    "p99": self.carbon_sketch.quantile(0.99)
+                }
+            },
+            "top_recommendations": top_recommendations,
+            "material_distribution": dict(self.materials),
+            "charts_data": {
+                "circularity_histogram": {
+                    "bin_edges": CIRCULARITY_BIN_EDGES,
+                    "counts": self.circularity_histogram
+                },
+                "end_of_life": {
+                    "recycle": self._mean('RecyclePercent'),
+                    "reuse": self._mean('ReusePercent'),
+                    "landfill": self._mean('LandfillPercent')
+                }
+            }
+        }
+
+
+def refresh_dataset(dataset_id: str, added_rows: List[Dict[str, Any]],
+                    removed_rows: Optional[List[Dict[str, Any]]] = None,
+                    state_dir: str = DEFAULT_STATE_DIR) -> Dict[str, Any]:
+    """Apply a daily delta to a dataset's stored aggregates and return the refreshed summary"""
+    try:
+        state = IncrementalAggregates.load(dataset_id, state_dir)
+        state.retract(removed_rows or [])
+        state.fold(added_rows)
+        state.save()
+        return {"success": True, "dataset_id": dataset_id, **state.summary()}
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "Failed to refresh dataset aggregates"
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        request = json.loads(sys.argv[1])
+        result = refresh_dataset(request['dataset_id'], request.get('added', []), request.get('removed', []))
+        print(json.dumps(result))
+    else:
+        print(json.dumps({"success": False, "error": "No input data provided"}))
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+from typing import Dict, List, Any, Optional, Tuple
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knn_imputer.joblib')
+
+IMPUTED_FIELDS = ['electricityConsumption', 'fuelEnergy', 'transportDistance']
+
+# Column names of the CSV upload mapped onto the form fields
+CSV_FIELD_NAMES = {
+    'MaterialType': 'materialType',
+    'ElectricityConsumption_kWh': 'electricityConsumption',
+    'FuelEnergy_MJ': 'fuelEnergy',
+    'TransportDistance_km': 'transportDistance'
+}
+
+# Pool of every material, used when a material has too little history
+ALL_MATERIALS = '__all__'
+
+
+class NeighbourImputer:
+    """k-nearest-neighbour imputation of electricity, fuel energy and transport distance
+
+    Historical complete records are kept per material. For every pattern of
+    known fields a KD-tree is built over those fields (scaled by the material's
+    standard deviation) and the missing fields are filled with the
+    inverse-distance weighted mean of the neighbours. Confidence falls with the
+    neighbours' spread and their distance from the query.
+    """
+
+    def __init__(self, k: int = 5, min_history: int = 20, leaf_size: int = 40):
+        self.k = k
+        self.min_history = min_history
+        self.leaf_size = leaf_size
+        self.history: Dict[str, np.ndarray] = {}
+        self._trees: Dict[Tuple[str, Tuple[int, ...]], KDTree] = {}
+
+    @staticmethod
+    def _frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+        df = pd.DataFrame(records).rename(columns=CSV_FIELD_NAMES)
+        if 'materialType' not in df.columns:
+            df['materialType'] = 'Iron Ore'
+        df['materialType'] = df['materialType'].fillna('Iron Ore').astype(str)
+        for field in IMPUTED_FIELDS:
+            if field not in df.columns:
+                df[field] = np.nan
+            # Blank strings and zeros are what the forms send for "unknown"
+            df[field] = pd.to_numeric(df[field], errors='coerce').replace(0, np.nan)
+        return df
+
+    @property
+    def materials(self) -> List[str]:
+        return [m for m in self.history if m != ALL_MATERIALS]
+
+    def partial_fit(self, records: List[Dict[str, Any]]) -> int:
+        """Add complete historical records; only the touched materials' trees are rebuilt"""
+        df = self._frame(records)
+        complete = df.dropna(subset=IMPUTED_FIELDS)
+        if complete.empty:
+            return 0
+        for material, group in complete.groupby('materialType'):
+            self._append(material, group[IMPUTED_FIELDS].to_numpy(dtype=float))
+        self._append(ALL_MATERIALS, complete[IMPUTED_FIELDS].to_numpy(dtype=float))
+        return len(complete)
+
+    def fit(self, records: List[Dict[str, Any]]) -> int:
+        self.history = {}
+        self._trees = {}
+        return self.partial_fit(records)
+
+    def _append(self, material: str, values: np.ndarray):
+        existing = self.history.get(material)
+        self.history[material] = values if existing is None else np.vstack([existing, values])
+        self._trees = {key: tree for key, tree in self._trees.items() if key[0] != material}
+
+    def _pool(self, material: str) -> str:
+        history = self.history.get(material)
+        return material if history is not None and len(history) >= self.min_history else ALL_MATERIALS
+
+    def _scale(self, pool: str) -> np.ndarray:
+        scale = self.history[pool].std(axis=0)
+        return np.where(scale > 0, scale, 1.0)
+
+    def _tree(self, pool: str, known: Tuple[int, ...]) -> KDTree:
+        key = (pool, known)
+        if key not in self._trees:
+            points = self.history[pool][:, list(known)] / self._scale(pool)[list(known)]
+            self._trees[key] = KDTree(points, leaf_size=self.leaf_size)
+        return self._trees[key]
+
+    def impute(self, records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Fill missing fields for a batch, querying one tree per (material, known fields) group"""
+        if ALL_MATERIALS not in self.history:
+            raise ValueError('Imputer has no historical records')
+        df = self._frame(records)
+        values = df[IMPUTED_FIELDS].to_numpy(dtype=float)
+        missing = np.isnan(values)
+        confidence = np.full(values.shape, np.nan)
+
+        pools = df['materialType'].map(self._pool)
+        patterns = [tuple(np.flatnonzero(~row)) for row in missing]
+        groups = pd.DataFrame({'pool': pools, 'pattern': patterns}).groupby(['pool', 'pattern']).indices
+
+        for (pool, known), rows in groups.items():
+            targets = [i for i in range(len(IMPUTED_FIELDS)) if i not in known]
+            if not targets:
+                continue
+            history = self.history[pool]
+            if known:
+                k = min(self.k, len(history))
+                scale = self._scale(pool)[list(known)]
+                distances, indices = self._tree(pool, known).query(values[np.ix_(rows, known)] / scale, k=k)
+                weights = 1.0 / (distances + 1e-6)
+                neighbours = history[indices][:, :, targets]
+                estimate = (neighbours * weights[:, :, None]).sum(axis=1) / weights.sum(axis=1)[:, None]
+                spread = neighbours.std(axis=1)
+                mean_distance = distances.mean(axis=1)[:, None]
+            else:
+                # Nothing to match on: use the material's median and overall spread
+                estimate = np.repeat(np.median(history[:, targets], axis=0)[None, :], len(rows), axis=0)
+                spread = np.repeat(history[:, targets].std(axis=0)[None, :], len(rows), axis=0)
+                mean_distance = np.ones((len(rows), 1))
+            variation = spread / np.maximum(np.abs(estimate), 1e-9)
+            values[np.ix_(rows, targets)] = estimate
+            confidence[np.ix_(rows, targets)] = np.clip(1.0 / (1.0 + variation) / (1.0 + mean_distance), 0.0, 1.0)
+
+        return {'values': values, 'missing': missing, 'confidence': confidence}
+
+    def impute_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Completed form fields with per-field confidence for every imputed value"""
+        result = self.impute(records)
+        output = []
+        for i in range(len(records)):
+            completed = {}
+            scores = {}
+            for j, field in enumerate(IMPUTED_FIELDS):
+                if result['missing'][i, j]:
+                    completed[field] = str(round(float(result['values'][i, j])))
+                    scores[field] = round(float(result['confidence'][i, j]), 3)
+            output.append({'completed': completed, 'confidence_scores': scores})
+        return output
+
+    def save(self, path: str = DEFAULT_INDEX_PATH):
+        """Persist the history together with the trees built so far"""
+        joblib.dump({'k': self.k, 'min_history': self.min_history, 'leaf_size': self.leaf_size,
+                     'history': self.history, 'trees': self._trees}, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH) -> Optional['NeighbourImputer']:
+        """Load a persisted imputer, or None when no index has been built yet"""
+        if not os.path.exists(path):
+            return None
+        state = joblib.load(path)
+        imputer = cls(state['k'], state['min_history'], state['leaf_size'])
+        imputer.history = state['history']
+        imputer._trees = state['trees']
+        return imputer
+
+
+def main():
+    """Main function for command line usage: fit/update the index or impute records"""
+    if len(sys.argv) != 3 or sys.argv[1] not in ('fit', 'update', 'impute'):
+        print(json.dumps({'success': False, 'error': 'Usage: python knn_imputer.py fit|update|impute <records_json>'}))
+        return
+
+    try:
+        command = sys.argv[1]
+        records = json.loads(sys.argv[2])
+        imputer = NeighbourImputer.load() if command != 'fit' else None
+        if command == 'impute':
+            if imputer is None:
+                raise ValueError('No imputation index has been built')
+            print(json.dumps({'success': True, 'data': imputer.impute_records(records)}))
+            return
+        imputer = imputer or NeighbourImputer()
+        added = imputer.fit(records) if command == 'fit' else imputer.partial_fit(records)
+        imputer.save()
+        print(json.dumps({'success': True, 'records_added': added, 'materials': imputer.materials}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
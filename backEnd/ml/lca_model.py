@@ -0,0 +1,646 @@
+import ast
+import hashlib
+import json
+import sys
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Dict, List, Any, Union
+from grid_intensity import DEFAULT_ELECTRICITY_FACTOR
+
+# --- Factor tables shared by the model variants and the classes built on them ---
+
+# LCAPipeline: kg CO2 per MJ of fuel, keyed by lower_snake_case name
+PIPELINE_FUEL_FACTORS = {
+    'natural_gas': 0.18,
+    'coal': 0.34,
+    'diesel': 0.27,
+    'petrol': 0.25,
+    'biomass': 0.05,
+    'lpg': 0.21
+}
+
+# LCAPipeline: kg CO2 per ton-km
+PIPELINE_TRANSPORT_FACTORS = {
+    'truck': 0.12,
+    'ship': 0.015,
+    'rail': 0.03,
+    'air': 0.8
+}
+
+PIPELINE_MATERIAL_FACTORS = {
+    'bauxite': {'energy_intensity': 15.0, 'water_use': 2.5, 'waste_factor': 0.3},
+    'copper': {'energy_intensity': 18.5, 'water_use': 3.2, 'waste_factor': 0.4},
+    'gold': {'energy_intensity': 45.0, 'water_use': 8.0, 'waste_factor': 0.8},
+    'iron_ore': {'energy_intensity': 12.0, 'water_use': 2.0, 'waste_factor': 0.25},
+    'zinc': {'energy_intensity': 14.5, 'water_use': 2.8, 'waste_factor': 0.35},
+    'silver': {'energy_intensity': 35.0, 'water_use': 6.5, 'waste_factor': 0.6},
+    'nickel': {'energy_intensity': 22.0, 'water_use': 4.0, 'waste_factor': 0.45},
+    'platinum': {'energy_intensity': 50.0, 'water_use': 9.0, 'waste_factor': 0.9}
+}
+
+PIPELINE_LANDFILL_FACTORS = {
+    'ghazipur_delhi': {'methane_factor': 1.2, 'leachate_factor': 1.1},
+    'deonar_mumbai': {'methane_factor': 1.0, 'leachate_factor': 1.0},
+    'kodungaiyur_chennai': {'methane_factor': 0.9, 'leachate_factor': 0.95}
+}
+
+# ml_predict: multipliers of the base carbon, energy and water estimates
+PREDICT_MATERIAL_FACTORS = {
+    'Bauxite': {'carbon': 1.2, 'energy': 1.1, 'water': 1.3},
+    'Copper': {'carbon': 1.5, 'energy': 1.2, 'water': 1.4},
+    'Gold': {'carbon': 2.8, 'energy': 2.0, 'water': 2.5},
+    'Iron Ore': {'carbon': 1.0, 'energy': 1.0, 'water': 1.0},
+    'Zinc': {'carbon': 1.3, 'energy': 1.1, 'water': 1.2},
+    'Silver': {'carbon': 2.2, 'energy': 1.8, 'water': 2.0},
+    'Nickel': {'carbon': 1.8, 'energy': 1.5, 'water': 1.6},
+    'Platinum': {'carbon': 3.0, 'energy': 2.5, 'water': 2.8}
+}
+
+PREDICT_FUEL_FACTORS = {
+    'Natural Gas': 0.18,
+    'Coal': 0.34,
+    'Diesel': 0.27,
+    'Petrol': 0.25,
+    'Biomass': 0.05,
+    'LPG': 0.21
+}
+
+PREDICT_TRANSPORT_FACTORS = {
+    'Truck': 0.12,
+    'Ship': 0.015,
+    'Rail': 0.03,
+    'Air': 0.8
+}
+
+# SmartAIAssistant: material data patterns, fuel efficiency and transport factors
+SMART_FILL_MATERIALS = {
+    'Bauxite': {'avg_electricity': 1500, 'avg_fuel': 2200, 'density': 2.7, 'co2_factor': 1.2},
+    'Copper': {'avg_electricity': 1800, 'avg_fuel': 2500, 'density': 8.9, 'co2_factor': 1.5},
+    'Gold': {'avg_electricity': 3000, 'avg_fuel': 4000, 'density': 19.3, 'co2_factor': 2.8},
+    'Iron Ore': {'avg_electricity': 1200, 'avg_fuel': 1800, 'density': 5.2, 'co2_factor': 1.0},
+    'Zinc': {'avg_electricity': 1400, 'avg_fuel': 2000, 'density': 7.1, 'co2_factor': 1.3},
+    'Silver': {'avg_electricity': 2500, 'avg_fuel': 3500, 'density': 10.5, 'co2_factor': 2.2},
+    'Nickel': {'avg_electricity': 2000, 'avg_fuel': 2800, 'density': 8.9, 'co2_factor': 1.8},
+    'Platinum': {'avg_electricity': 3500, 'avg_fuel': 4500, 'density': 21.5, 'co2_factor': 3.0}
+}
+
+SMART_FILL_FUELS = {
+    'Natural Gas': {'efficiency': 0.85, 'co2_factor': 0.18, 'cost': 1.0},
+    'Coal': {'efficiency': 0.65, 'co2_factor': 0.34, 'cost': 0.7},
+    'Diesel': {'efficiency': 0.75, 'co2_factor': 0.27, 'cost': 1.3},
+    'Petrol': {'efficiency': 0.70, 'co2_factor': 0.25, 'cost': 1.4},
+    'Biomass': {'efficiency': 0.60, 'co2_factor': 0.05, 'cost': 0.9},
+    'LPG': {'efficiency': 0.80, 'co2_factor': 0.21, 'cost': 1.1}
+}
+
+SMART_FILL_TRANSPORT = {
+    'Truck': {'emission_factor': 0.12, 'cost_factor': 1.0, 'max_distance': 1000},
+    'Ship': {'emission_factor': 0.015, 'cost_factor': 0.3, 'max_distance': 10000},
+    'Rail': {'emission_factor': 0.03, 'cost_factor': 0.5, 'max_distance': 5000},
+    'Air': {'emission_factor': 0.8, 'cost_factor': 3.0, 'max_distance': 15000}
+}
+
+# Scalar coefficients of each variant's steps. ``electricity_factor`` (kg CO2
+# per kWh) is the default of the variant's grid factor input where it has one.
+PIPELINE_COEFFICIENTS = {
+    'electricity_factor': DEFAULT_ELECTRICITY_FACTOR,
+    'extraction_co2_factor': 0.3,       # kg CO2 per unit of extraction energy intensity
+    'weight_tons': 10.0,                # transported load
+    'co2_per_litre': 2.3,               # kg CO2 per litre of transport fuel
+    'methane_co2e': 25.0,               # CO2 equivalence of methane
+    'eol_co2_share': 0.1,               # share of landfill methane counted as end-of-life CO2
+    'recycle_weight': 0.7,              # circularity points per recycled percent
+    'reuse_weight': 0.8,                # circularity points per reused percent
+    'circularity_co2_credit': 0.05,     # kg CO2 credited per circularity point
+    'resource_efficiency_weight': 0.8,
+    'efficiency_penalty': 20.0          # efficiency score points per kg CO2 per MJ
+}
+
+CSV_COEFFICIENTS = {
+    'electricity_factor': DEFAULT_ELECTRICITY_FACTOR,
+    'fuel_factor': 0.07,                # kg CO2 per MJ of fuel
+    'transport_factor': 0.2,            # kg CO2 per km
+    'water_per_kwh': 0.5,
+    'water_per_mj': 0.1,
+    'recycle_weight': 0.7,
+    'reuse_weight': 0.5
+}
+
+PREDICT_COEFFICIENTS = {
+    'electricity_factor': 0.5,
+    'weight_tons': 10.0,
+    'recycling_credit': 0.3,            # carbon credit share at 100% recycled content
+    'energy_credit_share': 0.2,         # part of the recycling credit applied to energy
+    'water_credit_share': 0.4,          # part of the recycling credit applied to water
+    'water_per_kwh': 2.5,
+    'water_per_mj': 0.1,
+    'recycle_weight': 0.7,
+    'reuse_weight': 0.8
+}
+
+QUICK_COEFFICIENTS = {
+    'electricity_factor': 0.5,
+    'fuel_factor': 0.2,
+    'transport_factor': 1.2,
+    'efficiency_penalty': 20.0
+}
+
+SMART_FILL_COEFFICIENTS = {
+    'electricity_factor': 0.5,
+    'weight_tons': 10.0,
+    'material_co2_share': 0.1,          # material co2_factor applied per unit of energy input
+    'distance_penalty_km': 50.0,        # km of transport per efficiency point lost
+    'max_distance_penalty': 20.0,
+    'low_carbon_threshold': 1.5,        # material co2_factor below which the bonus applies
+    'low_carbon_bonus': 10.0
+}
+
+
+# Built-in factor tables by name; factor_tables.py layers versioned overrides over these
+FACTOR_TABLES: Dict[str, Dict[str, Any]] = {
+    'PIPELINE_FUEL_FACTORS': PIPELINE_FUEL_FACTORS,
+    'PIPELINE_TRANSPORT_FACTORS': PIPELINE_TRANSPORT_FACTORS,
+    'PIPELINE_MATERIAL_FACTORS': PIPELINE_MATERIAL_FACTORS,
+    'PIPELINE_LANDFILL_FACTORS': PIPELINE_LANDFILL_FACTORS,
+    'PREDICT_MATERIAL_FACTORS': PREDICT_MATERIAL_FACTORS,
+    'PREDICT_FUEL_FACTORS': PREDICT_FUEL_FACTORS,
+    'PREDICT_TRANSPORT_FACTORS': PREDICT_TRANSPORT_FACTORS,
+    'SMART_FILL_MATERIALS': SMART_FILL_MATERIALS,
+    'SMART_FILL_FUELS': SMART_FILL_FUELS,
+    'SMART_FILL_TRANSPORT': SMART_FILL_TRANSPORT,
+    'PIPELINE_COEFFICIENTS': PIPELINE_COEFFICIENTS,
+    'CSV_COEFFICIENTS': CSV_COEFFICIENTS,
+    'PREDICT_COEFFICIENTS': PREDICT_COEFFICIENTS,
+    'QUICK_COEFFICIENTS': QUICK_COEFFICIENTS,
+    'SMART_FILL_COEFFICIENTS': SMART_FILL_COEFFICIENTS
+}
+
+
+def _single(table: Dict[str, float], attribute: str) -> Dict[str, Dict[str, float]]:
+    """Wrap a flat name -> factor table as a one-attribute lookup table"""
+    return {key: {attribute: value} for key, value in table.items()}
+
+
+def _constants(coefficients: Dict[str, float], *inputs: str, **extra: float) -> Dict[str, float]:
+    """Step constants from a coefficient table, leaving out those that are input defaults"""
+    return {**extra, **{name: value for name, value in coefficients.items() if name not in inputs}}
+
+
+# --- Model variants ---
+#
+# A specification lists numeric ``inputs`` (record field and default),
+# ``categories`` (record field, default, key normalization, factor table and
+# the row or values used for unknown keys), named ``constants``, and ordered
+# ``steps`` of expressions. ``category.attribute`` looks a factor up in the
+# category's table; min, max, abs, round and where(cond, a, b) are available.
+# ``outputs`` selects the steps returned and ``flags`` are boolean rules.
+
+def build_specs(tables: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Model variant specifications over the given factor tables (keyed as FACTOR_TABLES)"""
+    return {
+        'pipeline': {
+            'description': 'LCAPipeline.run_full_lca: extraction, processing, transport, end of life and circularity',
+            'inputs': {
+                'electricity_kwh': {'field': 'electricityConsumption', 'default': 0.0},
+                'fuel_mj': {'field': 'fuelEnergy', 'default': 0.0},
+                'distance_km': {'field': 'transportDistance', 'default': 0.0},
+                'recycle_percent': {'field': 'recyclePercent', 'default': 0.0},
+                'reuse_percent': {'field': 'reusePercent', 'default': 0.0},
+                'electricity_factor': {'field': 'electricityFactor',
+                                       'default': tables['PIPELINE_COEFFICIENTS']['electricity_factor']}
+            },
+            'categories': {
+                'material': {'field': 'materialType', 'default': 'Iron Ore', 'normalize': 'key',
+                             'table': tables['PIPELINE_MATERIAL_FACTORS'], 'fallback': 'iron_ore'},
+                'fuel': {'field': 'fuelType', 'default': 'Natural Gas', 'normalize': 'key',
+                         'table': _single(tables['PIPELINE_FUEL_FACTORS'], 'co2'), 'fallback': {'co2': 0.2}},
+                'transport': {'field': 'transportMode', 'default': 'Truck', 'normalize': 'lower',
+                              'table': _single(tables['PIPELINE_TRANSPORT_FACTORS'], 'co2'), 'fallback': {'co2': 0.1}},
+                'landfill': {'field': 'landfillLocation', 'default': 'Deonar Mumbai', 'normalize': 'key',
+                             'table': tables['PIPELINE_LANDFILL_FACTORS'], 'fallback': 'deonar_mumbai'}
+            },
+            'constants': _constants(tables['PIPELINE_COEFFICIENTS'], 'electricity_factor', quantity=1.0),
+            'steps': [
+                ['extraction_energy', 'material.energy_intensity * quantity'],
+                ['extraction_water', 'material.water_use * quantity'],
+                ['extraction_waste', 'material.waste_factor * quantity'],
+                ['extraction_co2', 'material.energy_intensity * quantity * extraction_co2_factor'],
+                ['electricity_co2', 'electricity_kwh * electricity_factor'],
+                ['fuel_co2', 'fuel_mj * fuel.co2'],
+                ['processing_co2', 'electricity_co2 + fuel_co2'],
+                ['processing_energy', 'electricity_kwh * 3.6 + fuel_mj'],
+                ['transport_distance', 'distance_km'],
+                ['transport_weight', 'weight_tons'],
+                ['transport_co2', 'distance_km * weight_tons * transport.co2'],
+                ['transport_fuel', 'transport_co2 / co2_per_litre'],
+                ['methane_emissions', 'material.waste_factor * landfill.methane_factor * methane_co2e'],
+                ['leachate_impact', 'material.waste_factor * landfill.leachate_factor'],
+                ['eol_co2', 'material.waste_factor * landfill.methane_factor * methane_co2e * eol_co2_share'],
+                ['circularity_score', 'min(100, recycle_percent * recycle_weight + reuse_percent * reuse_weight)'],
+                ['co2_reduction', 'circularity_score * circularity_co2_credit'],
+                ['resource_efficiency', 'circularity_score * resource_efficiency_weight'],
+                ['total_co2', 'extraction_co2 + processing_co2 + transport_co2 + eol_co2 - co2_reduction'],
+                ['total_energy', 'extraction_energy + processing_energy'],
+                ['total_water', 'extraction_water'],
+                ['efficiency_score', 'max(10, min(100, 100 - (total_co2 / max(total_energy, 1)) * efficiency_penalty))']
+            ]
+        },
+        'csv': {
+            'description': 'csv_ml_service.calculate_lca_row: deterministic per-row LCA of CSV uploads',
+            'inputs': {
+                'elec': {'field': 'ElectricityConsumption_kWh', 'default': 0.0},
+                'fuel_mj': {'field': 'FuelEnergy_MJ', 'default': 0.0},
+                'trans_km': {'field': 'TransportDistance_km', 'default': 0.0},
+                'recycle': {'field': 'RecyclePercent', 'default': 0.0},
+                'reuse': {'field': 'ReusePercent', 'default': 0.0},
+                'electricity_factor': {'field': 'GridFactor_kgCO2_per_kWh',
+                                       'default': tables['CSV_COEFFICIENTS']['electricity_factor']}
+            },
+            'constants': _constants(tables['CSV_COEFFICIENTS'], 'electricity_factor'),
+            'steps': [
+                ['carbonEmissions',
+                 'round(elec * electricity_factor + fuel_mj * fuel_factor + trans_km * transport_factor, 2)'],
+                ['energyConsumed', 'round(elec * 3.6 + fuel_mj, 2)'],
+                ['waterUse', 'round(elec * water_per_kwh + fuel_mj * water_per_mj, 2)'],
+                ['circularityPercent', 'round(min(100.0, recycle * recycle_weight + reuse * reuse_weight), 1)']
+            ],
+            'flags': [
+                ['low_recycled_content', 'recycle < 50'],
+                ['long_transport', 'trans_km > 200'],
+                ['high_electricity', 'elec > 1000']
+            ]
+        },
+        'predict': {
+            'description': 'ml_predict.predict_lca: material-scaled carbon, energy and water with recycling benefit',
+            'inputs': {
+                'electricity': {'field': 'electricityKwh', 'default': 0.0},
+                'fuel_energy': {'field': 'fuelMj', 'default': 0.0},
+                'transport_distance': {'field': 'transportDistance', 'default': 0.0},
+                'recycle_percent': {'field': 'recyclePercent', 'default': 0.0},
+                'reuse_percent': {'field': 'reusePercent', 'default': 0.0}
+            },
+            'categories': {
+                'material': {'field': 'materialType', 'default': 'Iron Ore',
+                             'table': tables['PREDICT_MATERIAL_FACTORS'], 'fallback': 'Iron Ore'},
+                'fuel': {'field': 'fuelType', 'default': 'Natural Gas',
+                         'table': _single(tables['PREDICT_FUEL_FACTORS'], 'co2'), 'fallback': {'co2': 0.2}},
+                'transport': {'field': 'transportMode', 'default': 'Truck',
+                              'table': _single(tables['PREDICT_TRANSPORT_FACTORS'], 'co2'), 'fallback': {'co2': 0.12}}
+            },
+            'constants': _constants(tables['PREDICT_COEFFICIENTS']),
+            'steps': [
+                ['carbon_from_elec', 'electricity * electricity_factor * material.carbon'],
+                ['carbon_from_fuel', 'fuel_energy * fuel.co2 * material.carbon'],
+                ['carbon_from_transport', 'transport_distance * transport.co2 * weight_tons'],
+                ['recycling_benefit', '(recycle_percent / 100) * recycling_credit'],
+                ['total_carbon', '(carbon_from_elec + carbon_from_fuel + carbon_from_transport) * (1 - recycling_benefit)'],
+                ['total_energy', '(electricity * 3.6 + fuel_energy) * material.energy * (1 - recycling_benefit * energy_credit_share)'],
+                ['total_water', '(electricity * water_per_kwh + fuel_energy * water_per_mj) * material.water '
+                                '* (1 - recycling_benefit * water_credit_share)'],
+                ['carbonEmissions', 'round(max(0, total_carbon))'],
+                ['energyConsumed', 'round(max(0, total_energy))'],
+                ['waterUse', 'round(max(0, total_water))'],
+                ['circularityPercent', 'round(min(100, recycle_percent * recycle_weight + reuse_percent * reuse_weight))']
+            ],
+            'outputs': ['carbonEmissions', 'energyConsumed', 'waterUse', 'circularityPercent'],
+            'flags': [
+                ['low_recycled_content', 'recycle_percent < 50'],
+                ['long_transport', 'transport_distance > 500'],
+                ['coal_fuel', "fuel == 'Coal'"],
+                ['high_electricity', 'electricity > 2000']
+            ]
+        },
+        'quick': {
+            'description': 'ai_prediction_service.calculate_impact: flat-factor CO2, energy and efficiency score',
+            'inputs': {
+                'electricity': {'field': 'electricityConsumption', 'default': 0.0},
+                'fuel': {'field': 'fuelEnergy', 'default': 0.0},
+                'distance': {'field': 'transportDistance', 'default': 0.0}
+            },
+            'constants': _constants(tables['QUICK_COEFFICIENTS']),
+            'steps': [
+                ['co2Emissions',
+                 'round(electricity * electricity_factor + fuel * fuel_factor + distance * transport_factor)'],
+                ['totalEnergy', 'round(electricity * 3.6 + fuel)'],
+                ['fuelEfficiencyScore',
+                 'round(max(10, min(100, 90 - (co2Emissions / max(totalEnergy, 1)) * efficiency_penalty)))']
+            ]
+        },
+        'smart_fill': {
+            'description': 'SmartAIAssistant.calculate_environmental_impact: impact of smart-filled form data',
+            'inputs': {
+                'electricity': {'field': 'electricityConsumption', 'default': 0.0},
+                'fuel_energy': {'field': 'fuelEnergy', 'default': 0.0},
+                'distance': {'field': 'transportDistance', 'default': 0.0}
+            },
+            'categories': {
+                'material': {'field': 'materialType', 'default': 'Iron Ore',
+                             'table': tables['SMART_FILL_MATERIALS'], 'fallback': 'Iron Ore'},
+                'fuel': {'field': 'fuelType', 'default': 'Natural Gas',
+                         'table': tables['SMART_FILL_FUELS'], 'fallback': 'Natural Gas'},
+                'transport': {'field': 'transportMode', 'default': 'Truck',
+                              'table': tables['SMART_FILL_TRANSPORT'], 'fallback': 'Truck'}
+            },
+            'constants': _constants(tables['SMART_FILL_COEFFICIENTS']),
+            'steps': [
+                ['electricity_co2', 'electricity * electricity_factor'],
+                ['fuel_co2', 'fuel_energy * fuel.co2_factor'],
+                ['transport_co2', 'distance * transport.emission_factor * weight_tons'],
+                ['material_co2', '(electricity + fuel_energy) * material.co2_factor * material_co2_share'],
+                ['co2Emissions', 'round(electricity_co2 + fuel_co2 + transport_co2 + material_co2)'],
+                ['totalEnergy', 'round(electricity * 3.6 + fuel_energy)'],
+                ['distance_penalty', 'min(max_distance_penalty, distance / distance_penalty_km)'],
+                ['material_bonus', 'where(material.co2_factor < low_carbon_threshold, low_carbon_bonus, 0)'],
+                ['fuelEfficiencyScore',
+                 'round(max(10, min(100, fuel.efficiency * 100 - distance_penalty + material_bonus)))']
+            ],
+            'outputs': ['co2Emissions', 'totalEnergy', 'fuelEfficiencyScore']
+        }
+    }
+
+
+MODEL_SPECS: Dict[str, Dict[str, Any]] = build_specs(FACTOR_TABLES)
+
+
+# --- Compiler ---
+
+NORMALIZERS = {
+    None: lambda value: value,
+    'lower': lambda value: value.lower(),
+    'key': lambda value: value.lower().replace(' ', '_')
+}
+
+_BINARY = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Pow: '**'}
+_COMPARE = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!='}
+_ARITY = {'min': (2, None), 'max': (2, None), 'abs': (1, 1), 'round': (1, 2), 'where': (3, 3)}
+
+
+def _number(value: Any, default: float) -> float:
+    """Scalar numeric input: missing, blank or unparseable values take the default"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if number != number else number
+
+
+def _numbers(frame: pd.DataFrame, field: str, default: float) -> np.ndarray:
+    if field not in frame.columns:
+        return np.full(len(frame), default, dtype=float)
+    values = frame[field]
+    if values.dtype == object:
+        values = values.where(values.astype(str).str.strip() != '')
+    return pd.to_numeric(values, errors='coerce').fillna(default).to_numpy(dtype=float)
+
+
+def _labels(frame: pd.DataFrame, field: str, default: str) -> np.ndarray:
+    if field not in frame.columns:
+        return np.full(len(frame), default, dtype=object)
+    return frame[field].fillna(default).astype(str).to_numpy(dtype=object)
+
+
+def _lookup(labels: np.ndarray, table: Dict[str, float], fallback: float, normalize) -> np.ndarray:
+    """Factor per label, resolving each distinct label once"""
+    codes, uniques = pd.factorize(labels)
+    factors = np.array([table.get(normalize(label), fallback) for label in uniques], dtype=float)
+    return factors[codes] if len(uniques) else np.zeros(len(labels))
+
+
+def _column(value: Any, n: int) -> np.ndarray:
+    return np.full(n, value) if np.ndim(value) == 0 else value
+
+
+class _Emitter:
+    """Turns a validated expression AST into Python source, scalar or NumPy flavoured"""
+
+    def __init__(self, known: set, attributes: Dict[str, set], vector: bool):
+        self.known = known
+        self.attributes = attributes
+        self.vector = vector
+
+    def emit(self, node: ast.AST, where: str) -> str:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+            return repr(node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in self.known:
+                raise ValueError(f'{where}: unknown name {node.id!r}')
+            return f'v_{node.id}'
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            category, attribute = node.value.id, node.attr
+            if attribute not in self.attributes.get(category, ()):
+                raise ValueError(f'{where}: unknown factor {category}.{attribute}')
+            return f'f_{category}__{attribute}'
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            return f'({self.emit(node.left, where)} {_BINARY[type(node.op)]} {self.emit(node.right, where)})'
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            return f'({"-" if isinstance(node.op, ast.USub) else "+"}{self.emit(node.operand, where)})'
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return f'(~{self.emit(node.operand, where)})' if self.vector else f'(not {self.emit(node.operand, where)})'
+        if isinstance(node, ast.BoolOp):
+            joiner = (' & ' if isinstance(node.op, ast.And) else ' | ') if self.vector else \
+                     (' and ' if isinstance(node.op, ast.And) else ' or ')
+            return '(' + joiner.join(self.emit(v, where) for v in node.values) + ')'
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARE:
+            return (f'({self.emit(node.left, where)} {_COMPARE[type(node.ops[0])]} '
+                    f'{self.emit(node.comparators[0], where)})')
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _ARITY \
+                and not node.keywords:
+            return self._call(node.func.id, [self.emit(a, where) for a in node.args], where)
+        raise ValueError(f'{where}: unsupported expression {ast.dump(node)}')
+
+    def _call(self, name: str, args: List[str], where: str) -> str:
+        low, high = _ARITY[name]
+        if len(args) < low or (high is not None and len(args) > high):
+            raise ValueError(f'{where}: wrong number of arguments to {name}()')
+        if name == 'where':
+            return f'np.where({", ".join(args)})' if self.vector else f'({args[1]} if {args[0]} else {args[2]})'
+        if not self.vector:
+            return f'{name}({", ".join(args)})'
+        if name in ('min', 'max'):
+            source = args[-1]
+            for arg in reversed(args[:-1]):
+                source = f'np.{name}imum({arg}, {source})'
+            return source
+        if name == 'abs':
+            return f'np.abs({args[0]})'
+        # Like Python's round, rounding to a whole number gives integers
+        if len(args) == 1:
+            return f'np.round({args[0]}).astype(np.int64)'
+        return f'np.round({", ".join(args)})'
+
+
+class CompiledModel:
+    """Scalar and vectorized evaluators generated from one model specification
+
+    ``evaluate(record)`` returns plain Python numbers for one record (a dict or
+    a pandas row); ``evaluate_batch(frame)`` returns the same outputs and flags
+    as DataFrame columns computed with array operations. Both are generated
+    from the same expressions, so they agree wherever rounding does.
+    """
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.spec = spec
+        self.inputs = spec.get('inputs', {})
+        self.categories = spec.get('categories', {})
+        self.constants = spec.get('constants', {})
+        self.steps = [tuple(step) for step in spec.get('steps', [])]
+        self.flags = [tuple(flag) for flag in spec.get('flags', [])]
+        self.outputs = list(spec.get('outputs') or [name for name, _ in self.steps])
+        self.fields = {**{n: i['field'] for n, i in self.inputs.items()},
+                       **{n: c['field'] for n, c in self.categories.items()}}
+
+        self.factor_tables, self.factor_fallbacks = self._factor_tables()
+        self.scalar_source = self._generate(vector=False)
+        self.vector_source = self._generate(vector=True)
+        namespace = {'np': np, '_number': _number, '_numbers': _numbers, '_labels': _labels,
+                     '_lookup': _lookup, '_column': _column, '_tables': self.factor_tables,
+                     '_fallbacks': self.factor_fallbacks,
+                     '_normalizers': {n: NORMALIZERS[c.get('normalize')] for n, c in self.categories.items()}}
+        exec(compile(self.scalar_source, f'<lca_model:{name}>', 'exec'), namespace)
+        exec(compile(self.vector_source, f'<lca_model:{name}:batch>', 'exec'), namespace)
+        self._scalar = namespace['evaluate']
+        self._vector = namespace['evaluate_batch']
+
+    def _factor_tables(self):
+        tables, fallbacks = {}, {}
+        for category, info in self.categories.items():
+            fallback = info.get('fallback')
+            fallback_row = info['table'][fallback] if isinstance(fallback, str) else (fallback or {})
+            attributes = set(fallback_row)
+            for row in info['table'].values():
+                attributes |= set(row)
+            for attribute in attributes:
+                key = f'{category}__{attribute}'
+                tables[key] = {k: row[attribute] for k, row in info['table'].items() if attribute in row}
+                fallbacks[key] = fallback_row.get(attribute, 0.0)
+        return tables, fallbacks
+
+    def _generate(self, vector: bool) -> str:
+        known = set(self.inputs) | set(self.categories) | set(self.constants)
+        attributes = {}
+        for key in self.factor_tables:
+            category, attribute = key.split('__', 1)
+            attributes.setdefault(category, set()).add(attribute)
+        used = set()
+
+        body = []
+        for name, expression in self.steps + self.flags:
+            emitter = _Emitter(known, attributes, vector)
+            source = emitter.emit(ast.parse(expression, mode='eval').body, f'{self.name}.{name}')
+            used.update(k for k in self.factor_tables if f'f_{k}' in source)
+            body.append(f'    v_{name} = {source}')
+            known.add(name)
+
+        missing = [n for n in self.outputs if n not in {s for s, _ in self.steps}]
+        if missing:
+            raise ValueError(f'{self.name}: outputs without a step: {missing}')
+
+        header = []
+        for name, value in self.constants.items():
+            header.append(f'    v_{name} = {value!r}')
+        for name, info in self.inputs.items():
+            if vector:
+                header.append(f'    v_{name} = _numbers(frame, {info["field"]!r}, {float(info["default"])!r})')
+            else:
+                header.append(f'    v_{name} = _number(get({info["field"]!r}), {float(info["default"])!r})')
+        for name, info in self.categories.items():
+            if vector:
+                header.append(f'    v_{name} = _labels(frame, {info["field"]!r}, {info["default"]!r})')
+            else:
+                header.append(f'    v_{name} = get({info["field"]!r}, {info["default"]!r})')
+                header.append(f'    v_{name} = {info["default"]!r} if v_{name} is None else str(v_{name})')
+        for key in sorted(used):
+            category = key.split('__', 1)[0]
+            if vector:
+                header.append(f'    f_{key} = _lookup(v_{category}, _tables[{key!r}], _fallbacks[{key!r}], '
+                              f'_normalizers[{category!r}])')
+            else:
+                header.append(f'    f_{key} = _tables[{key!r}].get(_normalizers[{category!r}](v_{category}), '
+                              f'_fallbacks[{key!r}])')
+
+        returned = self.outputs + [name for name, _ in self.flags]
+        if vector:
+            result = ', '.join(f'{n!r}: _column(v_{n}, n)' for n in returned)
+            return '\n'.join(['def evaluate_batch(frame):', '    n = len(frame)'] + header + body +
+                             [f'    return {{{result}}}', ''])
+        result = ', '.join(f'{n!r}: v_{n}' for n in returned)
+        return '\n'.join(['def evaluate(record):', '    get = record.get'] + header + body +
+                         [f'    return {{{result}}}', ''])
+
+    def invalid_inputs(self, record: Dict[str, Any]) -> List[str]:
+        """Numeric fields the record gives but that are not numbers; evaluate() would use their defaults"""
+        invalid = []
+        for info in self.inputs.values():
+            if info['field'] in record:
+                try:
+                    float(record[info['field']])
+                except (TypeError, ValueError):
+                    invalid.append(info['field'])
+        return invalid
+
+    def validate(self, record: Dict[str, Any]):
+        """Raise ValueError naming the numeric fields of a record that are not numbers"""
+        invalid = self.invalid_inputs(record)
+        if invalid:
+            raise ValueError(f'not a number: {", ".join(invalid)}')
+
+    def evaluate(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Outputs and flags for one record"""
+        return self._scalar(record)
+
+    def evaluate_batch(self, data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> pd.DataFrame:
+        """Outputs and flags for every row of a frame (or list of records) as columns"""
+        frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(list(data))
+        return pd.DataFrame(self._vector(frame), index=frame.index)
+
+
+def spec_fingerprint(spec: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+_compiled: Dict[str, CompiledModel] = {}
+
+
+def compile_model(spec: Dict[str, Any], name: str = 'custom') -> CompiledModel:
+    """Compile a specification, reusing the compiled form of an identical one"""
+    key = f'{name}:{spec_fingerprint(spec)}'
+    if key not in _compiled:
+        _compiled[key] = CompiledModel(name, spec)
+    return _compiled[key]
+
+
+@lru_cache(maxsize=None)
+def get_model(name: str) -> CompiledModel:
+    """Compiled form of a named variant from MODEL_SPECS"""
+    if name not in MODEL_SPECS:
+        raise ValueError(f'Unknown LCA model variant: {name}')
+    return compile_model(MODEL_SPECS[name], name)
+
+
+def main():
+    """Main function for command line usage: evaluate records with a named variant"""
+    if len(sys.argv) != 3:
+        print(json.dumps({'success': False, 'error': 'Usage: python lca_model.py <variant|list> <records_json>'}))
+        return
+
+    try:
+        if sys.argv[1] == 'list':
+            print(json.dumps({'success': True, 'data': {n: s['description'] for n, s in MODEL_SPECS.items()}}))
+            return
+        model = get_model(sys.argv[1])
+        records = json.loads(sys.argv[2])
+        if isinstance(records, list):
+            result = json.loads(model.evaluate_batch(records).to_json(orient='records'))
+        else:
+            result = model.evaluate(records)
+        print(json.dumps({'success': True, 'data': result}, default=float))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
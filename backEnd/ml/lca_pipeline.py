@@ -1,42 +1,41 @@
 import json
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional
+from grid_intensity import GridIntensityStore
+from factor_tables import get_store
 
 class LCAPipeline:
     """Life Cycle Assessment Pipeline for environmental impact calculations"""
     
-    def __init__(self):
-        # Emission factors (kg CO2 equivalent per unit)
-        self.emission_factors = {
-            'electricity': 0.5,  # kg CO2 per kWh
-            'natural_gas': 0.18,  # kg CO2 per MJ
-            'coal': 0.34,  # kg CO2 per MJ
-            'diesel': 0.27,  # kg CO2 per MJ
-            'petrol': 0.25,  # kg CO2 per MJ
-            'biomass': 0.05,  # kg CO2 per MJ
-            'lpg': 0.21,  # kg CO2 per MJ
-        }
-        
-        # Transport emission factors (kg CO2 per ton-km)
-        self.transport_emissions = {
-            'truck': 0.12,
-            'ship': 0.015,
-            'rail': 0.03,
-            'air': 0.8
-        }
+    def __init__(self, grid_intensity=None, factor_store=None):
+        # Optional grid_intensity.GridIntensityStore for time-resolved electricity factors
+        self.grid_intensity = grid_intensity
         
-        # Material processing factors
-        self.material_factors = {
-            'bauxite': {'energy_intensity': 15.0, 'water_use': 2.5, 'waste_factor': 0.3},
-            'copper': {'energy_intensity': 18.5, 'water_use': 3.2, 'waste_factor': 0.4},
-            'gold': {'energy_intensity': 45.0, 'water_use': 8.0, 'waste_factor': 0.8},
-            'iron_ore': {'energy_intensity': 12.0, 'water_use': 2.0, 'waste_factor': 0.25},
-            'zinc': {'energy_intensity': 14.5, 'water_use': 2.8, 'waste_factor': 0.35},
-            'silver': {'energy_intensity': 35.0, 'water_use': 6.5, 'waste_factor': 0.6},
-            'nickel': {'energy_intensity': 22.0, 'water_use': 4.0, 'waste_factor': 0.45},
-            'platinum': {'energy_intensity': 50.0, 'water_use': 9.0, 'waste_factor': 0.9}
-        }
+        # Hot-reloaded factor tables; run_full_lca evaluates the 'pipeline' variant of the current version
+        self.factor_store = factor_store or get_store()
+
+    @property
+    def emission_factors(self) -> Dict[str, float]:
+        """Emission factors (kg CO2 equivalent per unit): electricity per kWh, fuels per MJ"""
+        factors = self.factor_store.current()
+        return {'electricity': factors.table('PIPELINE_COEFFICIENTS')['electricity_factor'],
+                **factors.table('PIPELINE_FUEL_FACTORS')}
+
+    @property
+    def coefficients(self) -> Dict[str, float]:
+        """Scalar coefficients of the pipeline steps (load, conversions, circularity weights)"""
+        return self.factor_store.current().table('PIPELINE_COEFFICIENTS')
+
+    @property
+    def transport_emissions(self) -> Dict[str, float]:
+        """Transport emission factors (kg CO2 per ton-km)"""
+        return self.factor_store.current().table('PIPELINE_TRANSPORT_FACTORS')
+
+    @property
+    def material_factors(self) -> Dict[str, Dict[str, float]]:
+        """Material processing factors"""
+        return self.factor_store.current().table('PIPELINE_MATERIAL_FACTORS')
 
     def calculate_extraction_impact(self, material_type: str, quantity: float = 1.0) -> Dict[str, float]:
         """Calculate environmental impact of material extraction"""
@@ -47,13 +46,24 @@ class LCAPipeline:
             'energy_consumption': factors['energy_intensity'] * quantity,
             'water_consumption': factors['water_use'] * quantity,
             'waste_generation': factors['waste_factor'] * quantity,
-            'co2_emissions': factors['energy_intensity'] * quantity * 0.3  # Rough conversion
+            'co2_emissions': factors['energy_intensity'] * quantity * self.coefficients['extraction_co2_factor']
         }
 
-    def calculate_processing_impact(self, electricity_kwh: float, fuel_type: str, fuel_mj: float) -> Dict[str, float]:
+    def electricity_factor(self, region: Optional[str] = None, start: Any = None, end: Any = None,
+                           factors=None) -> float:
+        """Grid factor for a consumption interval, or the flat factor of the factor tables without a series"""
+        flat = (factors or self.factor_store.current()).table('PIPELINE_COEFFICIENTS')['electricity_factor']
+        if self.grid_intensity is None or not region or start is None:
+            return flat
+        return float(self.grid_intensity.average_intensity([region], [start], [end or start], flat)[0])
+
+    def calculate_processing_impact(self, electricity_kwh: float, fuel_type: str, fuel_mj: float,
+                                    electricity_factor: Optional[float] = None) -> Dict[str, float]:
         """Calculate environmental impact of material processing"""
         # Electricity impact
-        electricity_co2 = electricity_kwh * self.emission_factors['electricity']
+        if electricity_factor is None:
+            electricity_factor = self.emission_factors['electricity']
+        electricity_co2 = electricity_kwh * electricity_factor
         
         # Fuel impact
         fuel_key = fuel_type.lower().replace(' ', '_')
@@ -64,11 +74,16 @@ class LCAPipeline:
             'electricity_co2': electricity_co2,
             'fuel_co2': fuel_co2,
             'total_processing_co2': electricity_co2 + fuel_co2,
-            'energy_consumption': electricity_kwh * 3.6 + fuel_mj  # Convert kWh to MJ
+            'energy_consumption': electricity_kwh * 3.6 + fuel_mj,  # Convert kWh to MJ
+            'electricity_factor': electricity_factor
         }
 
-    def calculate_transport_impact(self, transport_mode: str, distance_km: float, weight_tons: float = 10.0) -> Dict[str, float]:
-        """Calculate environmental impact of transportation"""
+    def calculate_transport_impact(self, transport_mode: str, distance_km: float,
+                                   weight_tons: Optional[float] = None) -> Dict[str, float]:
+        """Calculate environmental impact of transportation (default load from the factor tables)"""
+        coefficients = self.coefficients
+        if weight_tons is None:
+            weight_tons = coefficients['weight_tons']
         mode_key = transport_mode.lower()
         emission_factor = self.transport_emissions.get(mode_key, 0.1)
         
@@ -76,7 +91,7 @@ class LCAPipeline:
         
         return {
             'transport_co2': transport_co2,
-            'fuel_consumption': transport_co2 / 2.3,  # Rough conversion to liters
+            'fuel_consumption': transport_co2 / coefficients['co2_per_litre'],  # Rough conversion to liters
             'distance': distance_km,
             'weight': weight_tons
         }
@@ -84,11 +99,7 @@ class LCAPipeline:
     def calculate_end_of_life_impact(self, landfill_location: str, material_type: str) -> Dict[str, float]:
         """Calculate end-of-life environmental impact"""
         # Landfill-specific factors
-        landfill_factors = {
-            'ghazipur_delhi': {'methane_factor': 1.2, 'leachate_factor': 1.1},
-            'deonar_mumbai': {'methane_factor': 1.0, 'leachate_factor': 1.0},
-            'kodungaiyur_chennai': {'methane_factor': 0.9, 'leachate_factor': 0.95}
-        }
+        landfill_factors = self.factor_store.current().table('PIPELINE_LANDFILL_FACTORS')
         
         landfill_key = landfill_location.lower().replace(' ', '_')
         factors = landfill_factors.get(landfill_key, landfill_factors['deonar_mumbai'])
@@ -96,101 +107,101 @@ class LCAPipeline:
         # Material-specific end-of-life impact
         material_key = material_type.lower().replace(' ', '_')
         base_impact = self.material_factors.get(material_key, self.material_factors['iron_ore'])
+        coefficients = self.coefficients
+        methane = base_impact['waste_factor'] * factors['methane_factor'] * coefficients['methane_co2e']
         
         return {
-            'methane_emissions': base_impact['waste_factor'] * factors['methane_factor'] * 25,  # CH4 to CO2 equivalent
+            'methane_emissions': methane,  # CH4 to CO2 equivalent
             'leachate_impact': base_impact['waste_factor'] * factors['leachate_factor'],
-            'total_eol_co2': base_impact['waste_factor'] * factors['methane_factor'] * 25 * 0.1
+            'total_eol_co2': methane * coefficients['eol_co2_share']
         }
 
     def calculate_circularity_score(self, recycle_percent: float = 0, reuse_percent: float = 0) -> Dict[str, float]:
         """Calculate circularity metrics"""
-        circularity_score = min(100, (recycle_percent * 0.7 + reuse_percent * 0.8))
+        coefficients = self.coefficients
+        circularity_score = min(100, (recycle_percent * coefficients['recycle_weight']
+                                      + reuse_percent * coefficients['reuse_weight']))
         
-        # Circularity benefits (CO2 reduction)
-        co2_reduction = circularity_score * 0.05  # 5% reduction per circularity point
+        # Circularity benefits (CO2 reduction per circularity point)
+        co2_reduction = circularity_score * coefficients['circularity_co2_credit']
         
         return {
             'circularity_score': circularity_score,
             'co2_reduction': co2_reduction,
-            'resource_efficiency': circularity_score * 0.8
+            'resource_efficiency': circularity_score * coefficients['resource_efficiency_weight']
         }
 
     def run_full_lca(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Run complete LCA analysis"""
+        """Run complete LCA analysis
+
+        Fields that are left out take their defaults, but a blank or non-numeric
+        value of a numeric field fails the analysis rather than being defaulted.
+        """
         try:
-            # Extract input parameters
-            material_type = input_data.get('materialType', 'Iron Ore')
-            electricity_kwh = float(input_data.get('electricityConsumption', 0))
-            fuel_type = input_data.get('fuelType', 'Natural Gas')
-            fuel_mj = float(input_data.get('fuelEnergy', 0))
-            transport_mode = input_data.get('transportMode', 'Truck')
-            distance_km = float(input_data.get('transportDistance', 0))
-            landfill_location = input_data.get('landfillLocation', 'Deonar Mumbai')
-            recycle_percent = float(input_data.get('recyclePercent', 0))
-            reuse_percent = float(input_data.get('reusePercent', 0))
-            
-            # Calculate each phase impact
-            extraction_impact = self.calculate_extraction_impact(material_type)
-            processing_impact = self.calculate_processing_impact(electricity_kwh, fuel_type, fuel_mj)
-            transport_impact = self.calculate_transport_impact(transport_mode, distance_km)
-            eol_impact = self.calculate_end_of_life_impact(landfill_location, material_type)
-            circularity = self.calculate_circularity_score(recycle_percent, reuse_percent)
-            
-            # Calculate total impacts
-            total_co2 = (
-                extraction_impact['co2_emissions'] +
-                processing_impact['total_processing_co2'] +
-                transport_impact['transport_co2'] +
-                eol_impact['total_eol_co2'] -
-                circularity['co2_reduction']
-            )
-            
-            total_energy = (
-                extraction_impact['energy_consumption'] +
-                processing_impact['energy_consumption']
-            )
-            
-            total_water = extraction_impact['water_consumption']
-            
-            # Calculate efficiency scores
-            efficiency_score = max(10, min(100, 100 - (total_co2 / max(total_energy, 1)) * 20))
+            # One factor version for the whole request, even if a new one is published meanwhile
+            factors = self.factor_store.current()
+            electricity_factor = self.electricity_factor(input_data.get('gridRegion'),
+                                                         input_data.get('consumptionStart'),
+                                                         input_data.get('consumptionEnd'), factors)
+            record = {**input_data, 'electricityFactor': electricity_factor}
+            factors.model('pipeline').validate(record)
+            impact = factors.model('pipeline').evaluate(record)
+            total_co2 = impact['total_co2']
             
             # Generate phase breakdown
+            phases = {
+                'extraction': impact['extraction_co2'],
+                'processing': impact['processing_co2'],
+                'transport': impact['transport_co2'],
+                'end_of_life': impact['eol_co2']
+            }
             phase_breakdown = {
-                'extraction': {
-                    'co2': round(extraction_impact['co2_emissions'], 2),
-                    'percentage': round((extraction_impact['co2_emissions'] / max(total_co2, 1)) * 100, 1)
-                },
-                'processing': {
-                    'co2': round(processing_impact['total_processing_co2'], 2),
-                    'percentage': round((processing_impact['total_processing_co2'] / max(total_co2, 1)) * 100, 1)
-                },
-                'transport': {
-                    'co2': round(transport_impact['transport_co2'], 2),
-                    'percentage': round((transport_impact['transport_co2'] / max(total_co2, 1)) * 100, 1)
-                },
-                'end_of_life': {
-                    'co2': round(eol_impact['total_eol_co2'], 2),
-                    'percentage': round((eol_impact['total_eol_co2'] / max(total_co2, 1)) * 100, 1)
-                }
+                phase: {
+                    'co2': round(co2, 2),
+                    'percentage': round((co2 / max(total_co2, 1)) * 100, 1)
+                } for phase, co2 in phases.items()
             }
             
             return {
                 'success': True,
                 'results': {
                     'total_co2_emissions': round(total_co2, 2),
-                    'total_energy_consumption': round(total_energy, 2),
-                    'total_water_consumption': round(total_water, 2),
-                    'efficiency_score': round(efficiency_score, 1),
-                    'circularity_score': round(circularity['circularity_score'], 1),
+                    'total_energy_consumption': round(impact['total_energy'], 2),
+                    'total_water_consumption': round(impact['total_water'], 2),
+                    'efficiency_score': round(impact['efficiency_score'], 1),
+                    'circularity_score': round(impact['circularity_score'], 1),
                     'phase_breakdown': phase_breakdown,
+                    'factor_version': factors.version,
                     'detailed_impacts': {
-                        'extraction': extraction_impact,
-                        'processing': processing_impact,
-                        'transport': transport_impact,
-                        'end_of_life': eol_impact,
-                        'circularity': circularity
+                        'extraction': {
+                            'energy_consumption': impact['extraction_energy'],
+                            'water_consumption': impact['extraction_water'],
+                            'waste_generation': impact['extraction_waste'],
+                            'co2_emissions': impact['extraction_co2']
+                        },
+                        'processing': {
+                            'electricity_co2': impact['electricity_co2'],
+                            'fuel_co2': impact['fuel_co2'],
+                            'total_processing_co2': impact['processing_co2'],
+                            'energy_consumption': impact['processing_energy'],
+                            'electricity_factor': electricity_factor
+                        },
+                        'transport': {
+                            'transport_co2': impact['transport_co2'],
+                            'fuel_consumption': impact['transport_fuel'],
+                            'distance': impact['transport_distance'],
+                            'weight': impact['transport_weight']
+                        },
+                        'end_of_life': {
+                            'methane_emissions': impact['methane_emissions'],
+                            'leachate_impact': impact['leachate_impact'],
+                            'total_eol_co2': impact['eol_co2']
+                        },
+                        'circularity': {
+                            'circularity_score': impact['circularity_score'],
+                            'co2_reduction': impact['co2_reduction'],
+                            'resource_efficiency': impact['resource_efficiency']
+                        }
                     }
                 }
             }
@@ -209,7 +220,7 @@ def main():
     
     try:
         input_data = json.loads(sys.argv[1])
-        lca_pipeline = LCAPipeline()
+        lca_pipeline = LCAPipeline(GridIntensityStore.load())
         result = lca_pipeline.run_full_lca(input_data)
         print(json.dumps(result))
     except Exception as e:
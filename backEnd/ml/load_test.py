@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlparse
+from sketches import percentile
+
+MATERIALS = ['Bauxite', 'Copper', 'Gold', 'Iron Ore', 'Zinc', 'Silver', 'Nickel', 'Platinum']
+FUELS = ['Natural Gas', 'Coal', 'Diesel', 'Petrol', 'Biomass', 'LPG']
+TRANSPORTS = ['Truck', 'Ship', 'Rail', 'Air']
+LANDFILLS = ['Ghazipur Delhi', 'Deonar Mumbai', 'Kodungaiyur Chennai']
+
+
+def synthetic_form(rng: random.Random, missing_rate: float = 0.0) -> Dict[str, Any]:
+    """One analysis form as sent by the frontend, optionally with blank fields"""
+    form = {
+        'materialType': rng.choice(MATERIALS),
+        'fuelType': rng.choice(FUELS),
+        'electricityConsumption': str(rng.randint(500, 3500)),
+        'fuelEnergy': str(rng.randint(800, 4500)),
+        'transportMode': rng.choice(TRANSPORTS),
+        'transportDistance': str(rng.randint(50, 1500)),
+        'landfillLocation': rng.choice(LANDFILLS),
+        'recyclePercent': str(rng.randint(0, 80)),
+        'reusePercent': str(rng.randint(0, 40))
+    }
+    for key in list(form):
+        if key != 'materialType' and rng.random() < missing_rate:
+            form[key] = ''
+    return form
+
+
+def synthetic_csv_rows(rng: random.Random, n_rows: int) -> List[Dict[str, Any]]:
+    """Rows in the column layout of the CSV upload"""
+    return [{
+        'MaterialType': rng.choice(MATERIALS),
+        'ElectricityConsumption_kWh': rng.randint(500, 3500),
+        'FuelEnergy_MJ': rng.randint(800, 4500),
+        'TransportDistance_km': rng.randint(50, 1500),
+        'RecyclePercent': rng.randint(0, 80),
+        'ReusePercent': rng.randint(0, 40),
+        'LandfillPercent': rng.randint(0, 30)
+    } for _ in range(n_rows)]
+
+
+# name -> (path, payload factory, default weight)
+SCENARIOS: Dict[str, Any] = {
+    'smart_fill': ('/api/ml/smart_fill', lambda rng: synthetic_form(rng, missing_rate=0.4), 40),
+    'lca_analysis': ('/api/ml/lca_analysis', lambda rng: synthetic_form(rng), 30),
+    'optimize': ('/api/ml/optimize_parameters', lambda rng: synthetic_form(rng), 15),
+    'csv_small': ('/api/csv-analysis', lambda rng: {'data': synthetic_csv_rows(rng, 50)}, 10),
+    'csv_large': ('/api/csv-analysis', lambda rng: {'data': synthetic_csv_rows(rng, 2000)}, 5)
+}
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process from /proc (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+class LoadGenerator:
+    """Replay a weighted request mix against a local ML HTTP service
+
+    Runs either closed loop (``rate`` unset: every worker sends back to back) or
+    open loop with Poisson arrivals at ``rate`` requests per second, in which
+    case latency includes time spent queued behind busy workers.
+    """
+
+    def __init__(self, base_url: str = 'http://127.0.0.1:8000', concurrency: int = 8,
+                 duration: float = 30.0, rate: Optional[float] = None,
+                 mix: Optional[Dict[str, float]] = None, seed: int = 42,
+                 server_pid: Optional[int] = None, sample_interval: float = 1.0, timeout: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.mix = mix or {name: weight for name, (_, _, weight) in SCENARIOS.items()}
+        unknown = set(self.mix) - set(SCENARIOS)
+        if unknown:
+            raise ValueError(f'Unknown scenarios: {sorted(unknown)}')
+        self.seed = seed
+        self.server_pid = server_pid
+        self.sample_interval = sample_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = []
+        self._rss: List[Dict[str, float]] = []
+
+    def _send(self, scenario: str, payload: Dict[str, Any], scheduled: float):
+        path = SCENARIOS[scenario][0]
+        body = json.dumps(payload).encode()
+        req = urllib.request.Request(self.base_url + path, data=body,
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+        ok = False
+        status = None
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                status = resp.status
+                ok = 200 <= status < 300 and json.loads(resp.read()).get('success', False)
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = None
+        finished = time.perf_counter()
+        with self._lock:
+            self._records.append({'scenario': scenario, 'latency': finished - scheduled,
+                                  'ok': ok, 'status': status, 'finished': finished})
+
+    def _sample_rss(self, stop: threading.Event, started: float):
+        while not stop.is_set():
+            rss = read_rss_mb(self.server_pid)
+            if rss is not None:
+                self._rss.append({'t': round(time.perf_counter() - started, 3), 'rss_mb': round(rss, 1)})
+            stop.wait(self.sample_interval)
+
+    def _pick(self, rng: random.Random) -> str:
+        return rng.choices(list(self.mix), list(self.mix.values()))[0]
+
+    def run(self) -> Dict[str, Any]:
+        rng = random.Random(self.seed)
+        stop = threading.Event()
+        started = time.perf_counter()
+        sampler = None
+        if self.server_pid:
+            sampler = threading.Thread(target=self._sample_rss, args=(stop, started), daemon=True)
+            sampler.start()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            deadline = started + self.duration
+            if self.rate:
+                next_arrival = started
+                while next_arrival < deadline:
+                    now = time.perf_counter()
+                    if next_arrival > now:
+                        time.sleep(next_arrival - now)
+                    scenario = self._pick(rng)
+                    pool.submit(self._send, scenario, SCENARIOS[scenario][1](rng), next_arrival)
+                    next_arrival += rng.expovariate(self.rate)
+            else:
+                def worker(worker_seed: int):
+                    worker_rng = random.Random(worker_seed)
+                    while time.perf_counter() < deadline:
+                        scenario = self._pick(worker_rng)
+                        self._send(scenario, SCENARIOS[scenario][1](worker_rng), time.perf_counter())
+                for i in range(self.concurrency):
+                    pool.submit(worker, self.seed + i)
+
+        elapsed = time.perf_counter() - started
+        stop.set()
+        if sampler:
+            sampler.join()
+        return self.report(elapsed)
+
+    def _summarize(self, records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(r['latency'] * 1000.0 for r in records)
+        errors = sum(1 for r in records if not r['ok'])
+        return {
+            'requests': len(records),
+            'throughput_rps': round(len(records) / elapsed, 2) if elapsed else 0.0,
+            'error_rate': round(errors / len(records), 4) if records else 0.0,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'max': round(latencies[-1], 2) if latencies else None
+            }
+        }
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        by_scenario = {}
+        for name in self.mix:
+            records = [r for r in self._records if r['scenario'] == name]
+            if records:
+                by_scenario[name] = self._summarize(records, elapsed)
+        return {
+            'config': {
+                'base_url': self.base_url,
+                'concurrency': self.concurrency,
+                'duration_s': self.duration,
+                'rate_rps': self.rate,
+                'mix': self.mix,
+                'seed': self.seed
+            },
+            'elapsed_s': round(elapsed, 3),
+            'overall': self._summarize(self._records, elapsed),
+            'scenarios': by_scenario,
+            'server_rss_mb': self._rss,
+            'peak_rss_mb': max((s['rss_mb'] for s in self._rss), default=None)
+        }
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of throughput and latency percentiles against a previous run"""
+    def change(new, old):
+        if new is None or not old:
+            return None
+        return round((new - old) / old * 100.0, 1)
+
+    comparison = {}
+    for name, stats in {'overall': current['overall'], **current['scenarios']}.items():
+        old = baseline['overall'] if name == 'overall' else baseline.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        comparison[name] = {
+            'throughput_change_pct': change(stats['throughput_rps'], old['throughput_rps']),
+            'error_rate_delta': round(stats['error_rate'] - old['error_rate'], 4),
+            **{f'{p}_change_pct': change(stats['latency_ms'][p], old['latency_ms'][p])
+               for p in ('p50', 'p95', 'p99')}
+        }
+    return comparison
+
+
+def wait_for_health(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url.rstrip('/') + '/health', timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except Exception:
+            time.sleep(0.25)
+    raise RuntimeError(f'Service at {base_url} did not become healthy')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the local ML HTTP service')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--rate', type=float, default=None, help='Open loop arrival rate (req/s)')
+    parser.add_argument('--mix', default=None, help='JSON object of scenario weights')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server-pid', type=int, default=None)
+    parser.add_argument('--launch', action='store_true', help='Start simple_server.py for the run')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file')
+    parser.add_argument('--baseline', default=None, help='Previous JSON report to compare against')
+    args = parser.parse_args()
+
+    server = None
+    server_pid = args.server_pid
+    if args.launch:
+        # Run without the debug reloader so the measured pid is the one serving requests
+        port = urlparse(args.url).port or 8000
+        server = subprocess.Popen([sys.executable, '-c',
+                                   f'from simple_server import app, get_scheduler; get_scheduler(); '
+                                   f'app.run(port={port}, threaded=True)'],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        server_pid = server.pid
+
+    try:
+        wait_for_health(args.url)
+        generator = LoadGenerator(args.url, args.concurrency, args.duration, args.rate,
+                                  json.loads(args.mix) if args.mix else None, args.seed, server_pid)
+        report = generator.run()
+        if args.baseline:
+            with open(args.baseline) as f:
+                report['comparison'] = compare_reports(report, json.load(f))
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output)
+        print(output)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
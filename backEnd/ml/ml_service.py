@@ -1,27 +1,81 @@
 import json
 import sys
 import os
-from smart_ai_assistant import SmartAIAssistant
+import threading
+from collections import OrderedDict
+import pandas as pd
+from smart_ai_assistant import SmartAIAssistant, DEFAULT_RESULT_PATH
 from lca_pipeline import LCAPipeline
+from sensitivity import SensitivityAnalyzer
+from supply_chain import SupplyChainLCA, chain_fingerprint
+from target_optimizer import TargetOptimizer
+from knn_imputer import NeighbourImputer
+from grid_intensity import GridIntensityStore
+from factor_tables import get_store
+from geo import fill_transport, FORM_COLUMNS
+from batch_jobs import BatchJobQueue, spawn_worker, DEFAULT_CHUNK_SIZE
+
+# Supply chains kept with their factorized technosphere, least recently used evicted first
+SUPPLY_CHAIN_CACHE_SIZE = 32
 
 class MLService:
     """Main ML service that coordinates different AI functionalities"""
     
-    def __init__(self):
-        self.ai_assistant = SmartAIAssistant()
-        self.lca_pipeline = LCAPipeline()
+    def __init__(self, result_path: str = DEFAULT_RESULT_PATH):
+        self.ai_assistant = SmartAIAssistant(result_path=result_path)
+        # Time-resolved electricity factors once a series has been built with grid_intensity.py
+        self.lca_pipeline = LCAPipeline(GridIntensityStore.load())
+        # Data-driven imputation once an index has been built with knn_imputer.py
+        self.imputer = NeighbourImputer.load()
+        self.supply_chains = OrderedDict()
+        self._supply_chain_lock = threading.Lock()
     
     def handle_request(self, request_type: str, input_data: dict) -> dict:
         """Handle different types of ML requests"""
         try:
             if request_type == 'smart_fill':
-                return self.ai_assistant.process_smart_fill(input_data)
+                return self.ai_assistant.process_smart_fill(input_data, input_data.get('responseShape', 'full'))
+            elif request_type == 'smart_fill_batch':
+                return self.ai_assistant.process_smart_fill_batch(input_data['records'],
+                                                                  input_data.get('responseShape', 'numbers'))
+            elif request_type == 'explain':
+                return self.ai_assistant.explain(input_data)
             elif request_type == 'lca_analysis':
                 return self.lca_pipeline.run_full_lca(input_data)
             elif request_type == 'predict_missing':
                 return self.predict_missing_values(input_data)
             elif request_type == 'optimize_parameters':
                 return self.optimize_parameters(input_data)
+            elif request_type == 'sensitivity_analysis':
+                return self.sensitivity_analysis(input_data)
+            elif request_type == 'impute_batch':
+                if self.imputer is None:
+                    return {'success': False, 'error': 'No imputation index has been built'}
+                return {'success': True, 'data': self.imputer.impute_records(input_data)}
+            elif request_type == 'optimize_target':
+                return TargetOptimizer(ai_assistant=self.ai_assistant, **input_data.get('options', {})).run(input_data)
+            elif request_type == 'lca_batch':
+                factors = get_store().current()
+                model = factors.model(input_data.get('variant', 'pipeline'))
+                results = model.evaluate_batch(input_data['records'])
+                return {'success': True, 'data': json.loads(results.to_json(orient='records')),
+                        'factorVersion': factors.version}
+            elif request_type == 'factor_tables':
+                return {'success': True, 'data': get_store().status()}
+            elif request_type == 'geo_fill':
+                records = pd.DataFrame(input_data['records'])
+                filled = fill_transport(records, self.ai_assistant.geo, FORM_COLUMNS, input_data.get('circuity', 1.0))
+                return {'success': True, 'data': {'filled': filled,
+                                                  'records': json.loads(records.to_json(orient='records'))}}
+            elif request_type == 'batch_submit':
+                return self.submit_batch_job(input_data)
+            elif request_type == 'batch_status':
+                return {'success': True, 'data': BatchJobQueue().status(input_data['jobId'])}
+            elif request_type == 'batch_cancel':
+                return {'success': True, 'data': BatchJobQueue().cancel(input_data['jobId'])}
+            elif request_type == 'supply_chain':
+                chain = self.supply_chain(input_data['chain'], input_data.get('include_utilities', True))
+                return chain.run(input_data['demand'])
             else:
                 return {
                     'success': False,
@@ -33,18 +87,42 @@ class MLService:
                 'error': f'ML service error: {str(e)}'
             }
     
+    def supply_chain(self, definition: dict, include_utilities: bool = True) -> SupplyChainLCA:
+        """SupplyChainLCA of a chain definition, reused across requests so its LU factorization is computed once"""
+        key = chain_fingerprint(definition, include_utilities, get_store().current().version)
+        with self._supply_chain_lock:
+            chain = self.supply_chains.get(key)
+            if chain is not None:
+                self.supply_chains.move_to_end(key)
+                return chain
+        chain = SupplyChainLCA(definition, include_utilities)
+        with self._supply_chain_lock:
+            self.supply_chains[key] = chain
+            while len(self.supply_chains) > SUPPLY_CHAIN_CACHE_SIZE:
+                self.supply_chains.popitem(last=False)
+        return chain
+    
     def predict_missing_values(self, input_data: dict) -> dict:
         """Predict missing values using ML algorithms"""
         try:
+            neighbour_scores = {}
+            if self.imputer is not None:
+                imputed = self.imputer.impute_records([input_data])[0]
+                input_data = {**input_data, **imputed['completed']}
+                neighbour_scores = imputed['confidence_scores']
+            
             # Use the smart fill functionality
-            result = self.ai_assistant.process_smart_fill(input_data)
+            shape = input_data.get('responseShape', 'full')
+            result = self.ai_assistant.process_smart_fill(input_data, shape)
             
             if result['success']:
                 # Add prediction confidence scores
                 completed_data = result['data']['completedData']
-                confidence_scores = {}
+                confidence_scores = dict(neighbour_scores)
                 
                 for key, value in completed_data.items():
+                    if key in confidence_scores:
+                        continue
                     if not input_data.get(key) or input_data.get(key) == '':
                         # Calculate confidence based on material type and context
                         if key == 'electricityConsumption':
@@ -57,6 +135,11 @@ class MLService:
                             confidence_scores[key] = 0.70
                 
                 result['data']['confidence_scores'] = confidence_scores
+                if neighbour_scores and shape == 'numbers':
+                    result['data']['missingFields'].extend(neighbour_scores)
+                elif neighbour_scores:
+                    result['data']['missingFieldsDetected'].extend(
+                        self.ai_assistant.readable_field_name(key) for key in neighbour_scores)
             
             return result
             
@@ -139,6 +222,22 @@ class MLService:
                 'error': f'Optimization failed: {str(e)}'
             }
 
+    def submit_batch_job(self, input_data: dict) -> dict:
+        """Queue a chunked CSV analysis and start a detached worker; poll with batch_status"""
+        queue = BatchJobQueue()
+        source = input_data.get('csvPath') or input_data['records']
+        job_id = queue.submit(source, input_data.get('chunkSize', DEFAULT_CHUNK_SIZE))
+        spawn_worker(queue.root)
+        return {'success': True, 'data': queue.status(job_id)}
+
+    def sensitivity_analysis(self, input_data) -> dict:
+        """Rank the inputs driving CO2 for a record or a list of records"""
+        options = {}
+        if isinstance(input_data, dict) and 'records' in input_data:
+            options = input_data.get('options', {})
+            input_data = input_data['records']
+        return SensitivityAnalyzer(**options).analyze(input_data)
+
 def main():
     """Main function for command line usage"""
     if len(sys.argv) < 3:
@@ -0,0 +1,213 @@
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+import joblib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import KFold
+from typing import Dict, List, Any, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cv_cache')
+
+# Datasets whose folds and scores are kept; the least recently used beyond this are evicted
+DEFAULT_CACHE_DATASETS = 64
+
+DEFAULT_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 12],
+    'min_samples_leaf': [1, 3]
+}
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _config_key(params: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _fit_fold(X: np.ndarray, y: np.ndarray, train_idx: np.ndarray, test_idx: np.ndarray,
+              params: Dict[str, Any], seed: int) -> Tuple[float, float]:
+    """Fit one configuration on one fold and return its (RMSE, R2) (process pool entry point)"""
+    model = RandomForestRegressor(random_state=seed, **params)
+    model.fit(X[train_idx], y[train_idx])
+    y_pred = model.predict(X[test_idx])
+    return float(np.sqrt(mean_squared_error(y[test_idx], y_pred))), float(r2_score(y[test_idx], y_pred))
+
+
+def prune_cache(cache_dir: str, keep: int = DEFAULT_CACHE_DATASETS):
+    """Remove all but the ``keep`` most recently used dataset directories"""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = [e for e in os.scandir(cache_dir) if e.is_dir()]
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[keep:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class FoldCache:
+    """Fold indices and fold scores stored per dataset fingerprint
+
+    Only what successive halving reuses is kept: the folds and a small JSON
+    index of (RMSE, R2) per configuration and fold. Fold forests are thrown
+    away after scoring (the winner is refit on the full training split), and
+    at most ``max_datasets`` fingerprints are kept, least recently used first out.
+    """
+
+    def __init__(self, fingerprint: str, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_datasets: int = DEFAULT_CACHE_DATASETS):
+        self.directory = os.path.join(cache_dir, fingerprint) if cache_dir else None
+        self.scores: Dict[str, Tuple[float, float]] = {}
+        if self.directory and os.path.exists(self._path('scores.json')):
+            with open(self._path('scores.json')) as f:
+                self.scores = {k: tuple(v) for k, v in json.load(f).items()}
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            # Mark this dataset as recently used before evicting the oldest
+            os.utime(self.directory)
+            prune_cache(cache_dir, max_datasets)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def folds(self, n_rows: int, n_folds: int, seed: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self.directory and os.path.exists(self._path('folds.joblib')):
+            return joblib.load(self._path('folds.joblib'))
+        folds = list(KFold(n_splits=n_folds, shuffle=True, random_state=seed).split(np.arange(n_rows)))
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            joblib.dump(folds, self._path('folds.joblib'))
+        return folds
+
+    def score(self, config: str, fold: int) -> Optional[Tuple[float, float]]:
+        return self.scores.get(f'{config}_fold{fold}')
+
+    def put(self, config: str, fold: int, result: Tuple[float, float]):
+        self.scores[f'{config}_fold{fold}'] = tuple(result)
+        if self.directory:
+            tmp_path = self._path('scores.json.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(self.scores, f)
+            os.replace(tmp_path, self._path('scores.json'))
+
+
+def dataset_fingerprint(X: np.ndarray, y: np.ndarray, n_folds: int, seed: int) -> str:
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=float).tobytes())
+    digest.update(f'{X.shape}|{n_folds}|{seed}'.encode())
+    return digest.hexdigest()[:16]
+
+
+def select_model(X: np.ndarray, y: np.ndarray, grid: Optional[Dict[str, List[Any]]] = None,
+                 n_folds: int = 5, eta: int = 2, n_jobs: Optional[int] = None,
+                 time_budget: float = 30.0, seed: int = 42,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> Dict[str, Any]:
+    """k-fold cross-validated random forest selection with successive halving
+
+    Round r scores the surviving configurations on the first ``eta ** r`` folds
+    (all folds in the last round) and keeps the best ``1 / eta`` of them. Fold
+    results are cached by dataset fingerprint, so later rounds and repeated
+    uploads of the same data only fit what is new. When the wall-clock budget
+    runs out, the configuration with the most folds scored wins.
+    """
+    started = time.time()
+    configs = expand_grid(grid or DEFAULT_GRID)
+    n_folds = max(2, min(n_folds, len(y)))
+    cache = FoldCache(dataset_fingerprint(X, y, n_folds, seed), cache_dir)
+    folds = cache.folds(len(y), n_folds, seed)
+    keys = {_config_key(c): c for c in configs}
+    scores: Dict[str, Dict[int, Tuple[float, float]]] = {k: {} for k in keys}
+    cache_hits = 0
+    fits = 0
+    budget_exhausted = False
+
+    survivors = list(keys)
+    folds_per_round = []
+    resource = 1
+    while resource < n_folds:
+        folds_per_round.append(resource)
+        resource *= eta
+    folds_per_round.append(n_folds)
+
+    pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs != 1 else None
+    try:
+        for round_folds in folds_per_round:
+            pending = {}
+            for key in survivors:
+                for fold in range(round_folds):
+                    if fold in scores[key]:
+                        continue
+                    cached = cache.score(key, fold)
+                    if cached is not None:
+                        scores[key][fold] = cached
+                        cache_hits += 1
+                    else:
+                        pending[(key, fold)] = None
+
+            for key, fold in list(pending):
+                if time.time() - started > time_budget:
+                    budget_exhausted = True
+                    break
+                train_idx, test_idx = folds[fold]
+                if pool is None:
+                    result = _fit_fold(X, y, train_idx, test_idx, keys[key], seed)
+                    cache.put(key, fold, result)
+                    scores[key][fold] = result
+                    fits += 1
+                else:
+                    pending[(key, fold)] = pool.submit(_fit_fold, X, y, train_idx, test_idx, keys[key], seed)
+
+            futures = {f: task for task, f in pending.items() if f is not None}
+            while futures:
+                remaining = time_budget - (time.time() - started)
+                if remaining <= 0:
+                    budget_exhausted = True
+                    break
+                done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, fold = futures.pop(future)
+                    result = future.result()
+                    cache.put(key, fold, result)
+                    scores[key][fold] = result
+                    fits += 1
+            if budget_exhausted:
+                break
+
+            ranked = sorted((k for k in survivors if scores[k]),
+                            key=lambda k: np.mean([s[0] for s in scores[k].values()]))
+            if round_folds < n_folds:
+                survivors = ranked[:max(1, len(ranked) // eta)]
+            else:
+                survivors = ranked
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=not budget_exhausted, cancel_futures=True)
+
+    scored = [k for k in keys if scores[k]]
+    if not scored:
+        raise RuntimeError('Model selection budget exhausted before any fold was scored')
+    best = max(scored, key=lambda k: (len(scores[k]), -np.mean([s[0] for s in scores[k].values()])))
+    rmses = [s[0] for s in scores[best].values()]
+    r2s = [s[1] for s in scores[best].values()]
+
+    return {
+        'best_params': keys[best],
+        'cv_rmse': float(np.mean(rmses)),
+        'cv_rmse_std': float(np.std(rmses)),
+        'cv_r2': float(np.mean(r2s)),
+        'cv_folds': len(rmses),
+        'configs_evaluated': len(scored),
+        'rounds': len(folds_per_round),
+        'fold_fits': fits,
+        'cache_hits': cache_hits,
+        'budget_exhausted': budget_exhausted,
+        'elapsed_s': round(time.time() - started, 3)
+    }
@@ -0,0 +1,191 @@
+import json
+import os
+import re
+import sys
+import uuid
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_archive')
+
+PARTITIONING = ds.partitioning(pa.schema([('material', pa.string()), ('month', pa.string())]), flavor='hive')
+
+# Per-row columns kept from process_csv_data; anything missing is stored as null
+ROW_COLUMNS = ['ElectricityConsumption_kWh', 'FuelEnergy_MJ', 'TransportDistance_km',
+               'RecyclePercent', 'ReusePercent', 'LandfillPercent',
+               'carbonEmissions', 'energyConsumed', 'waterUse', 'circularityPercent',
+               'predicted_carbon', 'conc_mass', 'recovered_mass']
+
+AGGREGATED_METRICS = ['carbonEmissions', 'energyConsumed', 'waterUse', 'circularityPercent', 'predicted_carbon']
+
+FILTER_OPERATORS = {
+    '==': lambda f, v: f == v,
+    '!=': lambda f, v: f != v,
+    '>': lambda f, v: f > v,
+    '>=': lambda f, v: f >= v,
+    '<': lambda f, v: f < v,
+    '<=': lambda f, v: f <= v,
+    'in': lambda f, v: f.isin(list(v))
+}
+
+
+class ResultArchive:
+    """Parquet archive of computed CSV results, partitioned by material and month
+
+    Two datasets are kept under the archive root: ``rows`` with one record per
+    analysed row and ``aggregates`` with per (dataset, material, month) sums and
+    counts. Queries prune partitions and push column filters down to the
+    Parquet row groups, so comparisons read only what they need. Archiving a
+    dataset_id again replaces its earlier results.
+    """
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_DIR):
+        self.root = root
+        self.rows_path = os.path.join(root, 'rows')
+        self.aggregates_path = os.path.join(root, 'aggregates')
+
+    @staticmethod
+    def _months(df: pd.DataFrame, analysed_at: Optional[datetime], date_column: Optional[str]) -> pd.Series:
+        if date_column and date_column in df.columns:
+            dates = pd.to_datetime(df[date_column], errors='coerce')
+            fallback = (analysed_at or datetime.now()).strftime('%Y-%m')
+            return dates.dt.strftime('%Y-%m').fillna(fallback)
+        return pd.Series((analysed_at or datetime.now()).strftime('%Y-%m'), index=df.index)
+
+    def archive(self, df: pd.DataFrame, dataset_id: str, analysed_at: Optional[datetime] = None,
+                date_column: Optional[str] = None) -> Dict[str, Any]:
+        """Store the per-row results and their aggregates of one analysed dataset
+
+        Partition files of an earlier archive of the same dataset_id are removed
+        once the new ones are written, so a re-upload is counted once.
+        """
+        rows = pd.DataFrame({
+            c: pd.to_numeric(df[c], errors='coerce') if c in df.columns else float('nan')
+            for c in ROW_COLUMNS
+        }, index=df.index)
+        rows.insert(0, 'dataset_id', dataset_id)
+        rows['material'] = df['MaterialType'].astype(str) if 'MaterialType' in df.columns else 'Unknown'
+        rows['month'] = self._months(df, analysed_at, date_column)
+
+        grouped = rows.groupby(['dataset_id', 'material', 'month'])
+        aggregates = grouped[AGGREGATED_METRICS].sum().add_suffix('_sum')
+        aggregates['rows'] = grouped.size()
+        aggregates = aggregates.reset_index()
+
+        # A unique basename per call keeps other datasets' files in the same partition intact
+        basename = f'{dataset_id}-{uuid.uuid4().hex[:8]}-{{i}}.parquet'
+        superseded = self._dataset_files(dataset_id)
+        for path, frame in ((self.rows_path, rows), (self.aggregates_path, aggregates)):
+            ds.write_dataset(pa.Table.from_pandas(frame, preserve_index=False), path, format='parquet',
+                             partitioning=PARTITIONING, basename_template=basename,
+                             existing_data_behavior='overwrite_or_ignore')
+        for file in superseded:
+            os.remove(file)
+
+        return {
+            'dataset_id': dataset_id,
+            'rows_archived': len(rows),
+            'partitions': aggregates[['material', 'month']].drop_duplicates().to_dict('records')
+        }
+
+    def _dataset_files(self, dataset_id: str) -> List[str]:
+        """Partition files written by earlier archives of a dataset"""
+        pattern = re.compile(re.escape(dataset_id) + r'-[0-9a-f]{8}-\d+\.parquet')
+        files = []
+        for path in (self.rows_path, self.aggregates_path):
+            for directory, _, names in os.walk(path):
+                files.extend(os.path.join(directory, name) for name in names if pattern.fullmatch(name))
+        return files
+
+    @staticmethod
+    def _expression(materials: Optional[Sequence[str]] = None,
+                    months: Optional[Tuple[Optional[str], Optional[str]]] = None,
+                    datasets: Optional[Sequence[str]] = None,
+                    filters: Optional[List[Tuple[str, str, Any]]] = None):
+        expression = None
+
+        def combine(term):
+            nonlocal expression
+            expression = term if expression is None else expression & term
+
+        if materials:
+            combine(pc.field('material').isin(list(materials)))
+        if months:
+            start, end = months
+            if start:
+                combine(pc.field('month') >= start)
+            if end:
+                combine(pc.field('month') <= end)
+        if datasets:
+            combine(pc.field('dataset_id').isin(list(datasets)))
+        for column, op, value in filters or []:
+            if op not in FILTER_OPERATORS:
+                raise ValueError(f'Unsupported filter operator: {op}')
+            combine(FILTER_OPERATORS[op](pc.field(column), value))
+        return expression
+
+    def _dataset(self, path: str) -> Optional[ds.Dataset]:
+        if not os.path.exists(path):
+            return None
+        return ds.dataset(path, format='parquet', partitioning=PARTITIONING)
+
+    def query(self, columns: Optional[List[str]] = None, materials: Optional[Sequence[str]] = None,
+              months: Optional[Tuple[Optional[str], Optional[str]]] = None,
+              datasets: Optional[Sequence[str]] = None,
+              filters: Optional[List[Tuple[str, str, Any]]] = None) -> pd.DataFrame:
+        """Archived rows restricted to the requested columns, partitions and predicates"""
+        dataset = self._dataset(self.rows_path)
+        if dataset is None:
+            return pd.DataFrame(columns=columns or [])
+        table = dataset.to_table(columns=columns,
+                                 filter=self._expression(materials, months, datasets, filters))
+        return table.to_pandas()
+
+    def compare(self, metric: str = 'carbonEmissions', by: Sequence[str] = ('material',),
+                materials: Optional[Sequence[str]] = None,
+                months: Optional[Tuple[Optional[str], Optional[str]]] = None,
+                datasets: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Exact means and totals of a metric per group, computed from the aggregates only"""
+        if metric not in AGGREGATED_METRICS:
+            raise ValueError(f'Metric {metric} is not aggregated; use query() for row-level columns')
+        dataset = self._dataset(self.aggregates_path)
+        if dataset is None:
+            return pd.DataFrame(columns=list(by) + ['rows', f'{metric}_total', f'{metric}_mean'])
+        table = dataset.to_table(columns=list(by) + ['rows', f'{metric}_sum'],
+                                 filter=self._expression(materials, months, datasets))
+        grouped = table.group_by(list(by)).aggregate([('rows', 'sum'), (f'{metric}_sum', 'sum')])
+        result = grouped.to_pandas().rename(columns={'rows_sum': 'rows', f'{metric}_sum_sum': f'{metric}_total'})
+        result[f'{metric}_mean'] = result[f'{metric}_total'] / result['rows']
+        return result.sort_values(list(by)).reset_index(drop=True)
+
+    def trend(self, metric: str = 'carbonEmissions', materials: Optional[Sequence[str]] = None,
+              months: Optional[Tuple[Optional[str], Optional[str]]] = None) -> pd.DataFrame:
+        """Monthly means of a metric per material"""
+        return self.compare(metric, by=('material', 'month'), materials=materials, months=months)
+
+
+def main():
+    """Main function for command line usage: query, compare or trend over the archive"""
+    if len(sys.argv) != 3 or sys.argv[1] not in ('query', 'compare', 'trend'):
+        print(json.dumps({'success': False, 'error': 'Usage: python result_archive.py query|compare|trend <json>'}))
+        return
+
+    try:
+        request = json.loads(sys.argv[2])
+        archive = ResultArchive(request.pop('root', DEFAULT_ARCHIVE_DIR))
+        if 'months' in request:
+            request['months'] = tuple(request['months'])
+        if 'filters' in request:
+            request['filters'] = [tuple(f) for f in request['filters']]
+        result = getattr(archive, sys.argv[1])(**request)
+        print(json.dumps({'success': True, 'data': json.loads(result.to_json(orient='records'))}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
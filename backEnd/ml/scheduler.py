@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Any, Callable, Optional
+from sketches import percentile
+
+# workers: concurrent requests; max_queue: requests allowed to wait beyond those;
+# executor: 'thread' (in the server process) or 'process' (separate, re-niced processes)
+DEFAULT_LANES: Dict[str, Dict[str, Any]] = {
+    'interactive': {'workers': 4, 'max_queue': 64, 'executor': 'thread'},
+    'batch': {'workers': max(1, (os.cpu_count() or 2) // 2), 'max_queue': 8, 'executor': 'process', 'niceness': 10}
+}
+
+# ML service request types served by the batch lane; everything else is interactive
+BATCH_REQUEST_TYPES = {'csv_analysis', 'optimize_parameters', 'optimize_target', 'sensitivity_analysis',
+                       'supply_chain', 'impute_batch', 'smart_fill_batch', 'lca_batch', 'geo_fill'}
+
+# Number of recent requests the queue and service time percentiles are taken over
+METRICS_WINDOW = 2048
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """The MLService instance of the calling process, created on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            from ml_service import MLService
+            _service = MLService()
+    return _service
+
+
+def handle_request(request_type: str, input_data: Any) -> Dict[str, Any]:
+    """MLService.handle_request, or process_csv_data for 'csv_analysis', in the calling process"""
+    if request_type == 'csv_analysis':
+        from csv_ml_service import process_csv_data
+        return process_csv_data(input_data.get('data', []), input_data.get('options'))
+    return get_service().handle_request(request_type, input_data)
+
+
+def _timed(submitted: float, fn: Callable, args: tuple):
+    started = time.time()
+    result = fn(*args)
+    return started - submitted, time.time() - started, result
+
+
+class LaneFull(Exception):
+    """Raised at submission when a lane's queue is at its admission limit"""
+
+    def __init__(self, lane: str, depth: int):
+        super().__init__(f'{lane} lane is at capacity ({depth} requests queued); retry shortly')
+        self.lane = lane
+        self.depth = depth
+
+
+class Lane:
+    """Bounded worker pool with queue-depth admission control and queue-time metrics
+
+    At most ``workers`` requests run at once and at most ``max_queue`` more
+    wait; anything beyond that is rejected immediately with LaneFull instead
+    of adding to everyone's latency. Process lanes run in their own (lower
+    priority) processes, so CPU-bound batch work cannot hold the server's GIL.
+    """
+
+    def __init__(self, name: str, workers: int = 4, max_queue: int = 64, executor: str = 'thread',
+                 niceness: int = 0):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        if executor == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                                initializer=os.nice, initargs=(niceness,))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'lane-{name}')
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self.queue_times = deque(maxlen=METRICS_WINDOW)
+        self.service_times = deque(maxlen=METRICS_WINDOW)
+
+    @property
+    def depth(self) -> int:
+        """Requests admitted but not yet running (approximate for process lanes)"""
+        return max(0, self.in_flight - self.workers)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Schedule ``fn(*args)`` or raise LaneFull; the future resolves to its return value"""
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.counts['rejected'] += 1
+                raise LaneFull(self.name, self.depth)
+            self.in_flight += 1
+            self.counts['submitted'] += 1
+        result = Future()
+        inner = self.executor.submit(_timed, time.time(), fn, args)
+        inner.add_done_callback(lambda done: self._finish(done, result))
+        return result
+
+    def _finish(self, done: Future, result: Future):
+        error = done.exception()
+        with self._lock:
+            self.in_flight -= 1
+            if error is None:
+                queued, service, value = done.result()
+                self.counts['completed'] += 1
+                self.queue_times.append(queued * 1000.0)
+                self.service_times.append(service * 1000.0)
+            else:
+                self.counts['failed'] += 1
+        if error is None:
+            result.set_result(value)
+        else:
+            result.set_exception(error)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            queue_times = sorted(self.queue_times)
+            service_times = sorted(self.service_times)
+            in_flight = self.in_flight
+            counts = dict(self.counts)
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'running': min(in_flight, self.workers),
+            'queued': max(0, in_flight - self.workers),
+            **counts,
+            'queue_time_ms': {q: percentile(queue_times, p) for q, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+            'service_time_ms': {q: percentile(service_times, p) for q, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+        }
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+class Scheduler:
+    """Routes ML service requests to priority lanes with separate worker limits"""
+
+    def __init__(self, lanes: Optional[Dict[str, Dict[str, Any]]] = None,
+                 batch_request_types: Optional[set] = None):
+        self.lanes = {name: Lane(name, **config) for name, config in (lanes or DEFAULT_LANES).items()}
+        self.batch_request_types = BATCH_REQUEST_TYPES if batch_request_types is None else batch_request_types
+
+    def lane_for(self, request_type: str) -> str:
+        return 'batch' if request_type in self.batch_request_types else 'interactive'
+
+    def submit(self, lane: str, fn: Callable, *args) -> Future:
+        return self.lanes[lane].submit(fn, *args)
+
+    def run(self, lane: str, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Submit and wait for the result; raises LaneFull without waiting when the lane is full"""
+        return self.submit(lane, fn, *args).result(timeout)
+
+    def handle(self, request_type: str, input_data: Any, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Serve an ML service request on its lane"""
+        return self.run(self.lane_for(request_type), handle_request, request_type, input_data, timeout=timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: lane.metrics() for name, lane in self.lanes.items()}
+
+    def shutdown(self, wait: bool = True):
+        for lane in self.lanes.values():
+            lane.shutdown(wait)
@@ -0,0 +1,269 @@
+import json
+import sys
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+from lca_pipeline import LCAPipeline
+
+# Numeric inputs of each model that sensitivity is reported for
+PIPELINE_PARAMETERS = ['electricityConsumption', 'fuelEnergy', 'transportDistance',
+                       'recyclePercent', 'reusePercent']
+CSV_PARAMETERS = ['ElectricityConsumption_kWh', 'FuelEnergy_MJ', 'TransportDistance_km',
+                  'RecyclePercent', 'ReusePercent']
+
+# Records whose capped terms are evaluated together, bounding the samples x records matrix
+RECORD_BLOCK = 8192
+
+# Portfolio terms of the running analysis in a pool worker, set once by _init_worker
+_worker_terms: Dict[str, Any] = {}
+
+
+def _evaluate_totals(multipliers: np.ndarray, linear_totals: np.ndarray, intercept: float,
+                     capped_inputs: Optional[np.ndarray], cap: float, penalty: float) -> np.ndarray:
+    """Portfolio CO2 for each row of input multipliers"""
+    totals = intercept + multipliers @ linear_totals
+    if capped_inputs is not None and penalty:
+        for start in range(0, len(capped_inputs), RECORD_BLOCK):
+            capped = np.minimum(cap, multipliers @ capped_inputs[start:start + RECORD_BLOCK].T)
+            totals -= penalty * capped.sum(axis=1)
+    return totals
+
+
+def _init_worker(linear_totals: np.ndarray, intercept: float, capped_inputs: Optional[np.ndarray],
+                 cap: float, penalty: float):
+    """Receive the portfolio terms once per worker rather than with every chunk"""
+    _worker_terms.update(linear_totals=linear_totals, intercept=intercept, capped_inputs=capped_inputs,
+                         cap=cap, penalty=penalty)
+
+
+def _evaluate_chunk(multipliers: np.ndarray) -> np.ndarray:
+    """Worker entry point: totals of one chunk of samples over the shared portfolio terms"""
+    return _evaluate_totals(multipliers, **_worker_terms)
+
+
+class SensitivityAnalyzer:
+    """Local elasticities and Sobol indices for the LCA CO2 models
+
+    Both supported models are piecewise linear in their numeric inputs, so each
+    record reduces to ``y = b + x.c - k * min(cap, x.w)`` with per-record
+    coefficient vectors ``c`` and ``w``. Elasticities follow analytically from
+    that form and Sobol indices are estimated on the portfolio total.
+    """
+
+    def __init__(self, model: str = 'pipeline', n_samples: int = 1024, seed: Optional[int] = 42,
+                 spread: float = 0.2, n_jobs: int = 1, chunk_size: int = 256, factor_store=None):
+        if model not in ('pipeline', 'csv'):
+            raise ValueError(f'Unknown sensitivity model: {model}')
+        self.model = model
+        self.n_samples = int(n_samples)
+        self.seed = seed
+        self.spread = float(spread)
+        self.n_jobs = max(1, int(n_jobs))
+        self.chunk_size = max(1, int(chunk_size))
+        self.lca_pipeline = LCAPipeline(factor_store=factor_store)
+        self.parameters = PIPELINE_PARAMETERS if model == 'pipeline' else CSV_PARAMETERS
+
+    def _numeric_inputs(self, df: pd.DataFrame) -> np.ndarray:
+        """Numeric parameter matrix, coercing blanks and bad values to 0"""
+        columns = []
+        for param in self.parameters:
+            if param in df.columns:
+                columns.append(pd.to_numeric(df[param], errors='coerce').fillna(0.0).to_numpy(dtype=float))
+            else:
+                columns.append(np.zeros(len(df)))
+        return np.column_stack(columns) if columns else np.zeros((len(df), 0))
+
+    def _pipeline_terms(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Coefficients of LCAPipeline.run_full_lca total CO2 per record"""
+        n = len(df)
+        materials = df.get('materialType', pd.Series(['Iron Ore'] * n)).fillna('Iron Ore').astype(str)
+        fuels = df.get('fuelType', pd.Series(['Natural Gas'] * n)).fillna('Natural Gas').astype(str)
+        modes = df.get('transportMode', pd.Series(['Truck'] * n)).fillna('Truck').astype(str)
+        landfills = df.get('landfillLocation', pd.Series(['Deonar Mumbai'] * n)).fillna('Deonar Mumbai').astype(str)
+
+        # Category dependent terms are evaluated once per unique value
+        extraction = {m: self.lca_pipeline.calculate_extraction_impact(m)['co2_emissions']
+                      for m in materials.unique()}
+        fuel_factors = {f: self.lca_pipeline.emission_factors.get(f.lower().replace(' ', '_'), 0.2)
+                        for f in fuels.unique()}
+        transport_factors = {t: self.lca_pipeline.transport_emissions.get(t.lower(), 0.1)
+                             for t in modes.unique()}
+        eol_pairs = pd.Series(list(zip(landfills, materials)))
+        eol = {pair: self.lca_pipeline.calculate_end_of_life_impact(*pair)['total_eol_co2']
+               for pair in eol_pairs.unique()}
+
+        intercept = materials.map(extraction).to_numpy(dtype=float) + eol_pairs.map(eol).to_numpy(dtype=float)
+        coefficients = np.zeros((n, len(self.parameters)))
+        coefficients[:, 0] = self.lca_pipeline.emission_factors['electricity']
+        coefficients[:, 1] = fuels.map(fuel_factors).to_numpy(dtype=float)
+        # run_full_lca uses the default load for transport
+        constants = self.lca_pipeline.coefficients
+        coefficients[:, 2] = modes.map(transport_factors).to_numpy(dtype=float) * constants['weight_tons']
+        weights = np.zeros((n, len(self.parameters)))
+        weights[:, 3] = constants['recycle_weight']
+        weights[:, 4] = constants['reuse_weight']
+        return {'intercept': intercept, 'coefficients': coefficients, 'weights': weights,
+                'cap': 100.0, 'penalty': constants['circularity_co2_credit']}
+
+    def _csv_terms(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Coefficients of csv_ml_service.calculate_lca_row carbon emissions per record"""
+        n = len(df)
+        coefficients = np.zeros((n, len(self.parameters)))
+        constants = self.lca_pipeline.factor_store.current().table('CSV_COEFFICIENTS')
+        coefficients[:, 0] = constants['electricity_factor']
+        coefficients[:, 1] = constants['fuel_factor']
+        coefficients[:, 2] = constants['transport_factor']
+        return {'intercept': np.zeros(n), 'coefficients': coefficients,
+                'weights': np.zeros((n, len(self.parameters))), 'cap': np.inf, 'penalty': 0.0}
+
+    def model_terms(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Reduce a batch of records to the piecewise linear model form"""
+        df = pd.DataFrame(records)
+        terms = self._pipeline_terms(df) if self.model == 'pipeline' else self._csv_terms(df)
+        terms['inputs'] = self._numeric_inputs(df)
+        return terms
+
+    @staticmethod
+    def _co2(terms: Dict[str, Any]) -> np.ndarray:
+        x = terms['inputs']
+        linear = terms['intercept'] + (x * terms['coefficients']).sum(axis=1)
+        capped = np.minimum(terms['cap'], (x * terms['weights']).sum(axis=1))
+        return linear - terms['penalty'] * capped
+
+    @staticmethod
+    def _gradient(terms: Dict[str, Any]) -> np.ndarray:
+        x = terms['inputs']
+        below_cap = ((x * terms['weights']).sum(axis=1) < terms['cap'])[:, None]
+        return terms['coefficients'] - terms['penalty'] * terms['weights'] * below_cap
+
+    def elasticities(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Local elasticities d(ln CO2)/d(ln x) for every record in one vectorized pass"""
+        terms = self.model_terms(records)
+        co2 = self._co2(terms)
+        contributions = self._gradient(terms) * terms['inputs']
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_record = np.where(co2[:, None] != 0, contributions / co2[:, None], 0.0)
+        total_co2 = float(co2.sum())
+        portfolio = contributions.sum(axis=0) / total_co2 if total_co2 else np.zeros(len(self.parameters))
+
+        return {
+            'co2': co2,
+            'per_record': per_record,
+            'portfolio': dict(zip(self.parameters, portfolio.tolist()))
+        }
+
+    def _saltelli_samples(self, n_params: int) -> np.ndarray:
+        """Stack A, B and the A_B^(i) matrices of Saltelli's scheme"""
+        rng = np.random.default_rng(self.seed)
+        low, high = 1.0 - self.spread, 1.0 + self.spread
+        a = rng.uniform(low, high, size=(self.n_samples, n_params))
+        b = rng.uniform(low, high, size=(self.n_samples, n_params))
+        blocks = [a, b]
+        for i in range(n_params):
+            ab = a.copy()
+            ab[:, i] = b[:, i]
+            blocks.append(ab)
+        return np.vstack(blocks)
+
+    def sobol_indices(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """First and total order Sobol indices of portfolio CO2 under relative input uncertainty
+
+        Each numeric input column is scaled by a factor drawn uniformly from
+        ``[1 - spread, 1 + spread]``; the output is the summed CO2 of all records.
+        """
+        terms = self.model_terms(records)
+        x = terms['inputs']
+        n_params = len(self.parameters)
+        linear_totals = (x * terms['coefficients']).sum(axis=0)
+        intercept = float(terms['intercept'].sum())
+        capped_inputs = x * terms['weights'] if terms['penalty'] else None
+
+        samples = self._saltelli_samples(n_params)
+        chunks = [samples[i:i + self.chunk_size] for i in range(0, len(samples), self.chunk_size)]
+        args = (linear_totals, intercept, capped_inputs, terms['cap'], terms['penalty'])
+
+        if self.n_jobs > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_worker, initargs=args) as pool:
+                outputs = np.concatenate(list(pool.map(_evaluate_chunk, chunks)))
+        else:
+            outputs = np.concatenate([_evaluate_totals(chunk, *args) for chunk in chunks])
+
+        n = self.n_samples
+        f_a, f_b = outputs[:n], outputs[n:2 * n]
+        f_ab = outputs[2 * n:].reshape(n_params, n)
+        # Centering leaves the estimators unbiased but removes the large mean term from their variance
+        centre = np.mean(np.concatenate([f_a, f_b]))
+        f_a, f_b, f_ab = f_a - centre, f_b - centre, f_ab - centre
+        variance = np.var(np.concatenate([f_a, f_b]))
+
+        if variance == 0:
+            first_order = np.zeros(n_params)
+            total_order = np.zeros(n_params)
+        else:
+            # Saltelli (2010) first order and Jansen total order estimators
+            first_order = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+            total_order = 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+
+        return {
+            'first_order': dict(zip(self.parameters, first_order.tolist())),
+            'total_order': dict(zip(self.parameters, total_order.tolist())),
+            'variance': float(variance),
+            'samples': n,
+            'evaluations': int(len(samples)),
+            'seed': self.seed,
+            'spread': self.spread
+        }
+
+    def analyze(self, input_data: Any) -> Dict[str, Any]:
+        """Run elasticity and Sobol analysis for one record or a portfolio"""
+        try:
+            records = input_data if isinstance(input_data, list) else [input_data]
+            if not records:
+                return {'success': False, 'error': 'No records provided'}
+
+            local = self.elasticities(records)
+            sobol = self.sobol_indices(records)
+            ranking = sorted(self.parameters, key=lambda p: sobol['total_order'][p], reverse=True)
+
+            return {
+                'success': True,
+                'data': {
+                    'model': self.model,
+                    'records': len(records),
+                    'total_co2_emissions': round(float(local['co2'].sum()), 2),
+                    'portfolio_elasticities': {k: round(v, 4) for k, v in local['portfolio'].items()},
+                    'record_elasticities': [
+                        {p: round(float(v), 4) for p, v in zip(self.parameters, row)}
+                        for row in local['per_record'][:100]  # Limit to first 100 for response size
+                    ],
+                    'sobol': sobol,
+                    'dominant_parameter': ranking[0] if ranking else None,
+                    'parameter_ranking': ranking
+                }
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Sensitivity analysis failed: {str(e)}'
+            }
+
+
+def main():
+    """Main function for command line usage"""
+    if len(sys.argv) < 2:
+        print(json.dumps({'success': False, 'error': 'Invalid input'}))
+        return
+
+    try:
+        input_data = json.loads(sys.argv[1])
+        options = json.loads(sys.argv[2]) if len(sys.argv) > 2 else {}
+        analyzer = SensitivityAnalyzer(**options)
+        print(json.dumps(analyzer.analyze(input_data)))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
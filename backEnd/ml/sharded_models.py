@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestRegressor
+from typing import Dict, List, Any, Optional
+
+DEFAULT_SHARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_shards')
+
+# Fixed codes for the materials the forms offer; anything else is appended in order of first sight
+KNOWN_MATERIALS = ['Bauxite', 'Copper', 'Gold', 'Iron Ore', 'Zinc', 'Silver', 'Nickel', 'Platinum']
+
+# Manifest key of the model trained on every material
+GLOBAL_SHARD = '__global__'
+
+
+class MaterialCodes:
+    """Material-to-integer mapping that never reorders, persisted next to the shards"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.codes = {m: i for i, m in enumerate(KNOWN_MATERIALS)}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.codes.update(json.load(f))
+
+    def encode(self, materials: pd.Series) -> np.ndarray:
+        """Codes for a column of material names, registering unseen names"""
+        names = materials.fillna('Unknown').astype(str).str.strip()
+        new = [m for m in names.unique() if m not in self.codes]
+        for m in new:
+            self.codes[m] = len(self.codes)
+        if new and self.path:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(self.codes, f)
+            os.replace(self.path + '.tmp', self.path)
+        return names.map(self.codes).to_numpy(dtype=np.int64)
+
+
+def _fit_shard(X: np.ndarray, y: np.ndarray, params: Dict[str, Any], seed: int) -> RandomForestRegressor:
+    """Fit one shard (process pool entry point)"""
+    model = RandomForestRegressor(random_state=seed, **params)
+    model.fit(X, y)
+    return model
+
+
+def shard_fingerprint(X: np.ndarray, y: np.ndarray, params: Dict[str, Any], seed: int) -> str:
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=float).tobytes())
+    digest.update(f'{X.shape}|{json.dumps(params, sort_keys=True)}|{seed}'.encode())
+    return digest.hexdigest()[:16]
+
+
+class ShardedForest:
+    """One random forest per material plus a global fallback forest
+
+    Materials with at least ``min_rows`` training rows get their own shard;
+    the rest are served by the global forest trained on every row. Shards are
+    stored under their training-data fingerprint, so refitting after an upload
+    that changed one material only retrains that material's shard (and the
+    global model). Missing shards are fitted concurrently in a process pool.
+    Shard files the new manifest no longer lists are deleted. Feature rows
+    must encode materials with the MaterialCodes stored in the same directory.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_SHARD_DIR, min_rows: int = 50,
+                 params: Optional[Dict[str, Any]] = None, n_jobs: Optional[int] = None, seed: int = 42):
+        self.cache_dir = cache_dir
+        self.min_rows = min_rows
+        self.params = params or {'n_estimators': 100}
+        self.n_jobs = n_jobs
+        self.seed = seed
+        self.shards: Dict[str, RandomForestRegressor] = {}
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _shard_file(self, material: str, fingerprint: str) -> str:
+        safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in material)
+        return f'{safe}-{fingerprint}.joblib'
+
+    def fit(self, X: np.ndarray, y: np.ndarray, materials: pd.Series) -> Dict[str, Any]:
+        """Fit or reuse every shard; returns per-shard rows and whether it came from the cache"""
+        names = materials.fillna('Unknown').astype(str).str.strip().to_numpy()
+        groups = {GLOBAL_SHARD: np.arange(len(y))}
+        for material, rows in pd.Series(names).groupby(names).indices.items():
+            if len(rows) >= self.min_rows:
+                groups[material] = rows
+
+        shards, manifest, pending = {}, {}, {}
+        for material, rows in groups.items():
+            fingerprint = shard_fingerprint(X[rows], y[rows], self.params, self.seed)
+            filename = self._shard_file(material, fingerprint)
+            manifest[material] = {'fingerprint': fingerprint, 'file': filename, 'rows': int(len(rows))}
+            previous = self.manifest.get(material)
+            if previous and previous['fingerprint'] == fingerprint and material in self.shards:
+                shards[material] = self.shards[material]
+            elif self.cache_dir and os.path.exists(self._path(filename)):
+                shards[material] = joblib.load(self._path(filename))
+            else:
+                pending[material] = rows
+
+        if len(pending) > 1 and self.n_jobs != 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+                futures = {m: pool.submit(_fit_shard, X[rows], y[rows], self.params, self.seed)
+                           for m, rows in pending.items()}
+                fitted = {m: f.result() for m, f in futures.items()}
+        else:
+            fitted = {m: _fit_shard(X[rows], y[rows], self.params, self.seed) for m, rows in pending.items()}
+
+        shards.update(fitted)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for material, model in fitted.items():
+                joblib.dump(model, self._path(manifest[material]['file']))
+            with open(self._path('manifest.json.tmp'), 'w') as f:
+                json.dump(manifest, f)
+            os.replace(self._path('manifest.json.tmp'), self._path('manifest.json'))
+            # Superseded shards; only the manifest's files are ever loaded again
+            current = {info['file'] for info in manifest.values()}
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.joblib') and name not in current:
+                    os.remove(self._path(name))
+
+        self.shards = shards
+        self.manifest = manifest
+        return {**self.summary(fitted), 'shards_fitted': len(fitted), 'shards_cached': len(manifest) - len(fitted)}
+
+    def summary(self, fitted=()) -> Dict[str, Any]:
+        """Training rows per shard and whether it was reused rather than fitted"""
+        return {
+            'shards': {m: {'rows': info['rows'], 'cached': m not in fitted}
+                       for m, info in self.manifest.items() if m != GLOBAL_SHARD},
+            'global_rows': self.manifest[GLOBAL_SHARD]['rows']
+        }
+
+    def predict(self, X: np.ndarray, materials: pd.Series) -> np.ndarray:
+        """Route each row to its material's shard, or to the global model"""
+        names = materials.fillna('Unknown').astype(str).str.strip().to_numpy()
+        predictions = np.empty(len(X))
+        for material, rows in pd.Series(names).groupby(names).indices.items():
+            model = self.shards.get(material, self.shards[GLOBAL_SHARD])
+            predictions[rows] = model.predict(X[rows])
+        return predictions
+
+    def fallback_materials(self, materials: pd.Series) -> List[str]:
+        """Materials in the batch that fall back to the global model"""
+        names = materials.fillna('Unknown').astype(str).str.strip().unique()
+        return sorted(m for m in names if m not in self.shards)
+
+    @classmethod
+    def load(cls, cache_dir: str = DEFAULT_SHARD_DIR) -> Optional['ShardedForest']:
+        """Shards of the latest fit, for scoring another upload; None when nothing is stored"""
+        if not os.path.exists(os.path.join(cache_dir, 'manifest.json')):
+            return None
+        forest = cls(cache_dir)
+        with open(forest._path('manifest.json')) as f:
+            forest.manifest = json.load(f)
+        forest.shards = {m: joblib.load(forest._path(info['file'])) for m, info in forest.manifest.items()}
+        return forest
@@ -2,19 +2,45 @@ from flask import Flask, request, jsonify
 import json
 import subprocess
 import sys
+import threading
+from scheduler import Scheduler, LaneFull, get_service
 
 app = Flask(__name__)
 
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """The server's Scheduler, created on first use
+
+    Batch-lane workers are spawned and re-import this module, so nothing is
+    built at import time.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            # Interactive requests and CSV training run in separate lanes so uploads cannot starve forms
+            _scheduler = Scheduler()
+            get_service()
+    return _scheduler
+
+@app.errorhandler(LaneFull)
+def lane_full(e):
+    response = jsonify({'success': False, 'error': str(e), 'lane': e.lane})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @app.route('/api/smart-fill', methods=['POST'])
 def smart_fill():
     try:
         input_data = request.json
         
         # Call AI prediction service
-        result = subprocess.run([
+        result = get_scheduler().run('interactive', lambda: subprocess.run([
             sys.executable, 'ai_prediction_service.py', 
             json.dumps(input_data)
-        ], capture_output=True, text=True, cwd='.')
+        ], capture_output=True, text=True, cwd='.'))
         
         if result.returncode == 0:
             return jsonify(json.loads(result.stdout))
@@ -24,16 +50,33 @@ def smart_fill():
                 'error': 'AI service failed: ' + result.stderr
             }), 500
             
+    except LaneFull:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/ml/<request_type>', methods=['POST'])
+def ml_request(request_type):
+    result = get_scheduler().handle(request_type, request.json)
+    return jsonify(result), (200 if result.get('success') else 400)
+
+@app.route('/api/csv-analysis', methods=['POST'])
+def csv_analysis():
+    result = get_scheduler().handle('csv_analysis', request.json)
+    return jsonify(result), (200 if result.get('success') else 500)
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy', 'service': 'AI ML Service'})
 
+@app.route('/api/scheduler/metrics', methods=['GET'])
+def scheduler_metrics():
+    return jsonify({'success': True, 'data': get_scheduler().metrics()})
+
 if __name__ == '__main__':
     print("Starting AI ML Service on port 8000...")
+    get_scheduler()
     app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
@@ -1,44 +1,41 @@
 import json
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
 import joblib
+from surrogate import fit_surrogate
+from synthetic_data import SyntheticLCAGenerator
 
 # Generate training data
-def generate_training_data():
-    materials = ['Bauxite', 'Copper', 'Gold', 'Iron Ore', 'Zinc', 'Silver', 'Nickel', 'Platinum']
-    fuels = ['Natural Gas', 'Coal', 'Diesel', 'Biomass']
-    transports = ['Truck', 'Rail', 'Ship']
+def generate_training_data(n_rows=1000, seed=None):
+    """Rows of [material, fuel, transport codes, electricity, fuel energy, distance, CO2]"""
+    generator = SyntheticLCAGenerator(seed=seed, include_target=False)
+    frame = next(generator.chunks(n_rows, chunk_size=n_rows))
+    features = generator.encode(frame[['MaterialType', 'FuelType', 'TransportMode', 'ElectricityConsumption_kWh',
+                                       'FuelEnergy_MJ', 'TransportDistance_km']])
     
-    data = []
-    for _ in range(1000):
-        material = np.random.choice(materials)
-        fuel = np.random.choice(fuels)
-        transport = np.random.choice(transports)
-        
-        # Material encoding
-        material_idx = materials.index(material)
-        fuel_idx = fuels.index(fuel)
-        transport_idx = transports.index(transport)
-        
-        electricity = np.random.randint(800, 3500)
-        fuel_energy = np.random.randint(1000, 4500)
-        distance = np.random.randint(50, 1000)
-        
-        # Calculate CO2 (target)
-        co2 = electricity * 0.5 + fuel_energy * 0.2 + distance * 1.2
-        
-        data.append([material_idx, fuel_idx, transport_idx, electricity, fuel_energy, distance, co2])
+    # Calculate CO2 (target)
+    co2 = features[:, 3] * 0.5 + features[:, 4] * 0.2 + features[:, 5] * 1.2
     
-    return np.array(data)
+    return np.column_stack([features, co2])
 
 # Train model
 data = generate_training_data()
 X = data[:, :-1]  # Features
 y = data[:, -1]   # Target (CO2)
 
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X, y)
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+# CO2 is linear in the inputs, so a least-squares fit usually makes the forest unnecessary
+surrogate = fit_surrogate(X_train, y_train, X_test, y_test)
+if surrogate['accepted']:
+    model = surrogate['model'].fit(X, y)
+    serving_model = 'linear_surrogate'
+else:
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    model.fit(X, y)
+    serving_model = 'random_forest'
 
 # Save model
 joblib.dump(model, 'lca_model.joblib')
-print("Model trained and saved as lca_model.joblib")
\ No newline at end of file
+print(f"Model trained ({serving_model}, surrogate holdout RMSE {surrogate['rmse']:.4g}) and saved as lca_model.joblib")
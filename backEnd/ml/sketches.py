@@ -0,0 +1,108 @@
+import math
+import numpy as np
+from typing import Dict, List, Any, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank ``q`` quantile of an already sorted list, rounded to 2 places; None when empty"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return round(sorted_values[index], 2)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with logarithmic buckets
+
+    Values are counted in buckets whose bounds grow by ``gamma``, giving a fixed
+    relative error on every quantile. Negative values are bucketed by magnitude
+    in a store of their own, so signed metrics keep that error too. Bucket
+    counts can be added, merged and subtracted, so rows can be retracted as
+    well as inserted.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: Optional[Dict[int, int]] = None,
+                 zero_count: int = 0, negative_buckets: Optional[Dict[int, int]] = None):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = dict(buckets or {})
+        self.negative_buckets = dict(negative_buckets or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values()) + sum(self.negative_buckets.values())
+
+    def _count(self, store: Dict[int, int], magnitudes: np.ndarray, sign: int):
+        if not len(magnitudes):
+            return
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            remaining = store.get(key, 0) + sign * count
+            if remaining > 0:
+                store[key] = remaining
+            else:
+                store.pop(key, None)
+
+    def _update(self, values: np.ndarray, sign: int):
+        values = np.asarray(values, dtype=float)
+        positive = values[values > 0]
+        negative = values[values < 0]
+        self.zero_count += sign * int(len(values) - len(positive) - len(negative))
+        self._count(self.buckets, positive, sign)
+        self._count(self.negative_buckets, -negative, sign)
+
+    def add(self, values: np.ndarray):
+        self._update(values, 1)
+
+    def remove(self, values: np.ndarray):
+        self._update(values, -1)
+
+    def merge(self, other: 'QuantileSketch'):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        for key, count in other.negative_buckets.items():
+            self.negative_buckets[key] = self.negative_buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        # Ascending order: negatives from the largest magnitude down, zeros, then positives
+        for key in sorted(self.negative_buckets, reverse=True):
+            seen += self.negative_buckets[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self._value(key)
+        if self.buckets:
+            return self._value(max(self.buckets))
+        return 0.0 if self.zero_count else -self._value(min(self.negative_buckets))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zero_count': self.zero_count,
+            'buckets': {str(k): v for k, v in self.buckets.items()},
+            'negative_buckets': {str(k): v for k, v in self.negative_buckets.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QuantileSketch':
+        return cls(data.get('relative_accuracy', 0.01),
+                   {int(k): v for k, v in data.get('buckets', {}).items()},
+                   data.get('zero_count', 0),
+                   {int(k): v for k, v in data.get('negative_buckets', {}).items()})
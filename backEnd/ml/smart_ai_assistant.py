@@ -1,44 +1,163 @@
 import json
+import os
+import sqlite3
 import sys
+import threading
+import time
+import uuid
+import weakref
 import numpy as np
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Dict, List, Any
+from factor_tables import get_store
+from geo import GeoRegistry, DEFAULT_GEO_PATH, fill_record, fill_records
+
+DEFAULT_RESULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'smart_fill_results.sqlite')
+
+# Numeric smart-fill results kept for explaining later by resultId
+EXPLANATION_CACHE_SIZE = 10000
+
+class NumericResultStore:
+    """Numeric smart-fill results by resultId, shared by every process on the host
+
+    Results live in a small SQLite table so an ID handed out by one worker
+    (or one CLI call) can be explained by another. IDs are random, so two
+    processes never issue the same one. Only the newest
+    EXPLANATION_CACHE_SIZE results are kept. Inside ``deferred()`` writes are
+    buffered and inserted in one transaction, which is what batch smart fill uses.
+    The database is opened on first use; get_result_store() shares one store
+    per path within a process.
+    """
+
+    def __init__(self, path: str = DEFAULT_RESULT_PATH, size: int = EXPLANATION_CACHE_SIZE):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._deferred = 0
+        self._db = None
+        self._followed = weakref.WeakSet()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS results '
+                       '(id TEXT PRIMARY KEY, version TEXT, created_at REAL NOT NULL, body TEXT NOT NULL)')
+            self._db = db
+        return self._db
+
+    def put(self, numbers: Dict[str, Any]) -> str:
+        """Store a result and return its new ID"""
+        result_id = f'sf-{uuid.uuid4().hex}'
+        row = (result_id, numbers.get('factorVersion'), time.time(), json.dumps(numbers, default=str))
+        with self._lock:
+            self._pending.append(row)
+            if not self._deferred:
+                self._flush()
+        return result_id
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self.db.execute('BEGIN IMMEDIATE')
+        self.db.executemany('INSERT INTO results (id, version, created_at, body) VALUES (?, ?, ?, ?)', self._pending)
+        self.db.execute('DELETE FROM results WHERE rowid <= (SELECT MAX(rowid) FROM results) - ?', (self.size,))
+        self.db.execute('COMMIT')
+        self._pending = []
+
+    @contextmanager
+    def deferred(self):
+        """Buffer puts until the outermost block exits"""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self._flush()
+
+    def get(self, result_id: str):
+        with self._lock:
+            row = self.db.execute('SELECT body FROM results WHERE id = ?', (result_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def drop_versions_except(self, version: str):
+        with self._lock:
+            self.db.execute('DELETE FROM results WHERE version IS NOT ?', (version,))
+
+    def follow(self, factor_store):
+        """Forget results of superseded versions whenever ``factor_store`` publishes one (subscribes once)"""
+        with self._lock:
+            if factor_store in self._followed:
+                return
+            self._followed.add(factor_store)
+        factor_store.subscribe(self._drop_stale_results)
+
+    def _drop_stale_results(self, old, new):
+        # Explanations of results computed with a superseded factor version would no longer match
+        self.drop_versions_except(new.version)
+
+
+_result_stores: Dict[str, NumericResultStore] = {}
+_geo_registries: Dict[str, GeoRegistry] = {}
+_shared_lock = threading.Lock()
+
+
+def get_result_store(path: str = DEFAULT_RESULT_PATH) -> NumericResultStore:
+    """The NumericResultStore of the calling process for a database path"""
+    with _shared_lock:
+        if path not in _result_stores:
+            _result_stores[path] = NumericResultStore(path)
+        return _result_stores[path]
+
+
+def get_geo_registry(path: str = DEFAULT_GEO_PATH) -> GeoRegistry:
+    """The GeoRegistry of the calling process, loaded from ``path`` on first use"""
+    with _shared_lock:
+        if path not in _geo_registries:
+            _geo_registries[path] = GeoRegistry.load(path)
+        return _geo_registries[path]
 
 class SmartAIAssistant:
-    def __init__(self):
-        # Material-specific data patterns
-        self.material_data = {
-            'Bauxite': {'avg_electricity': 1500, 'avg_fuel': 2200, 'density': 2.7, 'co2_factor': 1.2},
-            'Copper': {'avg_electricity': 1800, 'avg_fuel': 2500, 'density': 8.9, 'co2_factor': 1.5},
-            'Gold': {'avg_electricity': 3000, 'avg_fuel': 4000, 'density': 19.3, 'co2_factor': 2.8},
-            'Iron Ore': {'avg_electricity': 1200, 'avg_fuel': 1800, 'density': 5.2, 'co2_factor': 1.0},
-            'Zinc': {'avg_electricity': 1400, 'avg_fuel': 2000, 'density': 7.1, 'co2_factor': 1.3},
-            'Silver': {'avg_electricity': 2500, 'avg_fuel': 3500, 'density': 10.5, 'co2_factor': 2.2},
-            'Nickel': {'avg_electricity': 2000, 'avg_fuel': 2800, 'density': 8.9, 'co2_factor': 1.8},
-            'Platinum': {'avg_electricity': 3500, 'avg_fuel': 4500, 'density': 21.5, 'co2_factor': 3.0}
-        }
+    def __init__(self, factor_store=None, result_path: str = DEFAULT_RESULT_PATH):
+        # Numeric results of numbers-only smart fill, explained later by resultId
+        self.results = get_result_store(result_path)
         
-        # Fuel efficiency factors
-        self.fuel_data = {
-            'Natural Gas': {'efficiency': 0.85, 'co2_factor': 0.18, 'cost': 1.0},
-            'Coal': {'efficiency': 0.65, 'co2_factor': 0.34, 'cost': 0.7},
-            'Diesel': {'efficiency': 0.75, 'co2_factor': 0.27, 'cost': 1.3},
-            'Petrol': {'efficiency': 0.70, 'co2_factor': 0.25, 'cost': 1.4},
-            'Biomass': {'efficiency': 0.60, 'co2_factor': 0.05, 'cost': 0.9},
-            'LPG': {'efficiency': 0.80, 'co2_factor': 0.21, 'cost': 1.1}
-        }
+        # Hot-reloaded factor tables; calculate_environmental_impact evaluates the 'smart_fill' variant
+        self.factor_store = factor_store or get_store()
+        self.results.follow(self.factor_store)
         
-        # Transport emission factors
-        self.transport_data = {
-            'Truck': {'emission_factor': 0.12, 'cost_factor': 1.0, 'max_distance': 1000},
-            'Ship': {'emission_factor': 0.015, 'cost_factor': 0.3, 'max_distance': 10000},
-            'Rail': {'emission_factor': 0.03, 'cost_factor': 0.5, 'max_distance': 5000},
-            'Air': {'emission_factor': 0.8, 'cost_factor': 3.0, 'max_distance': 15000}
-        }
+        # Site, destination and landfill coordinates for geographic distance and landfill filling
+        self.geo = get_geo_registry()
+
+    @property
+    def material_data(self) -> Dict[str, Dict[str, float]]:
+        """Material-specific data patterns of the current factor version"""
+        return self.factor_store.current().table('SMART_FILL_MATERIALS')
 
-    def smart_fill_data(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    @property
+    def fuel_data(self) -> Dict[str, Dict[str, float]]:
+        """Fuel efficiency, emission and cost factors of the current factor version"""
+        return self.factor_store.current().table('SMART_FILL_FUELS')
+
+    @property
+    def transport_data(self) -> Dict[str, Dict[str, float]]:
+        """Transport emission, cost and range factors of the current factor version"""
+        return self.factor_store.current().table('SMART_FILL_TRANSPORT')
+
+    def smart_fill_data(self, input_data: Dict[str, Any], factors=None) -> Dict[str, Any]:
         """Smart fill missing data based on material type and context"""
+        material_data = (factors or self.factor_store.current()).table('SMART_FILL_MATERIALS')
+        # Distance and landfill from the site's location when the form gives one
+        input_data = fill_record(input_data, self.geo)
         material = input_data.get('materialType', 'Iron Ore')
-        material_info = self.material_data.get(material, self.material_data['Iron Ore'])
+        material_info = material_data.get(material, material_data['Iron Ore'])
         
         # Fill missing electricity consumption
         electricity = input_data.get('electricityConsumption')
@@ -52,7 +171,7 @@ class SmartAIAssistant:
             fuel_energy = material_info['avg_fuel'] + np.random.randint(-300, 300)
             fuel_energy = max(800, fuel_energy)  # Minimum 800 MJ
         
-        # Fill missing transport distance
+        # Fill missing transport distance (not locatable from site and destination)
         transport_distance = input_data.get('transportDistance')
         if not transport_distance or transport_distance == '':
             transport_distance = np.random.randint(150, 450)  # 150-450 km range
@@ -81,7 +200,7 @@ class SmartAIAssistant:
                 else:
                     transport_mode = 'Rail'
         
-        # Default landfill if missing
+        # Default landfill if missing and the site is not located
         landfill_location = input_data.get('landfillLocation')
         if not landfill_location or landfill_location == '':
             landfills = ['Ghazipur Delhi', 'Deonar Mumbai', 'Kodungaiyur Chennai']
@@ -97,46 +216,20 @@ class SmartAIAssistant:
             'landfillLocation': landfill_location
         }
 
-    def calculate_environmental_impact(self, data: Dict[str, Any]) -> Dict[str, float]:
+    def calculate_environmental_impact(self, data: Dict[str, Any], factors=None) -> Dict[str, float]:
         """Calculate environmental impact metrics"""
-        material = data.get('materialType', 'Iron Ore')
-        material_info = self.material_data.get(material, self.material_data['Iron Ore'])
-        fuel_info = self.fuel_data.get(data.get('fuelType', 'Natural Gas'), self.fuel_data['Natural Gas'])
-        transport_info = self.transport_data.get(data.get('transportMode', 'Truck'), self.transport_data['Truck'])
-        
-        electricity = float(data.get('electricityConsumption', 0))
-        fuel_energy = float(data.get('fuelEnergy', 0))
-        distance = float(data.get('transportDistance', 0))
-        
-        # CO2 calculations
-        electricity_co2 = electricity * 0.5  # kg CO2 per kWh
-        fuel_co2 = fuel_energy * fuel_info['co2_factor']
-        transport_co2 = distance * transport_info['emission_factor'] * 10  # assuming 10 tons
-        material_co2 = (electricity + fuel_energy) * material_info['co2_factor'] * 0.1
-        
-        total_co2 = round(electricity_co2 + fuel_co2 + transport_co2 + material_co2)
-        
-        # Total energy calculation
-        total_energy = round(electricity * 3.6 + fuel_energy)  # Convert kWh to MJ
-        
-        # Fuel efficiency score (0-100)
-        base_efficiency = fuel_info['efficiency'] * 100
-        distance_penalty = min(20, distance / 50)  # Penalty for long distances
-        material_bonus = 10 if material_info['co2_factor'] < 1.5 else 0
-        fuel_efficiency_score = round(max(10, min(100, base_efficiency - distance_penalty + material_bonus)))
-        
-        return {
-            'co2Emissions': total_co2,
-            'totalEnergy': total_energy,
-            'fuelEfficiencyScore': fuel_efficiency_score
-        }
+        return (factors or self.factor_store.current()).model('smart_fill').evaluate(data)
 
-    def generate_explanations(self, data: Dict[str, Any], impact: Dict[str, float]) -> List[str]:
+    def generate_explanations(self, data: Dict[str, Any], impact: Dict[str, float], factors=None) -> List[str]:
         """Generate explanations for the calculations"""
+        factors = factors or self.factor_store.current()
+        fuel_data = factors.table('SMART_FILL_FUELS')
+        transport_data = factors.table('SMART_FILL_TRANSPORT')
+        coefficients = factors.table('SMART_FILL_COEFFICIENTS')
         explanations = [
-            f"Material processing for {data['materialType']} requires {data['electricityConsumption']} kWh electricity, generating {round(float(data['electricityConsumption']) * 0.5)} kg CO2",
-            f"{data['fuelType']} fuel provides {data['fuelEnergy']} MJ energy with {self.fuel_data.get(data['fuelType'], {}).get('efficiency', 0.75)} efficiency rating",
-            f"Transport via {data['transportMode']} over {data['transportDistance']}km generates approximately {round(float(data['transportDistance']) * self.transport_data.get(data['transportMode'], {}).get('emission_factor', 0.1) * 10)} kg CO2",
+            f"Material processing for {data['materialType']} requires {data['electricityConsumption']} kWh electricity, generating {round(float(data['electricityConsumption']) * coefficients['electricity_factor'])} kg CO2",
+            f"{data['fuelType']} fuel provides {data['fuelEnergy']} MJ energy with {fuel_data.get(data['fuelType'], {}).get('efficiency', 0.75)} efficiency rating",
+            f"Transport via {data['transportMode']} over {data['transportDistance']}km generates approximately {round(float(data['transportDistance']) * transport_data.get(data['transportMode'], {}).get('emission_factor', 0.1) * coefficients['weight_tons'])} kg CO2",
             f"Total environmental impact: {impact['co2Emissions']} kg CO2 emissions with {impact['fuelEfficiencyScore']}/100 efficiency score"
         ]
         return explanations
@@ -185,27 +278,84 @@ class SmartAIAssistant:
         
         return recommendations
 
-    def process_smart_fill(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Main smart fill processing function"""
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def readable_field_name(key: str) -> str:
+        """Convert camelCase to readable format (memoized; the field set is small)"""
+        return ''.join([' ' + c.lower() if c.isupper() else c for c in key]).strip()
+
+    def detect_missing_fields(self, input_data: Dict[str, Any], completed_data: Dict[str, Any]) -> List[str]:
+        """Keys of the completed fields that the input left empty"""
+        return [key for key in completed_data if not input_data.get(key) or input_data.get(key) == '']
+
+    def _remember(self, numbers: Dict[str, Any]) -> str:
+        """Store a numeric result and return the ID to explain it by later"""
+        return self.results.put(numbers)
+
+    def explain(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Explanations, recommendations and readable missing fields for a numeric result
+
+        Takes either a ``resultId`` from a numbers-only response or the numeric
+        ``completedData``/``environmentalImpact`` (and optional ``missingFields``).
+        """
         try:
+            factors = self.factor_store.current()
+            if 'resultId' in request:
+                numbers = self.results.get(request['resultId'])
+                if numbers is not None and numbers.get('factorVersion') != factors.version:
+                    numbers = None
+                if numbers is None:
+                    return {'success': False, 'error': f"Unknown or expired resultId: {request['resultId']}"}
+            else:
+                numbers = request
+            completed_data = numbers['completedData']
+            impact = numbers['environmentalImpact']
+            return {
+                'success': True,
+                'data': {
+                    'explanation': self.generate_explanations(completed_data, impact, factors),
+                    'recommendations': self.generate_recommendations(completed_data, impact),
+                    'missingFieldsDetected': [self.readable_field_name(k) for k in numbers.get('missingFields', [])]
+                }
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Explanation failed: {str(e)}'
+            }
+
+    def process_smart_fill(self, input_data: Dict[str, Any], shape: str = 'full') -> Dict[str, Any]:
+        """Main smart fill processing function
+
+        ``shape='numbers'`` skips all text generation and returns the completed
+        data, impacts, missing field keys and a ``resultId`` for ``explain``.
+        """
+        try:
+            # One factor version for the whole request, even if a new one is published meanwhile
+            factors = self.factor_store.current()
+            
             # Complete missing data
-            completed_data = self.smart_fill_data(input_data)
+            completed_data = self.smart_fill_data(input_data, factors)
             
             # Calculate environmental impact
-            environmental_impact = self.calculate_environmental_impact(completed_data)
+            environmental_impact = self.calculate_environmental_impact(completed_data, factors)
+            
+            # Detect which fields were missing
+            missing_fields = self.detect_missing_fields(input_data, completed_data)
+            
+            if shape == 'numbers':
+                numbers = {
+                    'completedData': completed_data,
+                    'environmentalImpact': environmental_impact,
+                    'missingFields': missing_fields,
+                    'factorVersion': factors.version
+                }
+                return {'success': True, 'data': {**numbers, 'resultId': self._remember(numbers)}}
             
             # Generate explanations and recommendations
-            explanations = self.generate_explanations(completed_data, environmental_impact)
+            explanations = self.generate_explanations(completed_data, environmental_impact, factors)
             recommendations = self.generate_recommendations(completed_data, environmental_impact)
             
-            # Detect which fields were missing
-            missing_fields = []
-            for key in completed_data.keys():
-                if not input_data.get(key) or input_data.get(key) == '':
-                    # Convert camelCase to readable format
-                    readable_key = ''.join([' ' + c.lower() if c.isupper() else c for c in key]).strip()
-                    missing_fields.append(readable_key)
-            
             return {
                 'success': True,
                 'data': {
@@ -213,7 +363,8 @@ class SmartAIAssistant:
                     'explanation': explanations,
                     'recommendations': recommendations,
                     'environmentalImpact': environmental_impact,
-                    'missingFieldsDetected': missing_fields
+                    'missingFieldsDetected': [self.readable_field_name(key) for key in missing_fields],
+                    'factorVersion': factors.version
                 }
             }
         except Exception as e:
@@ -222,6 +373,16 @@ class SmartAIAssistant:
                 'error': f'AI processing failed: {str(e)}'
             }
 
+    def process_smart_fill_batch(self, records: List[Dict[str, Any]], shape: str = 'numbers') -> Dict[str, Any]:
+        """Smart fill for many records; numbers-only unless a full shape is asked for"""
+        records = fill_records(records, self.geo)
+        with self.results.deferred():
+            data = [self.process_smart_fill(record, shape) for record in records]
+        return {
+            'success': True,
+            'data': data
+        }
+
 def main():
     """Main function to handle command line input"""
     if len(sys.argv) != 2:
@@ -231,7 +392,10 @@ def main():
     try:
         input_data = json.loads(sys.argv[1])
         ai_assistant = SmartAIAssistant()
-        result = ai_assistant.process_smart_fill(input_data)
+        if isinstance(input_data, list):
+            result = ai_assistant.process_smart_fill_batch(input_data)
+        else:
+            result = ai_assistant.process_smart_fill(input_data, input_data.get('responseShape', 'full'))
         print(json.dumps(result))
     except Exception as e:
         print(json.dumps({'success': False, 'error': str(e)}))
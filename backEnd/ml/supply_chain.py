@@ -0,0 +1,220 @@
+import hashlib
+import json
+import sys
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from typing import Dict, List, Any
+from lca_pipeline import LCAPipeline
+
+
+def chain_fingerprint(definition: Dict[str, Any], include_utilities: bool = True, factor_version: str = '') -> str:
+    """Hash of a chain definition and the factor version its utility processes are built from"""
+    key = json.dumps([definition, include_utilities, factor_version if include_utilities else ''], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+class SupplyChainLCA:
+    """Matrix based LCA over a multi-stage supply chain
+
+    A chain is declared as a list of processes, each producing one product and
+    consuming other products (technosphere) while emitting elementary flows
+    (biosphere). The technosphere matrix is factorized once and reused for every
+    demand vector until an exchange changes.
+
+    Example definition::
+
+        {
+            "processes": [
+                {"name": "mine", "product": "ore", "output": 1.0,
+                 "inputs": {"diesel": 20.0}, "emissions": {"water": 2.5}},
+                {"name": "smelter", "product": "copper", "output": 1.0,
+                 "inputs": {"ore": 3.0, "electricity": 400.0, "scrap": 0.2}},
+                {"name": "recycling", "product": "scrap", "output": 1.0,
+                 "inputs": {"copper": 0.05, "electricity": 50.0}}
+            ]
+        }
+
+    Products that are consumed but not produced by any declared process are
+    resolved against the LCAPipeline emission factors (electricity in kWh,
+    fuels in MJ, transport modes in t-km) when ``include_utilities`` is set.
+    """
+
+    def __init__(self, definition: Dict[str, Any], include_utilities: bool = True):
+        self.lca_pipeline = LCAPipeline()
+        processes = list(definition.get('processes', []))
+        if not processes:
+            raise ValueError('Supply chain definition has no processes')
+
+        if include_utilities:
+            processes.extend(self._utility_processes(processes))
+
+        self.processes = [p['name'] for p in processes]
+        self.products = [p['product'] for p in processes]
+        if len(set(self.products)) != len(self.products):
+            raise ValueError('Each product must be produced by exactly one process')
+        self.product_index = {product: i for i, product in enumerate(self.products)}
+
+        flows = sorted({flow for p in processes for flow in p.get('emissions', {})})
+        self.flows = flows
+        self.flow_index = {flow: i for i, flow in enumerate(flows)}
+
+        self.technosphere = self._build_technosphere(processes)
+        self.biosphere = self._build_biosphere(processes)
+        self._factorization = None
+
+    def _utility_processes(self, processes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Background processes for electricity, fuels and transport referenced by the chain"""
+        produced = {p['product'] for p in processes}
+        consumed = {product for p in processes for product in p.get('inputs', {})}
+        utilities = []
+        for product in sorted(consumed - produced):
+            key = product.lower().replace(' ', '_')
+            if key in self.lca_pipeline.emission_factors:
+                factor = self.lca_pipeline.emission_factors[key]
+            elif key in self.lca_pipeline.transport_emissions:
+                factor = self.lca_pipeline.transport_emissions[key]
+            else:
+                raise ValueError(f'No process produces {product}')
+            utilities.append({
+                'name': f'supply_{key}',
+                'product': product,
+                'output': 1.0,
+                'inputs': {},
+                'emissions': {'co2': factor}
+            })
+        return utilities
+
+    def _build_technosphere(self, processes: List[Dict[str, Any]]) -> sparse.csc_matrix:
+        rows, cols, values = [], [], []
+        for j, process in enumerate(processes):
+            rows.append(j)
+            cols.append(j)
+            values.append(float(process.get('output', 1.0)))
+            for product, amount in process.get('inputs', {}).items():
+                if product not in self.product_index:
+                    raise ValueError(f'No process produces {product}')
+                rows.append(self.product_index[product])
+                cols.append(j)
+                values.append(-float(amount))
+        n = len(processes)
+        # Duplicate (row, col) entries are summed, so self-consumption nets off the output
+        return sparse.csc_matrix((values, (rows, cols)), shape=(n, n))
+
+    def _build_biosphere(self, processes: List[Dict[str, Any]]) -> sparse.csr_matrix:
+        rows, cols, values = [], [], []
+        for j, process in enumerate(processes):
+            for flow, amount in process.get('emissions', {}).items():
+                rows.append(self.flow_index[flow])
+                cols.append(j)
+                values.append(float(amount))
+        return sparse.csr_matrix((values, (rows, cols)), shape=(len(self.flows), len(processes)))
+
+    @property
+    def factorization(self):
+        """Sparse LU factorization of the technosphere matrix, computed on first use"""
+        if self._factorization is None:
+            try:
+                self._factorization = splu(self.technosphere)
+            except RuntimeError as e:
+                raise ValueError(f'Supply chain technosphere matrix is singular: {str(e)}')
+        return self._factorization
+
+    def update_exchange(self, process: str, product: str, amount: float):
+        """Change one input amount of a process, invalidating the cached factorization"""
+        j = self.processes.index(process)
+        i = self.product_index[product]
+        if i == j:
+            raise ValueError('Use the process output to change its own product')
+        technosphere = self.technosphere.tolil()
+        technosphere[i, j] = -float(amount)
+        self.technosphere = technosphere.tocsc()
+        self._factorization = None
+
+    def update_emission(self, process: str, flow: str, amount: float):
+        """Change one elementary flow of a process; the factorization stays valid"""
+        if flow not in self.flow_index:
+            raise ValueError(f'Unknown flow: {flow}')
+        biosphere = self.biosphere.tolil()
+        biosphere[self.flow_index[flow], self.processes.index(process)] = float(amount)
+        self.biosphere = biosphere.tocsr()
+
+    def demand_matrix(self, demands: List[Dict[str, float]]) -> np.ndarray:
+        """Final demand vectors as columns of a dense matrix"""
+        matrix = np.zeros((len(self.products), len(demands)))
+        for k, demand in enumerate(demands):
+            for product, amount in demand.items():
+                if product not in self.product_index:
+                    raise ValueError(f'Unknown product in demand: {product}')
+                matrix[self.product_index[product], k] = float(amount)
+        return matrix
+
+    def solve_many(self, demands: List[Dict[str, float]]) -> Dict[str, np.ndarray]:
+        """Scaling vectors and inventories for a batch of demand vectors
+
+        All scenarios share one factorization and are solved in a single
+        multi right-hand-side back substitution.
+        """
+        rhs = self.demand_matrix(demands)
+        scaling = self.factorization.solve(rhs)
+        inventory = self.biosphere @ scaling
+        return {'scaling': scaling, 'inventory': np.asarray(inventory)}
+
+    def solve(self, demand: Dict[str, float]) -> Dict[str, Any]:
+        """Scaling factors per process and inventory per flow for one demand vector"""
+        result = self.solve_many([demand])
+        scaling = result['scaling'][:, 0]
+        inventory = result['inventory'][:, 0]
+        return {
+            'scaling': dict(zip(self.processes, scaling.tolist())),
+            'inventory': dict(zip(self.flows, inventory.tolist()))
+        }
+
+    def contributions(self, demand: Dict[str, float], flow: str = 'co2') -> Dict[str, float]:
+        """Per-process contribution to one elementary flow"""
+        scaling = self.solve_many([demand])['scaling'][:, 0]
+        row = self.biosphere.getrow(self.flow_index[flow]).toarray().ravel()
+        return dict(zip(self.processes, (row * scaling).tolist()))
+
+    def run(self, demands: Any) -> Dict[str, Any]:
+        """Solve one or many demand scenarios and build a JSON friendly response"""
+        try:
+            scenarios = demands if isinstance(demands, list) else [demands]
+            result = self.solve_many(scenarios)
+            return {
+                'success': True,
+                'data': {
+                    'processes': self.processes,
+                    'flows': self.flows,
+                    'scenarios': [
+                        {
+                            'scaling': dict(zip(self.processes, np.round(result['scaling'][:, k], 6).tolist())),
+                            'inventory': dict(zip(self.flows, np.round(result['inventory'][:, k], 4).tolist()))
+                        }
+                        for k in range(len(scenarios))
+                    ]
+                }
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Supply chain LCA failed: {str(e)}'
+            }
+
+
+def main():
+    """Main function for command line usage"""
+    if len(sys.argv) != 2:
+        print(json.dumps({'success': False, 'error': 'Usage: python supply_chain.py <request_json>'}))
+        return
+
+    try:
+        request = json.loads(sys.argv[1])
+        chain = SupplyChainLCA(request['chain'], request.get('include_utilities', True))
+        print(json.dumps(chain.run(request['demand'])))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import time
+import numpy as np
+from typing import Dict, Any, Optional
+
+# Holdout RMSE, as a fraction of the holdout target's standard deviation, below which the surrogate serves
+DEFAULT_TOLERANCE = 0.01
+
+# Training rows from which the surrogate stage is tried before fitting a forest
+DEFAULT_MIN_ROWS = 5000
+
+
+class LinearSurrogate:
+    """Least-squares linear model with an sklearn-style fit/predict
+
+    The LCA targets are linear in the inputs, so one ``lstsq`` solve recovers
+    them exactly where a forest only approximates them in steps. With
+    ``group_column`` the model is piecewise: one solve per value of that
+    (categorical) column, with groups too small to determine their own
+    coefficients served by the pooled fit.
+    """
+
+    def __init__(self, group_column: Optional[int] = None):
+        self.group_column = group_column
+        self.coefficients: Optional[np.ndarray] = None
+        self.group_coefficients: Dict[float, np.ndarray] = {}
+
+    @staticmethod
+    def _design(X: np.ndarray) -> np.ndarray:
+        return np.column_stack([X, np.ones(len(X))])
+
+    def _features(self, X: np.ndarray) -> np.ndarray:
+        if self.group_column is None:
+            return X
+        return np.delete(X, self.group_column, axis=1)
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> 'LinearSurrogate':
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        design = self._design(self._features(X))
+        self.coefficients = np.linalg.lstsq(design, y, rcond=None)[0]
+        self.group_coefficients = {}
+        if self.group_column is not None:
+            groups, codes = np.unique(X[:, self.group_column], return_inverse=True)
+            for i, group in enumerate(groups):
+                rows = codes == i
+                if rows.sum() > design.shape[1]:
+                    self.group_coefficients[float(group)] = np.linalg.lstsq(design[rows], y[rows], rcond=None)[0]
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        design = self._design(self._features(X))
+        predictions = design @ self.coefficients
+        for group, coefficients in self.group_coefficients.items():
+            rows = X[:, self.group_column] == group
+            predictions[rows] = design[rows] @ coefficients
+        return predictions
+
+
+def holdout_error(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, float]:
+    """RMSE, R2 and RMSE relative to the target's spread on a holdout split"""
+    residual = np.asarray(y_true, dtype=float) - np.asarray(y_pred, dtype=float)
+    rmse = float(np.sqrt(np.mean(residual ** 2)))
+    spread = float(np.std(y_true))
+    total = float(np.sum((y_true - np.mean(y_true)) ** 2))
+    return {
+        'rmse': rmse,
+        'r2_score': 1.0 - float(np.sum(residual ** 2)) / total if total > 0 else float(rmse == 0),
+        'relative_rmse': rmse / spread if spread > 0 else (0.0 if rmse == 0 else float('inf'))
+    }
+
+
+def fit_surrogate(X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, y_test: np.ndarray,
+                  tolerance: float = DEFAULT_TOLERANCE,
+                  group_column: Optional[int] = None) -> Dict[str, Any]:
+    """Fit the surrogate and decide from its holdout error whether it may serve
+
+    Returns the model, its holdout metrics, the timing and ``accepted`` (relative
+    holdout RMSE within ``tolerance``).
+    """
+    started = time.perf_counter()
+    model = LinearSurrogate(group_column).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+    metrics = holdout_error(y_test, model.predict(X_test))
+    return {
+        'model': model,
+        'accepted': metrics['relative_rmse'] <= tolerance,
+        'tolerance': tolerance,
+        'piecewise': group_column is not None,
+        'groups': len(model.group_coefficients),
+        'fit_seconds': round(fit_seconds, 6),
+        **metrics
+    }
@@ -0,0 +1,200 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Iterator, Optional
+from lca_model import SMART_FILL_MATERIALS, SMART_FILL_FUELS, SMART_FILL_TRANSPORT
+from factor_tables import get_store
+from sharded_models import KNOWN_MATERIALS
+
+DEFAULT_CHUNK_SIZE = 250000
+
+FUELS = list(SMART_FILL_FUELS)
+TRANSPORT_MODES = list(SMART_FILL_TRANSPORT)
+
+# Spread (sigma of the log) of the per-material lognormal consumption distributions
+CONSUMPTION_SIGMA = 0.25
+
+# Median and sigma of the lognormal transport distance (km), clipped to the range below
+DISTANCE_MEDIAN = 300.0
+DISTANCE_SIGMA = 0.8
+DISTANCE_RANGE = (10.0, 5000.0)
+
+# Input columns that receive missing values; MaterialType is always present
+MISSING_COLUMNS = ['ElectricityConsumption_kWh', 'FuelEnergy_MJ', 'TransportDistance_km', 'FuelType',
+                   'TransportMode', 'RecyclePercent', 'ReusePercent', 'LandfillPercent']
+
+FORMATS = ('csv', 'npy', 'parquet')
+
+
+class SyntheticLCAGenerator:
+    """Seeded, vectorized generator of CSV-upload shaped LCA datasets
+
+    Each material draws electricity and fuel energy from lognormals centred on
+    its smart-fill averages; distance is lognormal, the transport mode follows
+    distance the way smart fill picks it (bulk ores ship long hauls), and
+    end-of-life shares are Dirichlet so they sum to 100. The carbonEmissions
+    target is computed by the 'csv' model variant before ``missing_rate`` of
+    the input cells are blanked, and ``duplicate_rate`` of the rows are exact
+    copies of other rows in the same chunk. Chunk ``i`` comes from its own
+    child of the seed, so a (seed, chunk_size) pair always yields the same data
+    for one factor version; the generator keeps the version current when built.
+    """
+
+    def __init__(self, seed: int = 42, missing_rate: float = 0.0, duplicate_rate: float = 0.0,
+                 material_weights: Optional[Dict[str, float]] = None, include_target: bool = True):
+        self.seed = seed
+        self.missing_rate = missing_rate
+        self.duplicate_rate = duplicate_rate
+        weights = material_weights or {m: 1.0 for m in KNOWN_MATERIALS}
+        self.materials = list(weights)
+        self.material_p = np.array(list(weights.values()), dtype=float) / sum(weights.values())
+        profiles = [SMART_FILL_MATERIALS.get(m, SMART_FILL_MATERIALS['Iron Ore']) for m in self.materials]
+        self.avg_electricity = np.array([p['avg_electricity'] for p in profiles], dtype=float)
+        self.avg_fuel = np.array([p['avg_fuel'] for p in profiles], dtype=float)
+        self.bulk = np.isin(self.materials, ['Bauxite', 'Iron Ore'])
+        self.include_target = include_target
+        factors = get_store().current()
+        self.model = factors.model('csv')
+        self.factor_version = factors.version
+
+    def generate(self, n_rows: int, rng: np.random.Generator) -> pd.DataFrame:
+        """One chunk of ``n_rows`` rows"""
+        material = rng.choice(len(self.materials), size=n_rows, p=self.material_p)
+        electricity = np.round(self.avg_electricity[material] * rng.lognormal(0.0, CONSUMPTION_SIGMA, n_rows))
+        fuel_energy = np.round(self.avg_fuel[material] * rng.lognormal(0.0, CONSUMPTION_SIGMA, n_rows))
+        distance = np.round(np.clip(DISTANCE_MEDIAN * rng.lognormal(0.0, DISTANCE_SIGMA, n_rows), *DISTANCE_RANGE))
+
+        u = rng.random(n_rows)
+        # Codes into TRANSPORT_MODES: Truck, Ship, Rail, Air
+        mode = np.select(
+            [distance < 200, distance < 800, self.bulk[material], u < 0.05],
+            [0, np.where(u < 0.6, 2, 0), 1, 3],
+            default=2)
+        end_of_life = np.round(rng.dirichlet([2.0, 1.0, 1.5], n_rows) * 100, 1)
+
+        df = pd.DataFrame({
+            'MaterialType': np.asarray(self.materials, dtype=object)[material],
+            'ElectricityConsumption_kWh': electricity,
+            'FuelEnergy_MJ': fuel_energy,
+            'TransportDistance_km': distance,
+            'FuelType': np.asarray(FUELS, dtype=object)[rng.integers(0, len(FUELS), n_rows)],
+            'TransportMode': np.asarray(TRANSPORT_MODES, dtype=object)[mode],
+            'RecyclePercent': end_of_life[:, 0],
+            'ReusePercent': end_of_life[:, 1],
+            'LandfillPercent': end_of_life[:, 2]
+        })
+        if self.include_target:
+            df['carbonEmissions'] = self.model.evaluate_batch(df)['carbonEmissions'].to_numpy()
+
+        if self.missing_rate > 0:
+            blank = rng.random((n_rows, len(MISSING_COLUMNS))) < self.missing_rate
+            for j, column in enumerate(MISSING_COLUMNS):
+                df[column] = df[column].mask(blank[:, j])
+        if self.duplicate_rate > 0 and n_rows > 1:
+            source = np.arange(n_rows)
+            copies = rng.random(n_rows) < self.duplicate_rate
+            originals = source[~copies]
+            if copies.any() and len(originals):
+                source[copies] = rng.choice(originals, int(copies.sum()))
+                df = df.iloc[source].reset_index(drop=True)
+        return df
+
+    def chunks(self, n_rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """Frames of at most ``chunk_size`` rows totalling ``n_rows``"""
+        n_chunks = -(-n_rows // chunk_size)
+        for i, child in enumerate(np.random.SeedSequence(self.seed).spawn(n_chunks)):
+            yield self.generate(min(chunk_size, n_rows - i * chunk_size), np.random.default_rng(child))
+
+    def encode(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Numeric matrix of a chunk for NPY output: categoricals as codes, missing as NaN"""
+        columns = []
+        for column in chunk.columns:
+            values = chunk[column]
+            if column == 'MaterialType':
+                codes = values.map({m: i for i, m in enumerate(KNOWN_MATERIALS)})
+            elif column == 'FuelType':
+                codes = values.map({f: i for i, f in enumerate(FUELS)})
+            elif column == 'TransportMode':
+                codes = values.map({t: i for i, t in enumerate(TRANSPORT_MODES)})
+            else:
+                codes = values
+            columns.append(codes.to_numpy(dtype=float, na_value=np.nan))
+        return np.column_stack(columns)
+
+    def write(self, path: str, n_rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              fmt: Optional[str] = None) -> Dict[str, Any]:
+        """Stream ``n_rows`` rows to a CSV, NPY or Parquet file, one chunk in memory at a time"""
+        fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise ValueError(f'Unsupported format: {fmt} (expected one of {", ".join(FORMATS)})')
+        started = time.perf_counter()
+        writer = schema = None
+        columns: List[str] = []
+        offset = 0
+        tmp_path = path + '.tmp'
+        try:
+            try:
+                for chunk in self.chunks(n_rows, chunk_size):
+                    columns = list(chunk.columns)
+                    if fmt == 'npy':
+                        if writer is None:
+                            writer = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64,
+                                                               shape=(n_rows, len(columns)))
+                        writer[offset:offset + len(chunk)] = self.encode(chunk)
+                    else:
+                        # pyarrow's CSV writer is several times faster than DataFrame.to_csv
+                        import pyarrow as pa
+                        import pyarrow.csv as pa_csv
+                        import pyarrow.parquet as pq
+                        table = pa.Table.from_pandas(chunk, preserve_index=False)
+                        if writer is None:
+                            schema = table.schema
+                            writer = (pa_csv.CSVWriter if fmt == 'csv' else pq.ParquetWriter)(tmp_path, schema)
+                        writer.write_table(table.cast(schema))
+                    offset += len(chunk)
+            finally:
+                if fmt == 'npy' and writer is not None:
+                    writer.flush()
+                    del writer
+                elif writer is not None:
+                    writer.close()
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        if fmt == 'npy':
+            # Column order and category codes for reading the matrix back
+            with open(path + '.json', 'w') as f:
+                json.dump({'columns': columns, 'MaterialType': KNOWN_MATERIALS, 'FuelType': FUELS,
+                           'TransportMode': TRANSPORT_MODES, 'factorVersion': self.factor_version}, f)
+        return {
+            'path': path,
+            'format': fmt,
+            'rows': offset,
+            'columns': columns,
+            'factorVersion': self.factor_version,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+
+def main():
+    """Main function for command line usage: write a synthetic dataset"""
+    if len(sys.argv) < 3:
+        print(json.dumps({'success': False, 'error': 'Usage: python synthetic_data.py <path.csv|.npy|.parquet> <rows> [options_json]'}))
+        return
+
+    try:
+        options = json.loads(sys.argv[3]) if len(sys.argv) > 3 else {}
+        chunk_size = options.pop('chunk_size', DEFAULT_CHUNK_SIZE)
+        generator = SyntheticLCAGenerator(**options)
+        print(json.dumps({'success': True, 'data': generator.write(sys.argv[1], int(sys.argv[2]), chunk_size)}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
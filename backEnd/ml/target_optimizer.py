@@ -0,0 +1,244 @@
+import json
+import sys
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional
+from lca_pipeline import LCAPipeline
+from sensitivity import SensitivityAnalyzer
+from smart_ai_assistant import SmartAIAssistant
+
+# Prices in relative cost units. Fuel and transport prices are scaled by the
+# SmartAIAssistant 'cost' / 'cost_factor' indices; the continuous levers are
+# priced per unit of change. All can be overridden per request.
+DEFAULT_LEVER_COSTS = {
+    'fuel_per_mj': 0.01,
+    'transport_per_tkm': 0.05,
+    'electricity_reduction_per_kwh': 0.12,
+    'recycle_per_point': 5.0,
+    'reuse_per_point': 8.0
+}
+
+
+class TargetOptimizer:
+    """Minimum-cost plans reaching a CO2 target over the LCAPipeline model
+
+    For a fixed fuel and transport mode, LCAPipeline CO2 falls linearly with
+    electricity savings and with recycle/reuse points until circularity reaches
+    100. The continuous levers therefore form a fractional knapsack: they are
+    used cheapest-per-kg first, with recycle and reuse sharing the circularity
+    headroom. Every fuel/mode branch is evaluated this way for all records at
+    once, and branches whose full lever capacity cannot reach the target are
+    discarded before costing. Each optimization reads every factor and
+    coefficient from one factor-table snapshot.
+    """
+
+    def __init__(self, lever_costs: Optional[Dict[str, float]] = None,
+                 fuel_options: Optional[List[str]] = None,
+                 transport_options: Optional[List[str]] = None,
+                 max_electricity_reduction: float = 0.3,
+                 max_recycle_percent: float = 100.0,
+                 max_reuse_percent: float = 100.0,
+                 factor_store=None, ai_assistant: Optional[SmartAIAssistant] = None):
+        self.lca_pipeline = LCAPipeline(factor_store=factor_store)
+        self.ai_assistant = ai_assistant or SmartAIAssistant(factor_store=factor_store)
+        self.lever_costs = {**DEFAULT_LEVER_COSTS, **(lever_costs or {})}
+        self.fuel_options = fuel_options or list(self.ai_assistant.fuel_data)
+        self.transport_options = transport_options or list(self.ai_assistant.transport_data)
+        self.max_electricity_reduction = max_electricity_reduction
+        self.max_recycle_percent = max_recycle_percent
+        self.max_reuse_percent = max_reuse_percent
+
+    @staticmethod
+    def _fuel_factor(pipeline: LCAPipeline, fuel: str) -> float:
+        return pipeline.emission_factors.get(fuel.lower().replace(' ', '_'), 0.2)
+
+    @staticmethod
+    def _transport_factor(pipeline: LCAPipeline, mode: str) -> float:
+        return pipeline.transport_emissions.get(mode.lower(), 0.1)
+
+    def _fuel_cost(self, fuel: str) -> float:
+        return self.ai_assistant.fuel_data.get(fuel, self.ai_assistant.fuel_data['Natural Gas'])['cost']
+
+    def _transport_cost(self, mode: str) -> float:
+        return self.ai_assistant.transport_data.get(mode, self.ai_assistant.transport_data['Truck'])['cost_factor']
+
+    def _targets(self, df: pd.DataFrame, current_co2: np.ndarray, target_co2: Optional[float],
+                 target_reduction: Optional[float]) -> np.ndarray:
+        if 'targetCo2' in df.columns:
+            per_record = pd.to_numeric(df['targetCo2'], errors='coerce').to_numpy(dtype=float)
+        else:
+            per_record = np.full(len(df), np.nan)
+        if target_co2 is not None:
+            default = np.full(len(df), float(target_co2))
+        elif target_reduction is not None:
+            default = current_co2 * (1.0 - float(target_reduction))
+        else:
+            raise ValueError('A target_co2, target_reduction or per-record targetCo2 is required')
+        return np.where(np.isnan(per_record), default, per_record)
+
+    def optimize(self, records: List[Dict[str, Any]], target_co2: Optional[float] = None,
+                 target_reduction: Optional[float] = None) -> Dict[str, Any]:
+        """Cheapest lever combination per record; vectorized over records and branches"""
+        df = pd.DataFrame(records)
+        n = len(df)
+        # A snapshot serves as a store pinned to its version for the whole optimization
+        factors = self.lca_pipeline.factor_store.current()
+        pipeline = LCAPipeline(factor_store=factors)
+        coefficients = factors.table('PIPELINE_COEFFICIENTS')
+        load_tons = coefficients['weight_tons']
+        credit = coefficients['circularity_co2_credit']
+        recycle_weight, reuse_weight = coefficients['recycle_weight'], coefficients['reuse_weight']
+        grid_factor = coefficients['electricity_factor']
+
+        terms = SensitivityAnalyzer(model='pipeline', factor_store=factors).model_terms(records)
+        inputs = terms['inputs']
+        electricity, fuel_mj, distance, recycle, reuse = (inputs[:, i] for i in range(5))
+        circularity = recycle_weight * recycle + reuse_weight * reuse
+
+        current_fuels = df.get('fuelType', pd.Series(['Natural Gas'] * n)).fillna('Natural Gas').astype(str)
+        current_modes = df.get('transportMode', pd.Series(['Truck'] * n)).fillna('Truck').astype(str)
+
+        # CO2 without the fuel and transport terms, shared by every branch
+        fixed_co2 = terms['intercept'] + electricity * grid_factor - credit * np.minimum(100.0, circularity)
+        current_co2 = fixed_co2 + fuel_mj * terms['coefficients'][:, 1] + distance * terms['coefficients'][:, 2]
+        targets = self._targets(df, current_co2, target_co2, target_reduction)
+        current_fuel_cost = current_fuels.map(self._fuel_cost).to_numpy(dtype=float)
+        current_transport_cost = current_modes.map(self._transport_cost).to_numpy(dtype=float)
+
+        # Continuous levers: kg CO2 capacity and cost per kg, cheapest first
+        costs = self.lever_costs
+        circular_headroom = credit * np.maximum(0.0, 100.0 - circularity)
+        electricity_capacity = grid_factor * electricity * self.max_electricity_reduction
+        recycle_capacity = credit * recycle_weight * np.maximum(0.0, self.max_recycle_percent - recycle)
+        reuse_capacity = credit * reuse_weight * np.maximum(0.0, self.max_reuse_percent - reuse)
+        max_reduction = electricity_capacity + np.minimum(circular_headroom, recycle_capacity + reuse_capacity)
+        levers = [
+            ('electricity', costs['electricity_reduction_per_kwh'] / grid_factor, electricity_capacity),
+            ('recycle', costs['recycle_per_point'] / (credit * recycle_weight), recycle_capacity),
+            ('reuse', costs['reuse_per_point'] / (credit * reuse_weight), reuse_capacity)
+        ]
+        levers.sort(key=lambda lever: lever[1])
+
+        branches = [(f, m) for f in self.fuel_options for m in self.transport_options]
+        best_cost = np.full(n, np.inf)
+        best_branch = np.full(n, -1)
+        best_usage = {name: np.zeros(n) for name, _, _ in levers}
+        best_switch_cost = np.zeros(n)
+
+        for b, (fuel, mode) in enumerate(branches):
+            branch_co2 = (fixed_co2 + fuel_mj * self._fuel_factor(pipeline, fuel)
+                          + distance * load_tons * self._transport_factor(pipeline, mode))
+            needed = np.maximum(0.0, branch_co2 - targets)
+            feasible = needed <= max_reduction + 1e-9
+            mode_limit = self.ai_assistant.transport_data.get(mode, {}).get('max_distance', np.inf)
+            feasible &= distance <= mode_limit
+            switch_cost = (fuel_mj * (self._fuel_cost(fuel) - current_fuel_cost) * costs['fuel_per_mj']
+                           + distance * load_tons * (self._transport_cost(mode) - current_transport_cost)
+                           * costs['transport_per_tkm'])
+            # Continuous costs are non-negative, so the switch cost bounds the branch
+            candidates = feasible & (switch_cost < best_cost)
+            if not candidates.any():
+                continue
+
+            remaining = needed.copy()
+            circular_left = circular_headroom.copy()
+            cost = switch_cost.copy()
+            usage = {}
+            for name, cost_per_kg, capacity in levers:
+                limit = capacity if name == 'electricity' else np.minimum(capacity, circular_left)
+                used = np.minimum(remaining, limit)
+                if name != 'electricity':
+                    circular_left = circular_left - used
+                remaining = remaining - used
+                cost = cost + used * cost_per_kg
+                usage[name] = used
+
+            improved = candidates & (cost < best_cost)
+            best_cost = np.where(improved, cost, best_cost)
+            best_branch = np.where(improved, b, best_branch)
+            best_switch_cost = np.where(improved, switch_cost, best_switch_cost)
+            for name in usage:
+                best_usage[name] = np.where(improved, usage[name], best_usage[name])
+
+        plans = []
+        for i in range(n):
+            if best_branch[i] < 0:
+                plans.append({
+                    'feasible': False,
+                    'current_co2_emissions': round(float(current_co2[i]), 2),
+                    'target_co2': round(float(targets[i]), 2)
+                })
+                continue
+            fuel, mode = branches[best_branch[i]]
+            electricity_cut = best_usage['electricity'][i] / grid_factor
+            recycle_points = best_usage['recycle'][i] / (credit * recycle_weight)
+            reuse_points = best_usage['reuse'][i] / (credit * reuse_weight)
+            achieved = (fixed_co2[i] + fuel_mj[i] * self._fuel_factor(pipeline, fuel)
+                        + distance[i] * load_tons * self._transport_factor(pipeline, mode)
+                        - sum(best_usage[name][i] for name in best_usage))
+            plans.append({
+                'feasible': True,
+                'current_co2_emissions': round(float(current_co2[i]), 2),
+                'target_co2': round(float(targets[i]), 2),
+                'achieved_co2': round(float(achieved), 2),
+                'total_cost': round(float(best_cost[i]), 2),
+                'levers': {
+                    'fuelType': fuel,
+                    'transportMode': mode,
+                    'electricityReductionKwh': round(float(electricity_cut), 2),
+                    'recyclePercent': round(float(recycle[i] + recycle_points), 2),
+                    'reusePercent': round(float(reuse[i] + reuse_points), 2)
+                },
+                'cost_breakdown': {
+                    'switching': round(float(best_switch_cost[i]), 2),
+                    **{name: round(float(best_usage[name][i] * cost_per_kg), 2)
+                       for name, cost_per_kg, _ in levers}
+                }
+            })
+        return {'plans': plans, 'current_co2': current_co2, 'targets': targets}
+
+    def run(self, input_data: Any) -> Dict[str, Any]:
+        """Optimize one record or a portfolio given {'records' | 'record', 'target_co2' | 'target_reduction'}"""
+        try:
+            records = input_data.get('records') or ([input_data['record']] if input_data.get('record') else [])
+            if not records:
+                return {
+                    'success': False,
+                    'error': "Target optimization needs 'records' or a 'record' to optimize"
+                }
+            result = self.optimize(records, input_data.get('target_co2'), input_data.get('target_reduction'))
+            plans = result['plans']
+            feasible = [p for p in plans if p['feasible']]
+            return {
+                'success': True,
+                'data': {
+                    'plans': plans,
+                    'feasible_count': len(feasible),
+                    'infeasible_count': len(plans) - len(feasible),
+                    'total_cost': round(sum(p['total_cost'] for p in feasible), 2),
+                    'lever_costs': self.lever_costs
+                }
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Target optimization failed: {str(e)}'
+            }
+
+
+def main():
+    """Main function for command line usage"""
+    if len(sys.argv) != 2:
+        print(json.dumps({'success': False, 'error': 'Invalid input'}))
+        return
+
+    try:
+        input_data = json.loads(sys.argv[1])
+        optimizer = TargetOptimizer(**input_data.get('options', {}))
+        print(json.dumps(optimizer.run(input_data)))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,35 @@
 """Test script for ML services"""
 
 import json
-from smart_ai_assistant import SmartAIAssistant
+import tempfile
+import numpy as np
+import pandas as pd
+from smart_ai_assistant import SmartAIAssistant, NumericResultStore
 from lca_pipeline import LCAPipeline
 from ml_service import MLService
+from sensitivity import SensitivityAnalyzer
+from supply_chain import SupplyChainLCA
+from incremental_stats import IncrementalAggregates, refresh_dataset
+from csv_ml_service import process_csv_data, calculate_lca_row
+from batch_protocol import TypedBatch, encode_batch
+from target_optimizer import TargetOptimizer
+from knn_imputer import NeighbourImputer
+from model_selection import select_model, FoldCache
+from result_archive import ResultArchive
+from data_quality import StreamingQualityMonitor
+from grid_intensity import GridIntensityStore
+from sharded_models import ShardedForest, MaterialCodes, KNOWN_MATERIALS
+from lca_model import get_model, compile_model
+from batch_jobs import BatchJobQueue, BatchJobRunner
+from scheduler import Scheduler, LaneFull
+from surrogate import LinearSurrogate, fit_surrogate
+from geo import GeoRegistry, haversine_km, distance_matrix, fill_transport, fill_record
+from synthetic_data import SyntheticLCAGenerator
+from factor_tables import FactorTableStore, write_factor_file, merge_tables, get_store, BUILTIN_VERSION
+from ml_predict import predict_lca, predict_lca_batch
+from ai_prediction_service import calculate_impact
+from load_test import LoadGenerator, SCENARIOS, compare_reports
+from sketches import QuantileSketch, percentile
 
 def test_smart_fill():
     """Test smart fill functionality"""
@@ -20,8 +46,10 @@ def test_smart_fill():
         'landfillLocation': ''
     }
     
-    ai_assistant = SmartAIAssistant()
-    result = ai_assistant.process_smart_fill(test_data)
+    import os
+    with tempfile.TemporaryDirectory() as result_dir:
+        ai_assistant = SmartAIAssistant(result_path=os.path.join(result_dir, 'results.sqlite'))
+        result = ai_assistant.process_smart_fill(test_data)
     
     print("Smart Fill Result:")
     print(json.dumps(result, indent=2))
@@ -48,6 +76,11 @@ def test_lca_pipeline():
     
     print("LCA Pipeline Result:")
     print(json.dumps(result, indent=2))
+    # Omitted fields default to 0; blank or non-numeric ones are rejected
+    omitted = lca_pipeline.run_full_lca({'materialType': 'Copper', 'electricityConsumption': '500'})
+    invalid = lca_pipeline.run_full_lca({**test_data, 'fuelEnergy': '', 'transportDistance': 'far'})
+    assert omitted['success'] and omitted['results']['detailed_impacts']['transport']['distance'] == 0
+    assert not invalid['success'] and invalid['error'].endswith('not a number: fuelEnergy, transportDistance')
     return result['success']
 
 def test_ml_service():
@@ -71,6 +104,919 @@ def test_ml_service():
     print(json.dumps(result, indent=2))
     return result['success']
 
+def test_sensitivity():
+    """Test analytic elasticities against finite differences and Sobol indices"""
+    print("\nTesting Sensitivity Analysis...")
+    
+    test_data = {
+        'materialType': 'Copper',
+        'electricityConsumption': '1500',
+        'fuelType': 'Coal',
+        'fuelEnergy': '2200',
+        'transportMode': 'Truck',
+        'transportDistance': '400',
+        'landfillLocation': 'Ghazipur Delhi',
+        'recyclePercent': '30',
+        'reusePercent': '10'
+    }
+    
+    analyzer = SensitivityAnalyzer(n_samples=256, seed=7)
+    elasticities = analyzer.elasticities([test_data])['per_record'][0]
+    
+    lca_pipeline = LCAPipeline()
+    def total_co2(data):
+        impacts = lca_pipeline.run_full_lca(data)['results']['detailed_impacts']
+        return (impacts['extraction']['co2_emissions'] + impacts['processing']['total_processing_co2'] +
+                impacts['transport']['transport_co2'] + impacts['end_of_life']['total_eol_co2'] -
+                impacts['circularity']['co2_reduction'])
+    base_co2 = total_co2(test_data)
+    
+    for i, param in enumerate(analyzer.parameters):
+        bumped = dict(test_data)
+        bumped[param] = str(float(test_data[param]) * 1.001)
+        numeric = (total_co2(bumped) - base_co2) / base_co2 / 0.001
+        assert abs(numeric - elasticities[i]) < 1e-3, param
+    
+    result = analyzer.analyze([test_data, dict(test_data, fuelType='Biomass')])
+    print("Sensitivity Result:")
+    print(json.dumps(result['data']['sobol'], indent=2))
+    first_order = result['data']['sobol']['first_order']
+    assert abs(sum(first_order.values()) - 1.0) < 0.1
+    assert result['data']['dominant_parameter'] == 'electricityConsumption'
+    
+    # Record blocks and pool workers sharing the terms give the same indices as one pass
+    import sensitivity
+    portfolio = [dict(test_data, recyclePercent=str(i % 150), reusePercent=str(i % 40)) for i in range(300)]
+    whole = SensitivityAnalyzer(n_samples=64, seed=3).sobol_indices(portfolio)
+    block = sensitivity.RECORD_BLOCK
+    try:
+        sensitivity.RECORD_BLOCK = 64
+        blocked = SensitivityAnalyzer(n_samples=64, seed=3).sobol_indices(portfolio)
+        pooled = SensitivityAnalyzer(n_samples=64, seed=3, n_jobs=2, chunk_size=64).sobol_indices(portfolio)
+    finally:
+        sensitivity.RECORD_BLOCK = block
+    for indices in (blocked, pooled):
+        assert np.allclose(list(indices['total_order'].values()), list(whole['total_order'].values()))
+        assert np.isclose(indices['variance'], whole['variance'])
+    return result['success']
+
+def test_supply_chain():
+    """Test matrix LCA on a chain with a recycled feed loop"""
+    print("\nTesting Supply Chain LCA...")
+    
+    definition = {
+        'processes': [
+            {'name': 'mine', 'product': 'ore', 'inputs': {'diesel': 20.0}, 'emissions': {'water': 2.5}},
+            {'name': 'smelter', 'product': 'copper', 'inputs': {'ore': 3.0, 'electricity': 400.0, 'scrap': 0.2}},
+            {'name': 'recycling', 'product': 'scrap', 'inputs': {'copper': 0.05, 'electricity': 50.0}}
+        ]
+    }
+    chain = SupplyChainLCA(definition)
+    result = chain.solve({'copper': 1.0})
+    
+    print("Supply Chain Result:")
+    print(json.dumps(result, indent=2))
+    
+    # Smelter output s satisfies s = 1 + 0.05 * (0.2 * s)
+    smelter = 1.0 / (1.0 - 0.01)
+    assert abs(result['scaling']['smelter'] - smelter) < 1e-9
+    expected_co2 = 3.0 * smelter * 20.0 * 0.27 + (400.0 * smelter + 50.0 * 0.2 * smelter) * 0.5
+    assert abs(result['inventory']['co2'] - expected_co2) < 1e-6
+    
+    batch = chain.solve_many([{'copper': 1.0}, {'copper': 2.0, 'ore': 1.0}])
+    assert np.allclose(batch['scaling'][:, 0], list(result['scaling'].values()))
+    
+    # The service reuses one factorized chain per definition
+    service = MLService()
+    first = service.handle_request('supply_chain', {'chain': definition, 'demand': {'copper': 1.0}})
+    cached = service.supply_chain(json.loads(json.dumps(definition)))
+    second = service.handle_request('supply_chain', {'chain': definition, 'demand': {'copper': 2.0}})
+    assert cached._factorization is not None and len(service.supply_chains) == 1
+    changed = json.loads(json.dumps(definition))
+    changed['processes'][1]['inputs']['scrap'] = 0.3
+    assert service.supply_chain(changed) is not cached and service.supply_chain(definition) is cached
+    assert first['data']['scenarios'][0]['inventory'] == chain.run({'copper': 1.0})['data']['scenarios'][0]['inventory']
+    assert abs(second['data']['scenarios'][0]['scaling']['smelter'] - 2 * smelter) < 1e-6
+    return chain.run({'copper': 1.0})['success']
+
+def test_incremental_stats():
+    """Test that folded and retracted deltas match a full recomputation"""
+    print("\nTesting Incremental Statistics...")
+    
+    rng = np.random.default_rng(3)
+    rows = [{
+        'MaterialType': ['Copper', 'Zinc', 'Gold'][i % 3],
+        'ElectricityConsumption_kWh': float(rng.integers(500, 2500)),
+        'FuelEnergy_MJ': float(rng.integers(800, 4000)),
+        'TransportDistance_km': float(rng.integers(50, 600)),
+        'RecyclePercent': float(rng.integers(0, 90)),
+        'ReusePercent': float(rng.integers(0, 40)),
+        'LandfillPercent': float(rng.integers(0, 30))
+    } for i in range(60)]
+    
+    with tempfile.TemporaryDirectory() as state_dir:
+        refresh_dataset('plant-a', rows[:40], state_dir=state_dir)
+        result = refresh_dataset('plant-a', rows[40:], removed_rows=rows[:10], state_dir=state_dir)
+    
+    full = process_csv_data(rows[10:])
+    print("Incremental Result:")
+    print(json.dumps(result['summary_stats'], indent=2))
+    
+    for key in ['total_rows', 'avg_carbon_emissions', 'avg_energy_consumed', 'avg_water_use', 'avg_circularity']:
+        assert abs(result['summary_stats'][key] - full['summary_stats'][key]) < 1e-6, key
+    assert result['material_distribution'] == full['material_distribution']
+    assert result['top_recommendations'] == full['top_recommendations']
+    assert sum(result['charts_data']['circularity_histogram']['counts']) == 50
+    
+    median = result['summary_stats']['carbon_emissions_quantiles']['p50']
+    exact = float(np.median([r['carbonEmissions'] for r in full['detailed_results']]))
+    assert abs(median - exact) / exact < 0.05
+    
+    # Uploads fold into the dataset's aggregates through process_csv_data
+    with tempfile.TemporaryDirectory() as state_dir:
+        options = {'aggregate_dataset_id': 'plant-b', 'aggregates_dir': state_dir}
+        process_csv_data(rows[:40], options)
+        uploaded = process_csv_data(rows[40:], {**options, 'aggregate_removed': rows[:10]})
+        stored = IncrementalAggregates.load('plant-b', state_dir).summary()
+    aggregated = uploaded['aggregates']['summary_stats']
+    assert aggregated == stored['summary_stats'] and aggregated['total_rows'] == 50
+    assert abs(aggregated['avg_carbon_emissions'] - full['summary_stats']['avg_carbon_emissions']) < 1e-6
+    assert uploaded['aggregates']['material_distribution'] == full['material_distribution']
+    
+    # Signed values keep the sketch's relative accuracy on both sides of zero
+    signed = np.concatenate([-rng.lognormal(3, 1, 400), np.zeros(50), rng.lognormal(2, 1, 550)])
+    sketch = QuantileSketch()
+    sketch.add(signed)
+    sketch.remove(signed[:100])
+    sketch = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    kept = np.sort(signed[100:])
+    for q in (0.05, 0.3, 0.31, 0.5, 0.95):
+        exact = kept[int(q * (len(kept) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.011 * abs(exact), q
+    return result['success']
+
+def test_batch_protocol():
+    """Test binary batch round trip and CSV processing over zero-copy views"""
+    print("\nTesting Binary Batch Protocol...")
+    
+    rows = [{
+        'MaterialType': ['Copper', 'Zinc', 'Gold'][i % 3],
+        'ElectricityConsumption_kWh': 500.0 + 37 * i,
+        'FuelEnergy_MJ': 900.0 + 11 * i,
+        'TransportDistance_km': 100 + i,
+        'RecyclePercent': i % 70,
+        'ReusePercent': i % 20,
+        'LandfillPercent': i % 30
+    } for i in range(40)]
+    columns = {key: np.array([r[key] for r in rows]) for key in rows[0]}
+    
+    batch = TypedBatch.from_bytes(encode_batch(columns))
+    assert batch.rows == 40
+    assert batch.categories['MaterialType'] == ['Copper', 'Gold', 'Zinc']
+    frame = batch.to_frame()
+    assert np.shares_memory(frame['FuelEnergy_MJ'].to_numpy(), batch.columns['FuelEnergy_MJ'])
+    
+    from_batch = process_csv_data(frame)
+    from_json = process_csv_data(rows)
+    print("Batch Result:")
+    print(json.dumps(from_batch['summary_stats'], indent=2))
+    assert from_batch['summary_stats'] == from_json['summary_stats']
+    assert from_batch['material_distribution'] == from_json['material_distribution']
+    return from_batch['success']
+
+def test_target_optimizer():
+    """Test that optimized plans reach the CO2 target in the LCA pipeline"""
+    print("\nTesting Target Optimizer...")
+    
+    records = [
+        {'materialType': 'Copper', 'electricityConsumption': '2500', 'fuelType': 'Coal',
+         'fuelEnergy': '3000', 'transportMode': 'Truck', 'transportDistance': '800',
+         'recyclePercent': '10', 'reusePercent': '5'},
+        {'materialType': 'Gold', 'electricityConsumption': '1200', 'fuelType': 'Biomass',
+         'fuelEnergy': '1500', 'transportMode': 'Rail', 'transportDistance': '200',
+         'recyclePercent': '40', 'reusePercent': '20', 'targetCo2': '10'}
+    ]
+    
+    result = TargetOptimizer().run({'records': records, 'target_reduction': 0.4})
+    assert not TargetOptimizer().run({'target_co2': 100})['success']
+    assert not TargetOptimizer().run({'records': [], 'target_co2': 100})['success']
+    print("Target Optimizer Result:")
+    print(json.dumps(result, indent=2))
+    
+    plan, impossible = result['data']['plans']
+    assert plan['feasible'] and not impossible['feasible']
+    levers = plan['levers']
+    optimized = dict(records[0],
+                     fuelType=levers['fuelType'],
+                     transportMode=levers['transportMode'],
+                     electricityConsumption=2500 - levers['electricityReductionKwh'],
+                     recyclePercent=levers['recyclePercent'],
+                     reusePercent=levers['reusePercent'])
+    co2 = LCAPipeline().run_full_lca(optimized)['results']['total_co2_emissions']
+    assert co2 <= plan['target_co2'] + 0.01
+    
+    # Overridden coefficients reach every term of the plan, so it still lands on the pipeline's CO2
+    import os
+    with tempfile.TemporaryDirectory() as factor_dir:
+        path = os.path.join(factor_dir, 'factor_tables.json')
+        write_factor_file(path, {'PIPELINE_COEFFICIENTS': {'weight_tons': 20.0, 'recycle_weight': 0.5,
+                                                           'circularity_co2_credit': 0.1}}, 'heavy')
+        store = FactorTableStore(path, poll_interval=0)
+        heavy = TargetOptimizer(factor_store=store).run({'records': records[:1], 'target_reduction': 0.3})
+        levers = heavy['data']['plans'][0]['levers']
+        optimized = dict(records[0],
+                         fuelType=levers['fuelType'],
+                         transportMode=levers['transportMode'],
+                         electricityConsumption=2500 - levers['electricityReductionKwh'],
+                         recyclePercent=levers['recyclePercent'],
+                         reusePercent=levers['reusePercent'])
+        pipeline = LCAPipeline(factor_store=store)
+        current = pipeline.run_full_lca(records[0])['results']['total_co2_emissions']
+        heavy_co2 = pipeline.run_full_lca(optimized)['results']['total_co2_emissions']
+    plan = heavy['data']['plans'][0]
+    assert abs(plan['current_co2_emissions'] - current) < 0.02
+    assert abs(plan['achieved_co2'] - heavy_co2) < 0.02 and heavy_co2 <= plan['target_co2'] + 0.01
+    return result['success']
+
+def test_knn_imputer():
+    """Test neighbour-based imputation and its use in predict_missing"""
+    print("\nTesting Neighbour Imputer...")
+    
+    rng = np.random.default_rng(5)
+    history = []
+    for material, scale in [('Copper', 1.0), ('Gold', 2.0)]:
+        for electricity in rng.uniform(800, 2000, 200):
+            history.append({
+                'MaterialType': material,
+                'ElectricityConsumption_kWh': electricity * scale,
+                'FuelEnergy_MJ': electricity * scale * 1.5,
+                'TransportDistance_km': 300.0
+            })
+    
+    imputer = NeighbourImputer(k=5)
+    assert imputer.fit(history) == 400
+    imputed = imputer.impute_records([
+        {'materialType': 'Gold', 'electricityConsumption': '3000', 'fuelEnergy': ''},
+        {'materialType': 'Copper', 'electricityConsumption': '', 'fuelEnergy': '', 'transportDistance': '300'}
+    ])
+    print("Imputer Result:")
+    print(json.dumps(imputed, indent=2))
+    
+    assert abs(float(imputed[0]['completed']['fuelEnergy']) - 4500) < 100
+    assert imputed[0]['completed']['transportDistance'] == '300'
+    assert set(imputed[1]['completed']) == {'electricityConsumption', 'fuelEnergy'}
+    assert all(0 < c <= 1 for c in imputed[0]['confidence_scores'].values())
+    
+    ml_service = MLService()
+    ml_service.imputer = imputer
+    result = ml_service.predict_missing_values({'materialType': 'Gold', 'electricityConsumption': '3000',
+                                                'fuelType': 'Coal', 'transportMode': 'Rail'})
+    scores = result['data']['confidence_scores']
+    assert scores['fuelEnergy'] == imputed[0]['confidence_scores']['fuelEnergy']
+    assert 'fuel energy' in result['data']['missingFieldsDetected']
+    return result['success']
+
+def test_batch_deduplication():
+    """Test that duplicated CSV rows get the same per-row results in order"""
+    print("\nTesting Batch Deduplication...")
+    
+    templates = [
+        {'MaterialType': 'Copper', 'ElectricityConsumption_kWh': 1500, 'FuelEnergy_MJ': 2000,
+         'TransportDistance_km': 300, 'RecyclePercent': 40, 'ReusePercent': 10, 'LandfillPercent': 50},
+        {'MaterialType': 'Zinc', 'ElectricityConsumption_kWh': 900, 'FuelEnergy_MJ': 1200,
+         'TransportDistance_km': 120, 'RecyclePercent': 60, 'ReusePercent': 20, 'LandfillPercent': 20},
+        {'MaterialType': 'Gold', 'ElectricityConsumption_kWh': 3000, 'FuelEnergy_MJ': 4000,
+         'TransportDistance_km': 800, 'RecyclePercent': 10, 'ReusePercent': 5, 'LandfillPercent': 85}
+    ]
+    rows = [dict(templates[i % 3], RecyclePercent=templates[i % 3]['RecyclePercent'] + (i % 4))
+            for i in range(48)]
+    
+    result = process_csv_data(rows)
+    for row, detail in zip(rows, result['detailed_results']):
+        expected = calculate_lca_row(row)
+        assert detail['carbonEmissions'] == expected['carbonEmissions']
+        assert detail['circularityPercent'] == expected['circularityPercent']
+        assert detail['recommendations'] == expected['recommendations']
+    
+    predictions = {}
+    for row, detail in zip(rows, result['detailed_results']):
+        key = tuple(sorted(row.items()))
+        predictions.setdefault(key, detail['predicted_carbon'])
+        assert predictions[key] == detail['predicted_carbon']
+    print(f"Distinct rows: {len(predictions)} of {len(rows)}")
+    return result['success']
+
+def test_model_selection():
+    """Test cross-validated selection with successive halving and the fold cache"""
+    print("\nTesting Model Selection...")
+    
+    import os
+    rng = np.random.default_rng(11)
+    X = rng.uniform(0, 100, size=(120, 3))
+    y = X @ np.array([0.5, 0.07, 0.2]) + rng.normal(0, 0.5, 120)
+    grid = {'n_estimators': [10, 20], 'min_samples_leaf': [1, 5]}
+    
+    with tempfile.TemporaryDirectory() as cache_dir:
+        first = select_model(X, y, grid=grid, n_folds=4, n_jobs=1, cache_dir=cache_dir)
+        second = select_model(X, y, grid=grid, n_folds=4, n_jobs=1, cache_dir=cache_dir)
+        result = process_csv_data(
+            [{'ElectricityConsumption_kWh': 100 + 7 * i, 'FuelEnergy_MJ': 50 * (i % 9),
+              'TransportDistance_km': 10 * (i % 5)} for i in range(40)],
+            {'model_selection': True, 'n_jobs': 1, 'grid': grid, 'cv_folds': 3, 'cache_dir': cache_dir})
+        # Only folds and scores are persisted, for a bounded number of datasets
+        cached_files = {name for _, _, names in os.walk(cache_dir) for name in names}
+        for fingerprint in ('a', 'b', 'c'):
+            FoldCache(fingerprint, cache_dir, max_datasets=2)
+        remaining = sorted(os.listdir(cache_dir))
+    
+    print("Model Selection Result:")
+    print(json.dumps(first, indent=2))
+    assert first['cv_folds'] == 4 and first['rounds'] == 3
+    # Halving drops configurations, so fewer than configs x folds fits are needed
+    assert first['fold_fits'] < 4 * 4
+    assert second['fold_fits'] == 0 and second['cache_hits'] == first['fold_fits']
+    assert second['best_params'] == first['best_params']
+    assert cached_files == {'folds.joblib', 'scores.json'}
+    assert remaining == ['b', 'c']
+
+    assert result['model_metrics']['model_selection']['best_params']['n_estimators'] in (10, 20)
+    return result['success']
+
+def test_result_archive():
+    """Test archiving CSV results and querying them by partition and predicate"""
+    print("\nTesting Result Archive...")
+    
+    rows = [{
+        'MaterialType': ['Copper', 'Gold'][i % 2],
+        'ElectricityConsumption_kWh': 500 + 25 * i,
+        'FuelEnergy_MJ': 1000,
+        'TransportDistance_km': 100,
+        'Date': f'2026-0{1 + i % 3}-10'
+    } for i in range(30)]
+    
+    with tempfile.TemporaryDirectory() as archive_dir:
+        result = process_csv_data(rows, {'archive_dataset_id': 'plant-a', 'archive_dir': archive_dir,
+                                         'archive_date_column': 'Date'})
+        archive = ResultArchive(archive_dir)
+        gold = archive.query(columns=['carbonEmissions', 'month'], materials=['Gold'],
+                             months=('2026-02', '2026-03'), filters=[('carbonEmissions', '>', 400)])
+        by_material = archive.compare(by=['material'])
+        # Re-archiving a dataset replaces it; other datasets in the same partitions stay
+        archive.archive(pd.DataFrame(rows[:4]), 'plant-a2', date_column='Date')
+        process_csv_data(rows[:10], {'archive_dataset_id': 'plant-a', 'archive_dir': archive_dir,
+                                     'archive_date_column': 'Date'})
+        rearchived = archive.compare(by=['material'], datasets=['plant-a'])
+        archived_rows = archive.query(columns=['dataset_id'])
+    
+    print("Archive Result:")
+    print(by_material.to_string())
+    assert result['archive']['rows_archived'] == 30
+    assert list(gold.columns) == ['carbonEmissions', 'month']
+    expected = [calculate_lca_row(r)['carbonEmissions'] for i, r in enumerate(rows)
+                if i % 2 == 1 and i % 3 != 0]
+    assert sorted(gold['carbonEmissions']) == sorted(c for c in expected if c > 400)
+    copper = by_material[by_material['material'] == 'Copper'].iloc[0]
+    assert copper['rows'] == 15
+    assert abs(copper['carbonEmissions_mean'] - np.mean([calculate_lca_row(r)['carbonEmissions'] for r in rows[::2]])) < 1e-9
+    assert rearchived['rows'].sum() == 10
+    assert archived_rows['dataset_id'].value_counts().to_dict() == {'plant-a': 10, 'plant-a2': 4}
+    return result['success']
+
+def test_data_quality():
+    """Test the streaming data-quality pass and outlier exclusion from training"""
+    print("\nTesting Data Quality...")
+    
+    rows = [{
+        'MaterialType': ['Copper', 'Gold'][i % 2],
+        'ElectricityConsumption_kWh': 1000 + (i * 37) % 200,
+        'FuelEnergy_MJ': 2000 + (i * 53) % 300,
+        'TransportDistance_km': 100 + i % 50
+    } for i in range(200)]
+    rows[41]['ElectricityConsumption_kWh'] = 90000
+    rows[60]['FuelEnergy_MJ'] = 'abc'
+    rows[80]['TransportDistance_km'] = -5
+    
+    monitor = StreamingQualityMonitor(chunk_size=32)
+    flags = monitor.process(pd.DataFrame(rows))
+    report = monitor.report()
+    result = process_csv_data(rows, {'exclude_outliers': True})
+    
+    print("Quality Report:")
+    print(json.dumps(report['outliers'], indent=2))
+    assert flags[41] and flags[80] and flags.sum() == 2
+    assert report['outliers']['by_material'] == {'Gold': 1, 'Copper': 1}
+    assert report['columns']['FuelEnergy_MJ']['nulls'] == 1
+    assert report['columns']['TransportDistance_km']['negatives'] == 1
+    electricity = [float(r['ElectricityConsumption_kWh']) for r in rows]
+    assert abs(report['columns']['ElectricityConsumption_kWh']['std'] - np.std(electricity, ddof=1)) < 1e-3
+    assert result['data_quality']['excluded_from_training'] == 2
+    return result['success']
+
+def test_grid_intensity():
+    """Test time-resolved grid factors: point lookups, interval means and CSV scoring"""
+    print("\nTesting Grid Intensity...")
+    
+    import os
+    hours = pd.date_range('2025-01-01', periods=48, freq='h', tz='UTC')
+    series = pd.DataFrame({'region': 'IN-N', 'timestamp': hours,
+                           'intensity': np.where(hours.hour < 12, 0.9, 0.3)})
+    
+    with tempfile.TemporaryDirectory() as grid_dir:
+        GridIntensityStore.write(series, grid_dir)
+        store = GridIntensityStore(grid_dir)
+        points = store.intensity_at(['IN-N', 'IN-N', 'Elsewhere'],
+                                    ['2025-01-01T03:30Z', '2025-01-01T15:00Z', '2025-01-01T03:30Z'])
+        means = store.average_intensity(['IN-N', 'IN-N'], ['2025-01-01T00:00Z', '2025-01-01T06:00Z'],
+                                        ['2025-01-02T00:00Z', '2025-01-01T06:00Z'])
+        rows = [{'MaterialType': 'Copper', 'ElectricityConsumption_kWh': 1000, 'FuelEnergy_MJ': 0,
+                 'TransportDistance_km': 0, 'GridRegion': 'IN-N',
+                 'ConsumptionStart': '2025-01-01T00:00Z', 'ConsumptionEnd': '2025-01-01T18:00Z'}] * 12
+        result = process_csv_data(rows, {'grid_intensity_dir': grid_dir})
+        # Blank or missing starts are not located in time and keep the default factor
+        undated = store.average_intensity(['IN-N'] * 4, ['', None, np.nan, '2025-01-01T15:00Z'],
+                                          ['2025-01-01T18:00Z', None, '', None])
+        blank_rows = [{**rows[0], 'ConsumptionStart': ''}] * 12
+        blank_result = process_csv_data(blank_rows, {'grid_intensity_dir': grid_dir})
+        # An uploaded grid factor column keeps otherwise identical rows apart
+        uploaded = process_csv_data([{**rows[0], 'GridFactor_kgCO2_per_kWh': f} for f in [0.2, 0.8] * 6])
+        lca = LCAPipeline(store).run_full_lca({'electricityConsumption': 100, 'gridRegion': 'IN-N',
+                                               'consumptionStart': '2025-01-01T12:00Z',
+                                               'consumptionEnd': '2025-01-01T20:00Z'})
+        # Fallback rows use the caller's current flat factor, not the one stored with the series
+        factor_path = os.path.join(grid_dir, 'factor_tables.json')
+        write_factor_file(factor_path, {'PIPELINE_COEFFICIENTS': {'electricity_factor': 0.8}}, 'grid-v2')
+        elsewhere = LCAPipeline(store, FactorTableStore(factor_path, poll_interval=0)).run_full_lca(
+            {'electricityConsumption': 100, 'gridRegion': 'Elsewhere', 'consumptionStart': '2025-01-01T12:00Z'})
+        overridden = store.average_intensity(['Elsewhere', 'IN-N'], ['2025-01-01T03:30Z', ''], [None, None], 0.8)
+        
+        # Rebuilding leaves open stores reading the series they mapped
+        for intensity in (0.2, 0.1):
+            GridIntensityStore.write(series.assign(intensity=intensity), grid_dir)
+        rebuilt = GridIntensityStore(grid_dir).intensity_at(['IN-N'], ['2025-01-01T03:30Z'])
+        still_open = store.intensity_at(['IN-N'], ['2025-01-01T03:30Z'])
+        series_dirs = [name for name in os.listdir(grid_dir) if name.startswith('series-')]
+    
+    print(f"Point intensities: {points}, interval means: {means}")
+    assert np.allclose(points, [0.9, 0.3, 0.5])
+    assert np.allclose(means, [0.6, 0.9])
+    assert abs(result['summary_stats']['avg_carbon_emissions'] - 1000 * 0.7) < 1e-3
+    assert np.allclose(undated, [0.5, 0.5, 0.5, 0.3])
+    assert abs(blank_result['summary_stats']['avg_carbon_emissions'] - 1000 * 0.5) < 1e-3
+    assert abs(uploaded['summary_stats']['avg_carbon_emissions'] - 1000 * 0.5) < 1e-3
+    assert sorted({r['carbonEmissions'] for r in uploaded['detailed_results']}) == [200.0, 800.0]
+    assert abs(lca['results']['detailed_impacts']['processing']['electricity_co2'] - 30.0) < 1e-4
+    assert abs(elsewhere['results']['detailed_impacts']['processing']['electricity_co2'] - 80.0) < 1e-4
+    assert np.allclose(overridden, [0.8, 0.8])
+    assert np.allclose(rebuilt, [0.1]) and np.allclose(still_open, [0.9]) and len(series_dirs) == 2
+    return result['success'] and lca['success']
+
+def test_sharded_models():
+    """Test per-material shards: stable codes, global fallback and per-shard retraining"""
+    print("\nTesting Sharded Models...")
+    
+    import os
+    rows = [{
+        'MaterialType': ['Copper', 'Gold', 'Lithium'][0 if i < 60 else 1 if i < 120 else 2],
+        'ElectricityConsumption_kWh': 500 + (i * 37) % 1500,
+        'FuelEnergy_MJ': 1000 + (i * 53) % 2000,
+        'TransportDistance_km': 100 + (i * 11) % 400
+    } for i in range(130)]
+    options = {'sharded': True, 'shard_min_rows': 30, 'n_jobs': 1}
+    
+    with tempfile.TemporaryDirectory() as shard_dir:
+        options['shard_dir'] = shard_dir
+        first = process_csv_data(rows, options)['model_metrics']['sharding']
+        changed = [dict(r, FuelEnergy_MJ=r['FuelEnergy_MJ'] + 1) if r['MaterialType'] == 'Gold' else r for r in rows]
+        second = process_csv_data(changed, options)
+        codes = MaterialCodes(os.path.join(shard_dir, 'codes.json')).encode(pd.Series(['Lithium', 'Copper']))
+        shard_files = sorted(f for f in os.listdir(shard_dir) if f.endswith('.joblib'))
+        # A later upload is scored by the stored shards without training
+        scored = process_csv_data(changed[55:65], {**options, 'use_saved_shards': True})
+        small = process_csv_data(changed[:3], options)
+        forest = ShardedForest.load(shard_dir)
+    
+    print(f"Sharding: {json.dumps(second['model_metrics']['sharding'])}")
+    assert set(first['shards']) == {'Copper', 'Gold'} and first['fallback_materials'] == ['Lithium']
+    assert not any(s['cached'] for s in first['shards'].values())
+    assert second['model_metrics']['sharding']['shards']['Copper']['cached']
+    assert not second['model_metrics']['sharding']['shards']['Gold']['cached']
+    assert list(codes) == [len(KNOWN_MATERIALS), KNOWN_MATERIALS.index('Copper')]
+    # Only the current Copper, Gold and global shards remain on disk
+    assert len(shard_files) == 3 and set(shard_files) == {i['file'] for i in forest.manifest.values()}
+    assert scored['model_metrics']['serving_model'] == small['model_metrics']['serving_model'] == 'saved_shards'
+    assert 'rmse' not in scored['model_metrics'] and scored['model_metrics']['sharding']['global_rows'] > 0
+    return second['success']
+
+def test_lean_smart_fill():
+    """Test numbers-only smart fill and explaining the cached result later"""
+    print("\nTesting Lean Smart Fill...")
+    
+    import os
+    with tempfile.TemporaryDirectory() as result_dir:
+        result_path = os.path.join(result_dir, 'results.sqlite')
+        ml_service = MLService(result_path)
+        records = [{'materialType': 'Gold', 'fuelType': 'Coal', 'electricityConsumption': '2500',
+                    'fuelEnergy': '', 'transportDistance': '600', 'transportMode': 'Truck',
+                    'landfillLocation': 'Deonar Mumbai'}] * 3
+        batch = ml_service.handle_request('smart_fill_batch', {'records': records})
+        lean = batch['data'][0]['data']
+        explained = ml_service.handle_request('explain', {'resultId': lean['resultId']})
+        stateless = ml_service.handle_request('explain', {k: lean[k] for k in ('completedData', 'environmentalImpact')})
+        unknown = ml_service.handle_request('explain', {'resultId': 'sf-unknown'})
+        # IDs are explainable through another connection to the database (a CLI call, another worker)
+        elsewhere = NumericResultStore(result_path).get(lean['resultId'])
+        # Assistants of one process share the result store and the site registry
+        other = SmartAIAssistant(result_path=result_path)
+        assert other.results is ml_service.ai_assistant.results and other.geo is ml_service.ai_assistant.geo
+    
+    print("Lean Result:")
+    print(json.dumps(lean, indent=2, default=str))
+    assert len(batch['data']) == 3
+    assert 'explanation' not in lean and 'recommendations' not in lean
+    assert lean['missingFields'] == ['fuelEnergy']
+    assert explained['data']['missingFieldsDetected'] == ['fuel energy']
+    assert explained['data']['recommendations'] == stateless['data']['recommendations']
+    assert any('coal' in r.lower() for r in explained['data']['recommendations'])
+    assert not unknown['success']
+    assert lean['resultId'] != batch['data'][1]['data']['resultId']
+    assert elsewhere['completedData'] == lean['completedData']
+    return batch['success'] and explained['success']
+
+def test_lca_model():
+    """Test compiled LCA model variants: scalar and batch agreement, caching and validation"""
+    print("\nTesting LCA Model Compiler...")
+    
+    records = [{'materialType': m, 'fuelType': f, 'transportMode': t, 'electricityConsumption': str(e),
+                'fuelEnergy': e * 2, 'transportDistance': e / 4, 'recyclePercent': 30, 'reusePercent': 20}
+               for m, f, t, e in [('Copper', 'Coal', 'Truck', 1200), ('Gold', 'Biomass', 'Rail', 2600),
+                                  ('Unknown', 'Hydrogen', 'Drone', 800), ('Iron Ore', '', 'Ship', 0)]]
+    pipeline = get_model('pipeline')
+    batch = pipeline.evaluate_batch(records)
+    spec = {
+        'inputs': {'kwh': {'field': 'kwh', 'default': 0.0}},
+        'categories': {'fuel': {'field': 'fuel', 'default': 'Coal', 'table': {'Coal': {'co2': 0.34}},
+                                'fallback': {'co2': 0.2}}},
+        'steps': [['co2', 'round(max(kwh, 10) * fuel.co2, 1)']],
+        'flags': [['coal', "fuel == 'Coal' and kwh > 5"]]
+    }
+    custom = compile_model(spec)
+    
+    print("Pipeline batch totals:", batch['total_co2'].round(2).tolist())
+    for i, record in enumerate(records):
+        scalar = pipeline.evaluate(record)
+        assert abs(scalar['total_co2'] - batch['total_co2'].iloc[i]) < 1e-9
+        assert round(scalar['total_co2'], 2) == LCAPipeline().run_full_lca(record)['results']['total_co2_emissions']
+    assert compile_model(dict(spec)) is custom
+    assert custom.evaluate({'kwh': '100'}) == {'co2': 34.0, 'coal': True}
+    assert custom.evaluate({'fuel': 'Gas'}) == {'co2': 2.0, 'coal': False}
+    assert custom.evaluate_batch([{'kwh': 100}, {'fuel': 'Gas'}])['co2'].tolist() == [34.0, 2.0]
+    # Whole-number rounding gives integers on both paths
+    for variant in ('predict', 'quick', 'smart_fill'):
+        model = get_model(variant)
+        rows = model.evaluate_batch(records).to_dict('records')
+        for record, row in zip(records, rows):
+            scalar = model.evaluate(record)
+            assert all(type(scalar[k]) is type(row[k].item() if hasattr(row[k], 'item') else row[k])
+                       for k in model.outputs), variant
+    try:
+        compile_model({'steps': [['x', '__import__("os")']]})
+        return False
+    except ValueError:
+        pass
+    # Entry points reject blank or non-numeric inputs instead of defaulting them
+    for entry in (predict_lca, calculate_impact):
+        try:
+            entry({'materialType': 'Copper', 'electricityKwh': 'lots', 'electricityConsumption': ''})
+            return False
+        except ValueError as e:
+            assert str(e).startswith('not a number')
+    assert predict_lca({'materialType': 'Copper'})['factorVersion'] == calculate_impact({})['factorVersion']
+    return True
+
+def test_batch_jobs():
+    """Test chunked batch jobs resuming after a dead worker and honouring cancellation"""
+    print("\nTesting Batch Jobs...")
+    
+    rows = [{
+        'MaterialType': ['Copper', 'Gold', 'Zinc'][i % 3],
+        'ElectricityConsumption_kWh': 400 + 7 * i,
+        'FuelEnergy_MJ': 900 + i,
+        'TransportDistance_km': 50 + i % 40,
+        'RecyclePercent': i % 50
+    } for i in range(230)]
+    
+    with tempfile.TemporaryDirectory() as job_dir:
+        queue = BatchJobQueue(job_dir)
+        job_id = queue.submit(rows, chunk_size=50)
+        
+        # First worker hands the job back after two chunks, the next one dies holding it
+        assert BatchJobRunner(queue, 'w1').run_job(queue.claim('w1'), max_chunks=2) == 'queued'
+        assert queue.status(job_id)['rows_done'] == 100
+        queue.claim('dead-worker')
+        assert BatchJobRunner(queue, 'w2').run_pending() == []
+        BatchJobRunner(queue, 'w3', stale_after=0).run_pending()
+        assert queue.checkpoint(job_id, 'dead-worker', rows_done=0) is None
+        status = queue.status(job_id)
+        results = queue.results(job_id)
+        
+        reference = IncrementalAggregates('reference', job_dir)
+        reference.fold(rows)
+        
+        cancelled_id = queue.submit(rows, chunk_size=50)
+        job = queue.claim('w4')
+        queue.cancel(cancelled_id)
+        cancelled = BatchJobRunner(queue, 'w4').run_job(job)
+        cancelled_rows = queue.status(cancelled_id)['rows_done']
+    
+    print("Batch Job Status:")
+    print(json.dumps({k: v for k, v in status.items() if k != 'result'}, indent=2))
+    assert status['status'] == 'completed' and status['progress'] == 1.0
+    assert status['total_rows'] == 230 and status['chunks_done'] == 5
+    assert len(results) == 230
+    assert list(results['carbonEmissions']) == [calculate_lca_row(r)['carbonEmissions'] for r in rows]
+    expected = reference.summary()
+    assert status['result']['top_recommendations'] == expected['top_recommendations']
+    assert abs(status['result']['summary_stats']['avg_carbon_emissions']
+               - expected['summary_stats']['avg_carbon_emissions']) < 1e-9
+    assert cancelled == 'cancelled' and cancelled_rows == 50
+    return True
+
+def test_scheduler():
+    """Test lane admission control and that a saturated batch lane leaves interactive requests alone"""
+    print("\nTesting Scheduler...")
+    
+    import threading
+    scheduler = Scheduler({'interactive': {'workers': 2, 'max_queue': 2},
+                           'batch': {'workers': 1, 'max_queue': 1}})
+    release = threading.Event()
+    try:
+        running = scheduler.submit('batch', release.wait, 10)
+        waiting = scheduler.submit('batch', release.wait, 10)
+        try:
+            scheduler.submit('batch', release.wait, 10)
+            return False
+        except LaneFull as e:
+            assert e.lane == 'batch'
+        
+        result = scheduler.handle('smart_fill', {'materialType': 'Copper', 'electricityConsumption': '1500'},
+                                  timeout=10)
+        assert result['success'] and scheduler.lane_for('csv_analysis') == 'batch'
+        assert all(scheduler.lane_for(t) == 'batch' for t in ('lca_batch', 'geo_fill', 'smart_fill_batch'))
+        assert scheduler.lane_for('smart_fill') == 'interactive'
+        release.set()
+        assert running.result(10) and waiting.result(10)
+        metrics = scheduler.metrics()
+    finally:
+        release.set()
+        scheduler.shutdown()
+    
+    print("Scheduler Metrics:")
+    print(json.dumps(metrics, indent=2))
+    assert metrics['batch']['rejected'] == 1 and metrics['batch']['completed'] == 2
+    assert metrics['interactive']['completed'] == 1 and metrics['interactive']['rejected'] == 0
+    assert metrics['batch']['queue_time_ms']['p99'] >= metrics['batch']['queue_time_ms']['p50'] >= 0
+    # Spawned batch workers re-import the server module, which must not build a scheduler on import
+    import simple_server
+    assert simple_server._scheduler is None
+    return True
+
+def test_surrogate():
+    """Test the linear surrogate serving exactly linear targets and deferring to the forest otherwise"""
+    print("\nTesting Linear Surrogate...")
+    
+    rows = [{
+        'MaterialType': ['Copper', 'Gold', 'Zinc'][i % 3],
+        'ElectricityConsumption_kWh': 300 + (37 * i) % 2000,
+        'FuelEnergy_MJ': 500 + (53 * i) % 3000,
+        'TransportDistance_km': 20 + (11 * i) % 900
+    } for i in range(200)]
+    
+    fast = process_csv_data(rows, {'surrogate_min_rows': 50})
+    forest = process_csv_data(rows, {'surrogate': False})
+    print("Surrogate Metrics:")
+    print(json.dumps(fast['model_metrics'], indent=2))
+    assert fast['model_metrics']['serving_model'] == 'linear_surrogate'
+    assert fast['model_metrics']['surrogate']['accepted']
+    assert all(abs(r['predicted_carbon'] - r['carbonEmissions']) < 1e-6 for r in fast['detailed_results'])
+    assert forest['model_metrics']['serving_model'] == 'random_forest'
+    assert 'surrogate' not in forest['model_metrics']
+    
+    # Per-group slopes are recovered by the piecewise fit but not by the pooled one
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(0, 100, 600), rng.integers(0, 3, 600)])
+    y = X[:, 0] * np.array([1.0, 2.0, 5.0])[X[:, 1].astype(int)]
+    pooled = fit_surrogate(X[:500], y[:500], X[500:], y[500:])
+    piecewise = fit_surrogate(X[:500], y[:500], X[500:], y[500:], group_column=1)
+    assert not pooled['accepted'] and piecewise['accepted'] and piecewise['groups'] == 3
+    assert np.allclose(LinearSurrogate(1).fit(X, y).predict(X), y)
+    return fast['success'] and forest['success']
+
+def test_geo():
+    """Test haversine distances, nearest-landfill queries and batch filling of transport fields"""
+    print("\nTesting Geo Distances...")
+    
+    import os
+    rng = np.random.default_rng(3)
+    registry = GeoRegistry()
+    registry.add('site', pd.DataFrame({'name': [f'mine-{i}' for i in range(300)],
+                                       'latitude': rng.uniform(8, 34, 300), 'longitude': rng.uniform(68, 92, 300)}))
+    registry.add('destination', pd.DataFrame({'name': ['Port Mumbai', 'Port Chennai'],
+                                              'latitude': [18.95, 13.10], 'longitude': [72.84, 80.30]}))
+    registry.add('landfill', pd.DataFrame({'name': [f'landfill-{i}' for i in range(500)],
+                                           'latitude': rng.uniform(8, 34, 500), 'longitude': rng.uniform(68, 92, 500)}))
+    
+    # Delhi to Mumbai landfill, about 1150 km great-circle
+    assert abs(float(haversine_km(28.6247, 77.3256, 19.0667, 72.9167)) - 1153.2) < 1.0
+    queries = rng.uniform([8, 68], [34, 92], (200, 2))
+    names, distances = registry.nearest('landfill', queries[:, 0], queries[:, 1])
+    brute = distance_matrix(queries, np.array(list(registry.points['landfill'].values())))
+    landfill_names = np.array(list(registry.points['landfill']))
+    assert (names == landfill_names[brute.argmin(axis=1)]).all() and np.allclose(distances, brute.min(axis=1))
+    
+    df = pd.DataFrame({'Site': [f'mine-{i}' for i in range(0, 300, 3)],
+                       'Destination': ['Port Mumbai', 'Port Chennai'] * 50,
+                       'TransportDistance_km': [120.0] + [np.nan] * 99})
+    filled = fill_transport(df, registry)
+    site = np.array([registry.points['site'][n] for n in df['Site']])
+    port = np.array([registry.points['destination'][n] for n in df['Destination']])
+    expected = haversine_km(site[:, 0], site[:, 1], port[:, 0], port[:, 1])
+    print(f"Filled: {filled}")
+    assert filled == {'distance': 99, 'landfill': 100}
+    assert df['TransportDistance_km'].iloc[0] == 120.0
+    assert np.allclose(df['TransportDistance_km'].iloc[1:], expected[1:], atol=0.05)
+    assert (df['LandfillLocation'] == registry.nearest('landfill', site[:, 0], site[:, 1])[0]).all()
+    
+    form = fill_record({'materialType': 'Copper', 'siteLatitude': '12.97', 'siteLongitude': '77.59',
+                        'transportDistance': '', 'landfillLocation': ''})
+    assert form['landfillLocation'] == 'Kodungaiyur Chennai' and form['transportDistance'] == ''
+    
+    with tempfile.TemporaryDirectory() as geo_dir:
+        registry.path = os.path.join(geo_dir, 'geo.json')
+        registry.save()
+        result = process_csv_data([{'MaterialType': 'Zinc', 'ElectricityConsumption_kWh': 800, 'Site': 'mine-0',
+                                    'Destination': 'Port Chennai'}] * 12, {'geo_path': registry.path})
+    assert result['geo_fill'] == {'distance': 12, 'landfill': 12}
+    assert result['detailed_results'][0]['LandfillLocation'] == df['LandfillLocation'].iloc[0]
+    return result['success']
+
+def test_synthetic_data():
+    """Test the seeded synthetic generator and its chunked CSV, NPY and Parquet output"""
+    print("\nTesting Synthetic Data...")
+    
+    import os
+    generator = SyntheticLCAGenerator(seed=7, missing_rate=0.1, duplicate_rate=0.05)
+    frame = pd.concat(generator.chunks(20000, chunk_size=6000), ignore_index=True)
+    again = pd.concat(SyntheticLCAGenerator(seed=7, missing_rate=0.1, duplicate_rate=0.05).chunks(20000, 6000),
+                      ignore_index=True)
+    assert frame.equals(again) and len(frame) == 20000
+    
+    missing = frame['ElectricityConsumption_kWh'].isna().mean()
+    duplicated = frame.duplicated().mean()
+    means = frame.groupby('MaterialType')['ElectricityConsumption_kWh'].mean()
+    print(f"Missing: {missing:.3f}, duplicated: {duplicated:.3f}")
+    assert 0.08 < missing < 0.12 and 0.03 < duplicated < 0.07
+    assert means['Platinum'] > means['Gold'] > means['Copper'] > means['Iron Ore']
+    complete = frame.dropna()
+    expected = get_model('csv').evaluate_batch(complete)['carbonEmissions']
+    assert np.allclose(complete['carbonEmissions'], expected)
+    
+    with tempfile.TemporaryDirectory() as out_dir:
+        small = SyntheticLCAGenerator(seed=1, missing_rate=0.1)
+        reference = pd.concat(small.chunks(2500, 1000), ignore_index=True)
+        infos = {fmt: small.write(os.path.join(out_dir, f'data.{fmt}'), 2500, chunk_size=1000)
+                 for fmt in ('csv', 'npy', 'parquet')}
+        from_csv = pd.read_csv(infos['csv']['path'])
+        from_parquet = pd.read_parquet(infos['parquet']['path'])
+        from_npy = np.load(infos['npy']['path'])
+    
+    assert all(info['rows'] == 2500 and info['factorVersion'] == get_store().version for info in infos.values())
+    assert from_parquet.equals(reference)
+    assert np.allclose(from_csv['carbonEmissions'], reference['carbonEmissions'])
+    assert from_csv['FuelType'].isna().equals(reference['FuelType'].isna())
+    assert from_npy.shape == (2500, len(reference.columns))
+    assert np.allclose(from_npy, small.encode(reference), equal_nan=True)
+    return True
+
+def test_factor_tables():
+    """Test hot-reloaded factor versions: snapshots stay fixed, results are tagged, stale caches dropped"""
+    print("\nTesting Factor Tables...")
+    
+    import os
+    with tempfile.TemporaryDirectory() as factor_dir:
+        path = os.path.join(factor_dir, 'factor_tables.json')
+        store = FactorTableStore(path, poll_interval=0)
+        pipeline = LCAPipeline(factor_store=store)
+        assistant = SmartAIAssistant(factor_store=store, result_path=os.path.join(factor_dir, 'results.sqlite'))
+        record = {'materialType': 'Copper', 'fuelType': 'Coal', 'electricityConsumption': '1500',
+                  'fuelEnergy': '2000', 'transportDistance': '300', 'transportMode': 'Truck',
+                  'landfillLocation': 'Deonar Mumbai'}
+        
+        before = pipeline.run_full_lca(record)['results']
+        numbers = assistant.process_smart_fill(record, 'numbers')['data']
+        in_flight = store.current()
+        assert before['factor_version'] == numbers['factorVersion'] == BUILTIN_VERSION
+        
+        write_factor_file(path, {'PIPELINE_FUEL_FACTORS': {'coal': 0.68},
+                                 'PIPELINE_COEFFICIENTS': {'electricity_factor': 0.8},
+                                 'SMART_FILL_FUELS': {'Coal': {'co2_factor': 3.0}},
+                                 'SMART_FILL_COEFFICIENTS': {'electricity_factor': 0.8}}, 'v2')
+        after = pipeline.run_full_lca(record)['results']
+        print(f"Coal CO2: {before['detailed_impacts']['processing']['fuel_co2']} -> "
+              f"{after['detailed_impacts']['processing']['fuel_co2']} ({store.current().info()['recompiled']})")
+        assert after['factor_version'] == 'v2' and store.current() is not in_flight
+        assert after['detailed_impacts']['processing']['fuel_co2'] == 2 * before['detailed_impacts']['processing']['fuel_co2']
+        assert in_flight.model('pipeline').evaluate(record)['fuel_co2'] == before['detailed_impacts']['processing']['fuel_co2']
+        assert in_flight.table('PIPELINE_FUEL_FACTORS')['coal'] == 0.34
+        assert store.current().model('quick') is in_flight.model('quick')
+        assert 'quick' not in store.current().info()['recompiled']
+        # Coefficients such as the flat electricity factor come from the tables too, explanations included
+        assert pipeline.emission_factors['electricity'] == 0.8
+        assert after['detailed_impacts']['processing']['electricity_co2'] == 1500 * 0.8
+        full = assistant.process_smart_fill(record)['data']
+        assert 'generating 1200 kg CO2' in full['explanation'][0]
+        try:
+            merge_tables({'PIPELINE_COEFFICIENTS': {'electricty_factor': 0.8}})
+            assert False, 'unknown coefficient accepted'
+        except ValueError:
+            pass
+        
+        # Explanations cached under the old version expire; new results explain normally
+        assert not assistant.explain({'resultId': numbers['resultId']})['success']
+        fresh = assistant.process_smart_fill(record, 'numbers')['data']
+        assert fresh['factorVersion'] == 'v2' and assistant.explain({'resultId': fresh['resultId']})['success']
+        assert predict_lca_batch([{'materialType': 'Copper'}])[0]['factorVersion'] == get_store().version
+        
+        # The quick variant follows its coefficient table and tags the version it used
+        write_factor_file(path, {'QUICK_COEFFICIENTS': {'electricity_factor': 1.0}}, 'v2-quick')
+        quick = calculate_impact(record, store.current())
+        assert quick['factorVersion'] == 'v2-quick'
+        assert quick['co2Emissions'] == calculate_impact(record, in_flight)['co2Emissions'] + 1500 * 0.5
+        
+        # A broken file keeps the last good version serving
+        with open(path, 'w') as f:
+            f.write('{"version": "v3", "tables": {"PIPELINE_FUEL_FACTORS": {"coal": "high"}}}')
+        assert store.current().version == 'v2-quick' and store.status()['last_error']
+        os.remove(path)
+        assert store.current().version == BUILTIN_VERSION
+    return True
+
+def test_load_test():
+    """Test the load generator's statistics and a short run against a stub service"""
+    print("\nTesting Load Test...")
+    
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    assert percentile([], 0.5) is None
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.5) == 3.0 and percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.99) == 5.0
+    records = [{'scenario': 'smart_fill', 'latency': latency, 'ok': latency < 0.04, 'status': 200, 'finished': 0.0}
+               for latency in (0.01, 0.02, 0.03, 0.04)]
+    summary = LoadGenerator()._summarize(records, 2.0)
+    assert summary['requests'] == 4 and summary['throughput_rps'] == 2.0 and summary['error_rate'] == 0.25
+    assert summary['latency_ms'] == {'mean': 25.0, 'p50': 30.0, 'p95': 40.0, 'p99': 40.0, 'max': 40.0}
+    assert LoadGenerator()._summarize([], 1.0)['latency_ms']['p50'] is None
+    
+    baseline = {'overall': summary, 'scenarios': {'smart_fill': summary}}
+    faster = {'overall': {**summary, 'throughput_rps': 3.0, 'error_rate': 0.0,
+                          'latency_ms': {**summary['latency_ms'], 'p50': 15.0}},
+              'scenarios': {'smart_fill': summary, 'optimize': summary}}
+    comparison = compare_reports(faster, baseline)
+    assert set(comparison) == {'overall', 'smart_fill'}
+    assert comparison['overall']['throughput_change_pct'] == 50.0 and comparison['overall']['p50_change_pct'] == -50.0
+    assert comparison['overall']['error_rate_delta'] == -0.25 and comparison['smart_fill']['p99_change_pct'] == 0.0
+    
+    class StubService(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            failing = self.path == SCENARIOS['optimize'][0]
+            body = json.dumps({'success': not failing}).encode()
+            self.send_response(500 if failing else 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        closed = LoadGenerator(url, concurrency=2, duration=0.3, mix={'smart_fill': 1, 'optimize': 1}).run()
+        opened = LoadGenerator(url, concurrency=2, duration=0.3, rate=50, mix={'lca_analysis': 1}).run()
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    print("Load Test Report:")
+    print(json.dumps(closed['overall'], indent=2))
+    assert closed['scenarios']['smart_fill']['error_rate'] == 0.0 and closed['scenarios']['optimize']['error_rate'] == 1.0
+    assert closed['overall']['requests'] == sum(s['requests'] for s in closed['scenarios'].values()) > 0
+    assert opened['overall']['requests'] > 0 and opened['overall']['error_rate'] == 0.0
+    assert opened['config']['rate_rps'] == 50 and set(opened['scenarios']) == {'lca_analysis'}
+    return True
+
 def main():
     """Run all tests"""
     print("=== ML Service Test Suite ===\n")
@@ -78,7 +1024,28 @@ def main():
     tests = [
         ("Smart Fill", test_smart_fill),
         ("LCA Pipeline", test_lca_pipeline),
-        ("ML Service", test_ml_service)
+        ("ML Service", test_ml_service),
+        ("Sensitivity Analysis", test_sensitivity),
+        ("Supply Chain LCA", test_supply_chain),
+        ("Incremental Statistics", test_incremental_stats),
+        ("Binary Batch Protocol", test_batch_protocol),
+        ("Target Optimizer", test_target_optimizer),
+        ("Neighbour Imputer", test_knn_imputer),
+        ("Batch Deduplication", test_batch_deduplication),
+        ("Model Selection", test_model_selection),
+        ("Result Archive", test_result_archive),
+        ("Data Quality", test_data_quality),
+        ("Grid Intensity", test_grid_intensity),
+        ("Sharded Models", test_sharded_models),
+        ("Lean Smart Fill", test_lean_smart_fill),
+        ("LCA Model Compiler", test_lca_model),
+        ("Batch Jobs", test_batch_jobs),
+        ("Scheduler", test_scheduler),
+        ("Linear Surrogate", test_surrogate),
+        ("Geo Distances", test_geo),
+        ("Synthetic Data", test_synthetic_data),
+        ("Factor Tables", test_factor_tables),
+        ("Load Test", test_load_test)
     ]
     
     results = []